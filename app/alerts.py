@@ -0,0 +1,226 @@
+# app/alerts.py
+"""
+Streaming hypo/hyper and trend detection for incoming BG readings.
+
+The detector keeps a tiny ring buffer of recent readings per user and,
+for every new reading, does a constant amount of work:
+- rate of change (mg/dL per minute) over the last few samples
+- predicted value `alert_prediction_minutes` ahead
+- crossings into the low / high zones, actual or predicted
+
+Alerts only fire on transitions (e.g. in range -> low), not on every
+out-of-range reading, so a long high doesn't flood the alerts table.
+
+`observe()` runs under a per-user lock, before the reading commits.
+If the transaction then fails, the caller must `forget()` the user so
+the state is rebuilt from what was actually stored. Otherwise a
+phantom value would stay in the trend, and its zone change would
+suppress the next real transition alert.
+"""
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from threading import Lock
+
+from sqlalchemy import desc
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+# Samples kept per user. 12 x 5-minute CGM readings = the last hour.
+WINDOW = 12
+# Samples used for the rate-of-change fit (~15 minutes of CGM data).
+TREND_SAMPLES = 4
+
+# Zone codes (kept as small ints to keep per-user state compact)
+ZONE_LOW = -1
+ZONE_IN_RANGE = 0
+ZONE_HIGH = 1
+
+
+class _UserTrend:
+    """Per-user ring buffer of (timestamp, value) plus last alert state."""
+
+    __slots__ = ("lock", "times", "values", "head", "size", "zone", "predicted_zone", "rate_alert")
+
+    def __init__(self):
+        self.lock = Lock()
+        self.times = array("d", bytes(8 * WINDOW))
+        self.values = array("f", bytes(4 * WINDOW))
+        self.head = 0  # index of the next write
+        self.size = 0
+        self.zone = ZONE_IN_RANGE
+        self.predicted_zone = ZONE_IN_RANGE
+        self.rate_alert = 0  # -1 falling fast, 0 none, 1 rising fast
+
+    def latest_time(self) -> float | None:
+        if self.size == 0:
+            return None
+        return self.times[(self.head - 1) % WINDOW]
+
+    def push(self, ts: float, value: float) -> None:
+        self.times[self.head] = ts
+        self.values[self.head] = value
+        self.head = (self.head + 1) % WINDOW
+        if self.size < WINDOW:
+            self.size += 1
+
+    def rate_per_minute(self) -> float | None:
+        """
+        Least-squares slope over the newest TREND_SAMPLES readings,
+        in mg/dL per minute. None until we have two samples.
+        """
+        n = min(self.size, TREND_SAMPLES)
+        if n < 2:
+            return None
+
+        newest = (self.head - 1) % WINDOW
+        t_ref = self.times[newest]
+        sum_t = sum_v = sum_tt = sum_tv = 0.0
+        for k in range(n):
+            i = (newest - k) % WINDOW
+            t = (self.times[i] - t_ref) / 60.0
+            v = self.values[i]
+            sum_t += t
+            sum_v += v
+            sum_tt += t * t
+            sum_tv += t * v
+
+        denom = n * sum_tt - sum_t * sum_t
+        if denom <= 0:
+            return None
+        return (n * sum_tv - sum_t * sum_v) / denom
+
+
+@dataclass
+class DetectedAlert:
+    kind: str
+    value: float
+    rate: float | None
+    predicted_value: float | None
+    message: str
+
+
+def _zone(value: float) -> int:
+    if value < settings.alert_low_mg_dl:
+        return ZONE_LOW
+    if value > settings.alert_high_mg_dl:
+        return ZONE_HIGH
+    return ZONE_IN_RANGE
+
+
+class TrendDetector:
+    """
+    Holds `_UserTrend` state for up to `max_users` users, evicting the
+    least recently active when full. State is rebuilt from the last
+    few stored readings the first time a user is seen by this process.
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._states: OrderedDict[int, _UserTrend] = OrderedDict()
+        self._lock = Lock()
+
+    def _state_for(self, db: Session, user_id: int, exclude_id: int | None) -> _UserTrend:
+        with self._lock:
+            state = self._states.get(user_id)
+            if state is not None:
+                self._states.move_to_end(user_id)
+                return state
+
+        state = _UserTrend()
+        query = (
+            db.query(models.BloodGlucoseReading.timestamp, models.BloodGlucoseReading.value)
+            .filter(models.BloodGlucoseReading.user_id == user_id)
+        )
+        if exclude_id is not None:
+            query = query.filter(models.BloodGlucoseReading.id != exclude_id)
+        recent = query.order_by(desc(models.BloodGlucoseReading.timestamp)).limit(WINDOW).all()
+        for ts, value in reversed(recent):
+            state.push(ts.timestamp(), float(value))
+        if state.size:
+            state.zone = _zone(state.values[(state.head - 1) % WINDOW])
+
+        with self._lock:
+            # Another request for this user may have seeded it meanwhile.
+            state = self._states.setdefault(user_id, state)
+            self._states.move_to_end(user_id)
+            while len(self._states) > self.max_users:
+                self._states.popitem(last=False)
+        return state
+
+    def forget(self, user_id: int) -> None:
+        """Drop the user's state; the next reading rebuilds it from the database."""
+        with self._lock:
+            self._states.pop(user_id, None)
+
+    def observe(
+        self,
+        db: Session,
+        user_id: int,
+        value: float,
+        timestamp: datetime,
+        reading_id: int | None = None,
+    ) -> list[DetectedAlert]:
+        state = self._state_for(db, user_id, reading_id)
+        with state.lock:
+            return self._observe(state, value, timestamp.timestamp())
+
+    def _observe(self, state: _UserTrend, value: float, ts: float) -> list[DetectedAlert]:
+        latest = state.latest_time()
+        if latest is not None and ts <= latest:
+            # Late/out-of-order reading: stored, but it doesn't move the trend.
+            return []
+
+        state.push(ts, value)
+        rate = state.rate_per_minute()
+        horizon = settings.alert_prediction_minutes
+        predicted = value + rate * horizon if rate is not None else None
+
+        alerts: list[DetectedAlert] = []
+
+        zone = _zone(value)
+        if zone != state.zone:
+            if zone == ZONE_LOW:
+                alerts.append(DetectedAlert(
+                    "low", value, rate, predicted,
+                    f"Blood glucose dropped below {settings.alert_low_mg_dl:g} mg/dL.",
+                ))
+            elif zone == ZONE_HIGH:
+                alerts.append(DetectedAlert(
+                    "high", value, rate, predicted,
+                    f"Blood glucose rose above {settings.alert_high_mg_dl:g} mg/dL.",
+                ))
+            state.zone = zone
+
+        predicted_zone = _zone(predicted) if predicted is not None else ZONE_IN_RANGE
+        if zone == ZONE_IN_RANGE and predicted_zone != state.predicted_zone:
+            if predicted_zone == ZONE_LOW:
+                alerts.append(DetectedAlert(
+                    "predicted_low", value, rate, predicted,
+                    f"Blood glucose is predicted to go low (~{predicted:.0f} mg/dL) within {horizon} minutes.",
+                ))
+            elif predicted_zone == ZONE_HIGH:
+                alerts.append(DetectedAlert(
+                    "predicted_high", value, rate, predicted,
+                    f"Blood glucose is predicted to go high (~{predicted:.0f} mg/dL) within {horizon} minutes.",
+                ))
+        state.predicted_zone = predicted_zone
+
+        rate_alert = 0
+        if rate is not None and abs(rate) >= settings.alert_rapid_rate_mg_dl_per_min:
+            rate_alert = 1 if rate > 0 else -1
+        if rate_alert and rate_alert != state.rate_alert:
+            direction = "rising" if rate_alert > 0 else "falling"
+            alerts.append(DetectedAlert(
+                f"rapid_{'rise' if rate_alert > 0 else 'fall'}", value, rate, predicted,
+                f"Blood glucose is {direction} quickly ({rate:+.1f} mg/dL per minute).",
+            ))
+        state.rate_alert = rate_alert
+
+        return alerts
+
+
+detector = TrendDetector(max_users=settings.alert_max_tracked_users)
@@ -0,0 +1,165 @@
+# app/analysis_cache.py
+"""
+Per-user memo of /meals/analysis/all results.
+
+Entries are keyed by the user's meal-set version (app/meal_versions.py).
+A write that bumps the version by exactly one can patch the cached
+entry in place (only the written meals are recomputed); anything else,
+e.g. two concurrent writes, simply drops the entry and the next read
+rebuilds it.
+
+Eviction is LRU across users, bounded both by entry count and by an
+estimate of the memory held. With a shared cache backend (app/cache.py)
+entries are also written there, so other workers can pick them up
+instead of rebuilding from the database.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+
+from . import meal_versions, schemas
+from .cache import cache
+from .config import settings
+
+# Rough per-analysis footprint (pydantic model + dict slot + tuple), bytes
+_ITEM_OVERHEAD = 700
+
+
+class _UserAnalyses:
+    __slots__ = ("version", "items", "ordered", "size")
+
+    def __init__(self, version: int):
+        self.version = version
+        self.items: dict[int, tuple[datetime, schemas.MealAnalysis]] = {}
+        self.ordered: list[schemas.MealAnalysis] | None = None
+        self.size = 0
+
+    def put(self, timestamp: datetime, analysis: schemas.MealAnalysis) -> None:
+        old = self.items.get(analysis.meal_id)
+        if old is not None:
+            self.size -= _ITEM_OVERHEAD + len(old[1].name)
+        self.items[analysis.meal_id] = (timestamp, analysis)
+        self.size += _ITEM_OVERHEAD + len(analysis.name)
+        self.ordered = None
+
+    def results(self) -> list[schemas.MealAnalysis]:
+        if self.ordered is None:
+            # Same order as the SQL path: newest meal first.
+            self.ordered = [
+                a for _, a in sorted(self.items.values(), key=lambda item: item[0], reverse=True)
+            ]
+        return self.ordered
+
+
+class AnalysisCache:
+    def __init__(self, max_users: int, max_bytes: int):
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[int, _UserAnalyses] = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+
+    def get(self, user_id: int) -> list[schemas.MealAnalysis] | None:
+        version = meal_versions.current(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(user_id)
+                return entry.results()
+
+        if not cache.shared:
+            return None
+        shared = cache.get(_shared_key(user_id, version))
+        if shared is None:
+            return None
+        analyses = [
+            (datetime.fromisoformat(ts), schemas.MealAnalysis(**data)) for ts, data in shared
+        ]
+        self._store_local(user_id, version, analyses)
+        return self.get(user_id)
+
+    def store(
+        self,
+        user_id: int,
+        version: int,
+        analyses: list[tuple[datetime, schemas.MealAnalysis]],
+    ) -> None:
+        """`version` must be read *before* loading the meals it describes."""
+        entry = self._store_local(user_id, version, analyses)
+        _store_shared(user_id, entry)
+
+    def _store_local(
+        self,
+        user_id: int,
+        version: int,
+        analyses: list[tuple[datetime, schemas.MealAnalysis]],
+    ) -> _UserAnalyses:
+        entry = _UserAnalyses(version)
+        for timestamp, analysis in analyses:
+            entry.put(timestamp, analysis)
+
+        with self._lock:
+            self._drop(user_id)
+            self._entries[user_id] = entry
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    def apply(
+        self,
+        user_id: int,
+        version: int,
+        analyses: list[tuple[datetime, schemas.MealAnalysis]],
+    ) -> None:
+        """Incremental update after a write that produced `version`."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            if entry.version != version - 1:
+                self._drop(user_id)
+                return
+
+            self._bytes -= entry.size
+            for timestamp, analysis in analyses:
+                entry.put(timestamp, analysis)
+            entry.version = version
+            self._bytes += entry.size
+            self._evict()
+        _store_shared(user_id, entry)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._drop(user_id)
+
+    def _drop(self, user_id: int) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_users or self._bytes > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+
+
+def _shared_key(user_id: int, version: int) -> str:
+    return f"meal-analysis:{user_id}:{version}"
+
+
+def _store_shared(user_id: int, entry: _UserAnalyses) -> None:
+    if not cache.shared:
+        return
+    cache.set(
+        _shared_key(user_id, entry.version),
+        [(ts.isoformat(), a.model_dump()) for ts, a in entry.items.values()],
+        ttl=settings.cache_analysis_ttl_seconds,
+    )
+
+
+analysis_cache = AnalysisCache(
+    max_users=settings.analysis_cache_max_users,
+    max_bytes=settings.analysis_cache_max_mb * 1024 * 1024,
+)
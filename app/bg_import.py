@@ -0,0 +1,323 @@
+# app/bg_import.py
+"""
+Bulk import of historical BG data from CGM / meter export files.
+
+Supported layouts (auto-detected from the header row):
+- Dexcom Clarity CSV: "Timestamp (YYYY-MM-DDThh:mm:ss)", "Event Type",
+  "Glucose Value (mg/dL)" or "(mmol/L)"; only EGV rows are imported
+- LibreView CSV: a metadata line, then "Device Timestamp",
+  "Record Type", "Historic Glucose mg/dL" / "Scan Glucose mmol/L", ...
+- Generic meter CSV: "timestamp", "value" and optional "unit", "context"
+
+The file is read in chunks of CHUNK_SIZE rows. Each chunk is converted
+to NumPy arrays, normalized (mmol/L -> mg/dL, local time -> UTC),
+de-duplicated within the file and against stored readings via the
+(user_id, timestamp) index, then bulk-inserted in one statement.
+Progress is written to the ImportJob row after every chunk.
+"""
+import csv
+import os
+import warnings
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterator, TextIO
+
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from . import models, sync, timeseries
+from .config import settings
+from .db import SessionLocal
+
+CHUNK_SIZE = 5000
+MMOL_TO_MG_DL = 18.0182
+
+# Dexcom / Libre write these instead of a number when out of sensor range.
+_OUT_OF_RANGE = {"low": 40.0, "high": 400.0}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class _Layout:
+    __slots__ = (
+        "name", "ts_col", "value_cols", "unit", "unit_col", "context_col", "row_filter", "ts_format",
+    )
+
+    def __init__(
+        self,
+        name,
+        ts_col,
+        value_cols,
+        unit,
+        unit_col=None,
+        context_col=None,
+        row_filter=None,
+        ts_format=None,
+    ):
+        self.name = name
+        self.ts_col = ts_col
+        self.value_cols = value_cols      # first non-empty column wins
+        self.unit = unit                  # "mg/dL", "mmol/L" or None (auto)
+        self.unit_col = unit_col          # per-row unit column (generic files)
+        self.context_col = context_col
+        self.row_filter = row_filter      # (column index, allowed values) or None
+        self.ts_format = ts_format        # strptime format, None for ISO 8601
+
+
+def _find(header: list[str], *prefixes: str) -> int | None:
+    lowered = [h.strip().lower() for h in header]
+    for prefix in prefixes:
+        for i, h in enumerate(lowered):
+            if h.startswith(prefix):
+                return i
+    return None
+
+
+def _detect_layout(header: list[str]) -> _Layout | None:
+    joined = ",".join(header).lower()
+    unit = "mmol/L" if "mmol" in joined else ("mg/dL" if "mg/dl" in joined else None)
+
+    ts_col = _find(header, "timestamp (yyyy-mm-ddthh:mm:ss)")
+    if ts_col is not None:
+        event_col = _find(header, "event type")
+        return _Layout(
+            "dexcom",
+            ts_col,
+            [_find(header, "glucose value")],
+            unit,
+            row_filter=(event_col, {"EGV"}) if event_col is not None else None,
+        )
+
+    ts_col = _find(header, "device timestamp")
+    if ts_col is not None:
+        record_col = _find(header, "record type")
+        return _Layout(
+            "libre",
+            ts_col,
+            [_find(header, "historic glucose"), _find(header, "scan glucose")],
+            unit,
+            row_filter=(record_col, {"0", "1"}) if record_col is not None else None,
+            ts_format=settings.import_libre_timestamp_format,
+        )
+
+    ts_col = _find(header, "timestamp", "date", "time")
+    value_col = _find(header, "value", "glucose", "bg")
+    if ts_col is not None and value_col is not None:
+        return _Layout(
+            "generic",
+            ts_col,
+            [value_col],
+            unit,
+            unit_col=_find(header, "unit"),
+            context_col=_find(header, "context"),
+        )
+    return None
+
+
+def _open_rows(f: TextIO) -> tuple[_Layout, Iterator[list[str]]]:
+    reader = csv.reader(f)
+    # LibreView puts a metadata line above the header; scan a few lines.
+    for line in islice(reader, 5):
+        layout = _detect_layout(line)
+        if layout is not None:
+            return layout, reader
+    raise ImportFormatError("Unrecognized file: expected a Dexcom, LibreView or timestamp,value CSV.")
+
+
+def _parse_timestamps(raw: list[str], layout: _Layout, utc_offset: timedelta) -> np.ndarray:
+    """Parse to naive-UTC datetime64[s]; unparseable entries become NaT."""
+    if layout.ts_format is None:
+        try:
+            # Fast path: plain ISO 8601 without offsets (Dexcom, most meters).
+            # NumPy only warns on "Z"/"+hh:mm" suffixes; treat that as a miss.
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                parsed = np.array(raw, dtype="datetime64[s]")
+            return parsed - np.timedelta64(int(utc_offset.total_seconds()), "s")
+        except (ValueError, UserWarning):
+            pass
+
+    out = np.empty(len(raw), dtype="datetime64[s]")
+    for i, text in enumerate(raw):
+        try:
+            if layout.ts_format is None:
+                ts = datetime.fromisoformat(text.strip().replace("Z", "+00:00"))
+            else:
+                ts = datetime.strptime(text.strip(), layout.ts_format)
+        except ValueError:
+            out[i] = np.datetime64("NaT")
+            continue
+        if ts.tzinfo is not None:
+            ts = (ts - ts.utcoffset()).replace(tzinfo=None)
+        else:
+            ts = ts - utc_offset
+        out[i] = np.datetime64(ts, "s")
+    return out
+
+
+def _parse_values(rows: list[list[str]], layout: _Layout) -> np.ndarray:
+    out = np.full(len(rows), np.nan)
+    for i, row in enumerate(rows):
+        for col in layout.value_cols:
+            if col is None or col >= len(row):
+                continue
+            text = row[col].strip()
+            if not text:
+                continue
+            try:
+                out[i] = float(text)
+            except ValueError:
+                out[i] = _OUT_OF_RANGE.get(text.lower(), np.nan)
+            break
+    return out
+
+
+def _existing_timestamps(db: Session, user_id: int, start: datetime, end: datetime) -> np.ndarray:
+    if settings.bg_chunk_store:
+        stored = timeseries.read_range(db, user_id, start, end).timestamps
+    else:
+        Reading = models.BloodGlucoseReading
+        stored = np.array(
+            db.scalars(
+                select(Reading.timestamp).where(
+                    Reading.user_id == user_id,
+                    Reading.timestamp >= start,
+                    Reading.timestamp < end,
+                )
+            ).all(),
+            dtype="datetime64[us]",
+        )
+    return stored.astype("datetime64[s]")
+
+
+def import_chunk(
+    db: Session,
+    user_id: int,
+    rows: list[list[str]],
+    layout: _Layout,
+    unit: str | None,
+    utc_offset: timedelta,
+) -> tuple[int, int, int]:
+    """
+    Normalize, de-duplicate and insert one chunk of CSV rows.
+    Returns (inserted, duplicates, invalid). Caller commits.
+    """
+    if layout.row_filter is not None:
+        col, allowed = layout.row_filter
+        kept = [r for r in rows if col < len(r) and r[col].strip() in allowed]
+    else:
+        kept = rows
+    skipped = len(rows) - len(kept)
+    if not kept:
+        return 0, 0, skipped
+
+    timestamps = _parse_timestamps(
+        [r[layout.ts_col] if layout.ts_col < len(r) else "" for r in kept], layout, utc_offset
+    )
+    values = _parse_values(kept, layout)
+
+    if unit is None and layout.unit_col is not None:
+        col = layout.unit_col
+        is_mmol = np.array(["mmol" in r[col].lower() if col < len(r) else False for r in kept])
+    else:
+        if unit is None:
+            # No unit anywhere: mmol/L readings are almost never above 35.
+            finite = values[np.isfinite(values)]
+            unit = "mmol/L" if finite.size and np.median(finite) < 35 else "mg/dL"
+        is_mmol = np.full(len(kept), unit == "mmol/L")
+    values = np.where(is_mmol, values * MMOL_TO_MG_DL, values)
+
+    valid = ~np.isnat(timestamps) & np.isfinite(values) & (values > 0)
+    invalid = skipped + int((~valid).sum())
+    timestamps = timestamps[valid]
+    values = values[valid]
+    contexts = None
+    if layout.context_col is not None:
+        contexts = np.array(
+            [(r[layout.context_col].strip() or None) if layout.context_col < len(r) else None for r in kept],
+            dtype=object,
+        )[valid]
+    if not timestamps.size:
+        return 0, 0, invalid
+
+    # De-duplicate within the chunk, then against what is already stored.
+    _, first_idx = np.unique(timestamps, return_index=True)
+    keep = np.zeros(timestamps.size, dtype=bool)
+    keep[first_idx] = True
+
+    start = timestamps.min().astype(datetime)
+    end = (timestamps.max() + np.timedelta64(1, "s")).astype(datetime)
+    keep &= ~np.isin(timestamps, _existing_timestamps(db, user_id, start, end))
+
+    duplicates = int(timestamps.size - keep.sum())
+    timestamps = timestamps[keep]
+    values = np.round(values[keep], 1)
+    if contexts is not None:
+        contexts = contexts[keep]
+
+    if timestamps.size:
+        ids = db.scalars(
+            insert(models.BloodGlucoseReading).returning(models.BloodGlucoseReading.id),
+            [
+                {"user_id": user_id, "timestamp": ts, "value": v, "context": ctx}
+                for ts, v, ctx in zip(
+                    timestamps.astype(datetime).tolist(),
+                    values.tolist(),
+                    contexts.tolist() if contexts is not None else [None] * timestamps.size,
+                )
+            ],
+        ).all()
+        sync.record_changes(db, user_id, sync.BG_READING, ids)
+    return int(timestamps.size), duplicates, invalid
+
+
+def run_import_job(job_id: int, path: str, unit: str | None, utc_offset_minutes: int) -> None:
+    """Background task: import `path` for the job's user, then delete the file."""
+    db = SessionLocal()
+    try:
+        job = db.get(models.ImportJob, job_id)
+        job.status = "running"
+        db.commit()
+
+        utc_offset = timedelta(minutes=utc_offset_minutes)
+        f = open(path, newline="", encoding="utf-8-sig", errors="replace")
+        try:
+            layout, reader = _open_rows(f)
+            job.source_format = layout.name
+            db.commit()
+
+            while True:
+                chunk = list(islice(reader, CHUNK_SIZE))
+                if not chunk:
+                    break
+                inserted, duplicates, invalid = import_chunk(
+                    db, job.user_id, chunk, layout, unit or layout.unit, utc_offset
+                )
+                job.rows_read += len(chunk)
+                job.rows_inserted += inserted
+                job.rows_duplicate += duplicates
+                job.rows_invalid += invalid
+                # Position of the underlying binary buffer: read-ahead
+                # makes it approximate, which is fine for progress.
+                job.bytes_processed = min(f.buffer.tell(), job.bytes_total)
+                db.commit()
+        except Exception as exc:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(exc)[:500]
+        else:
+            job.status = "completed"
+            job.bytes_processed = job.bytes_total
+        finally:
+            f.close()
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,413 @@
+# app/cache.py
+"""
+Pluggable cache layer shared by the food search, auth user lookup,
+meal-set versions and meal analysis caches.
+
+Backends (settings.cache_backend):
+- "local":  in-process LRU with TTLs; one copy per uvicorn worker
+- "sqlite": a SQLite file (WAL) shared by all workers on one host
+- "redis":  any Redis-protocol server (tests/fake_redis.py is a local
+            stand-in), shared across hosts
+
+With a shared backend each worker also keeps a short-lived local L1
+copy of hot keys. `invalidate()` and `incr()` broadcast the key, and
+every worker drops its L1 copy. The listener thread that receives
+those broadcasts is started from the app's lifespan, not at import,
+so CLIs and tests that import the cache don't spawn it. Backend errors
+never reach callers:
+reads miss, writes are dropped and `incr()` returns None.
+"""
+import json
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable
+from urllib.parse import urlparse
+
+from .config import settings
+
+INVALIDATION_CHANNEL = "cache-invalidate"
+
+
+class CacheError(Exception):
+    pass
+
+
+class CacheBackend(ABC):
+    """Byte-string key/value store with TTLs, counters and pub/sub."""
+
+    shared = True
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None: ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None: ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None: ...
+
+    @abstractmethod
+    def incr(self, key: str) -> int: ...
+
+    @abstractmethod
+    def publish(self, channel: str, message: str) -> None: ...
+
+    @abstractmethod
+    def listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        """Block forever, calling `callback` for each message on `channel`."""
+
+
+class LocalBackend(CacheBackend):
+    """In-process LRU. Also used as the L1 in front of shared backends."""
+
+    shared = False
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[bytes, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value, expires = self._data.get(key, (b"0", None))
+            new = int(value) + 1
+            self._data[key] = (str(new).encode(), expires)
+            return new
+
+    def publish(self, channel: str, message: str) -> None:
+        # Nothing else shares this process's memory.
+        pass
+
+    def listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        # Never started: the Cache facade only listens on shared backends.
+        raise TypeError("LocalBackend has no other workers to listen to")
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Cache in a SQLite file shared by every worker on the host.
+    Pub/sub is an append-only events table that listeners poll.
+    sqlite3 errors (e.g. "database is locked" past the busy timeout)
+    are raised as CacheError.
+    """
+
+    POLL_SECONDS = 0.25
+    EVENT_RETENTION_SECONDS = 300
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS cache_kv (
+                key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL
+            );
+            CREATE TABLE IF NOT EXISTS cache_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL, message TEXT NOT NULL, created REAL NOT NULL
+            );
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        try:
+            return self._conn().execute(sql, params).fetchall()
+        except sqlite3.Error as exc:
+            raise CacheError(str(exc)) from exc
+
+    def get(self, key: str) -> bytes | None:
+        rows = self._query("SELECT value, expires FROM cache_kv WHERE key = ?", (key,))
+        if not rows:
+            return None
+        value, expires = rows[0]
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return bytes(value)
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        expires = time.time() + ttl if ttl else None
+        self._query(
+            "INSERT INTO cache_kv (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires",
+            (key, value, expires),
+        )
+
+    def delete(self, key: str) -> None:
+        self._query("DELETE FROM cache_kv WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        rows = self._query(
+            # Kept as BLOB like every other value, so get() can read it back.
+            "INSERT INTO cache_kv (key, value, expires) VALUES (?, CAST('1' AS BLOB), NULL) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "value = CAST(CAST(CAST(value AS TEXT) AS INTEGER) + 1 AS BLOB) "
+            "RETURNING value",
+            (key,),
+        )
+        return int(rows[0][0])
+
+    def publish(self, channel: str, message: str) -> None:
+        now = time.time()
+        self._query(
+            "INSERT INTO cache_events (channel, message, created) VALUES (?, ?, ?)",
+            (channel, message, now),
+        )
+        self._query(
+            "DELETE FROM cache_events WHERE created < ?", (now - self.EVENT_RETENTION_SECONDS,)
+        )
+
+    def listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        last_id = None
+        while True:
+            try:
+                if last_id is None:
+                    last_id = self._query("SELECT COALESCE(MAX(id), 0) FROM cache_events")[0][0]
+                for event_id, message in self._query(
+                    "SELECT id, message FROM cache_events WHERE id > ? AND channel = ? ORDER BY id",
+                    (last_id, channel),
+                ):
+                    last_id = event_id
+                    callback(message)
+            except CacheError:
+                time.sleep(1.0)  # e.g. locked past the busy timeout; poll again
+                continue
+            time.sleep(self.POLL_SECONDS)
+
+
+class _RespConnection:
+    """Minimal RESP2 client connection (enough for the commands we use)."""
+
+    def __init__(self, host: str, port: int, db: int, password: str | None, timeout: float | None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.command("AUTH", password)
+        if db:
+            self.command("SELECT", db)
+
+    def send(self, *args) -> None:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.sock.sendall(b"".join(parts))
+
+    def read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise CacheError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self.read() for _ in range(length)]
+        raise CacheError(f"Unexpected RESP reply: {line!r}")
+
+    def command(self, *args):
+        self.send(*args)
+        return self.read()
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend(CacheBackend):
+    """Redis-protocol backend; one connection per thread."""
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self, timeout: float | None) -> _RespConnection:
+        return _RespConnection(self.host, self.port, self.db, self.password, timeout)
+
+    def _command(self, *args):
+        conn = getattr(self._local, "conn", None)
+        for attempt in range(2):
+            if conn is None:
+                conn = self._local.conn = self._connect(self.timeout)
+            try:
+                return conn.command(*args)
+            except (ConnectionError, OSError):
+                conn.close()
+                conn = self._local.conn = None
+                if attempt:
+                    raise
+
+    def get(self, key: str) -> bytes | None:
+        return self._command("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        if ttl:
+            self._command("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            self._command("SET", key, value)
+
+    def delete(self, key: str) -> None:
+        self._command("DEL", key)
+
+    def incr(self, key: str) -> int:
+        return int(self._command("INCR", key))
+
+    def publish(self, channel: str, message: str) -> None:
+        self._command("PUBLISH", channel, message)
+
+    def listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        while True:
+            try:
+                conn = self._connect(timeout=None)
+                conn.command("SUBSCRIBE", channel)
+                while True:
+                    reply = conn.read()
+                    if isinstance(reply, list) and reply and reply[0] == b"message":
+                        callback(reply[2].decode())
+            except (ConnectionError, OSError):
+                time.sleep(1.0)  # server restarting; resubscribe
+
+
+class Cache:
+    """
+    JSON-valued facade over a backend, with an L1 in front of shared
+    backends and cross-worker invalidation.
+    """
+
+    def __init__(self, backend: CacheBackend, l1_ttl: float):
+        self.backend = backend
+        self.shared = backend.shared
+        self.l1 = LocalBackend() if backend.shared else None
+        self.l1_ttl = l1_ttl
+        self._listener: threading.Thread | None = None
+
+    def get(self, key: str) -> Any | None:
+        if self.l1 is not None:
+            raw = self.l1.get(key)
+            if raw is not None:
+                return json.loads(raw)
+        try:
+            raw = self.backend.get(key)
+        except (CacheError, OSError):
+            return None  # a cache outage must not take the API down
+        if raw is None:
+            return None
+        if self.l1 is not None:
+            self.l1.set(key, raw, self.l1_ttl)
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        raw = json.dumps(value, separators=(",", ":"), default=str).encode()
+        if self.l1 is not None:
+            self.l1.set(key, raw, min(ttl, self.l1_ttl) if ttl else self.l1_ttl)
+        try:
+            self.backend.set(key, raw, ttl)
+        except (CacheError, OSError):
+            pass
+
+    def incr(self, key: str) -> int | None:
+        """
+        Increment a shared counter and tell other workers it moved.
+        Returns None if the backend is unreachable.
+        """
+        try:
+            value = self.backend.incr(key)
+            if self.l1 is not None:
+                self.l1.set(key, str(value).encode(), self.l1_ttl)
+                self.backend.publish(INVALIDATION_CHANNEL, key)
+        except (CacheError, OSError):
+            if self.l1 is not None:
+                self.l1.delete(key)
+            return None
+        return value
+
+    def invalidate(self, key: str) -> None:
+        if self.l1 is not None:
+            self.l1.delete(key)
+        try:
+            self.backend.delete(key)
+            self.backend.publish(INVALIDATION_CHANNEL, key)
+        except (CacheError, OSError):
+            pass
+
+    def _handle_message(self, key: str) -> None:
+        if self.l1 is not None:
+            self.l1.delete(key)
+
+    def start_listener(self) -> None:
+        if not self.shared or self._listener is not None:
+            return
+        self._listener = threading.Thread(
+            target=self.backend.listen,
+            args=(INVALIDATION_CHANNEL, self._handle_message),
+            name="cache-invalidation",
+            daemon=True,
+        )
+        self._listener.start()
+
+
+def _make_backend() -> CacheBackend:
+    if settings.cache_backend == "sqlite":
+        return SQLiteBackend(settings.cache_sqlite_path)
+    if settings.cache_backend == "redis":
+        return RedisBackend(settings.cache_redis_url)
+    return LocalBackend(max_entries=settings.cache_local_max_entries)
+
+
+cache = Cache(_make_backend(), l1_ttl=settings.cache_l1_ttl_seconds)
@@ -0,0 +1,167 @@
+# app/catalog.py
+"""
+Shared catalog of system meals (meals with user_id NULL).
+
+Loaded once per worker into an immutable, array-backed `MealCatalog`
+with glycemic load, impact bucket and tag bitsets precomputed, so the
+recommendation / analysis / similarity endpoints can merge catalog
+meals in without querying them per request.
+
+Freshness: at most every `catalog_refresh_seconds` a worker runs one
+cheap fingerprint query (count, max id, max timestamp of catalog rows)
+and rebuilds only if it changed. Tools that edit catalog meals in place
+should also touch their `timestamp`.
+"""
+import time
+from threading import Lock
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .similarity import FEATURES, MealMatrix, scale_features
+
+# Impact bucket codes, ordered so that a lower code means a lower GL.
+IMPACTS = ("unknown", "low", "medium", "high")
+_IMPACT_CODE = {name: code for code, name in enumerate(IMPACTS)}
+
+# Tags beyond this many distinct values are not indexed in the bitset.
+MAX_TAG_BITS = 64
+
+
+def _impact_codes(gl: np.ndarray) -> np.ndarray:
+    codes = np.select(
+        [gl < 10, gl < 20, gl >= 20],
+        [_IMPACT_CODE["low"], _IMPACT_CODE["medium"], _IMPACT_CODE["high"]],
+        default=_IMPACT_CODE["unknown"],  # NaN GL
+    )
+    return codes.astype(np.int8)
+
+
+class MealCatalog:
+    """Immutable snapshot of the catalog; replaced wholesale on refresh."""
+
+    __slots__ = (
+        "fingerprint", "ids", "names", "carbs_g", "glycemic_index",
+        "glycemic_load", "impact", "tag_bits", "tag_index", "gl_order", "matrix",
+    )
+
+    def __init__(self, fingerprint: tuple, rows: list[tuple]):
+        self.fingerprint = fingerprint
+        n = len(rows)
+
+        self.ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        self.names = tuple(r[1] for r in rows)
+        self.glycemic_index = np.array([r[2] for r in rows], dtype=np.float64)
+        raw = np.array([r[4:] for r in rows], dtype=np.float64).reshape(n, len(FEATURES))
+        self.carbs_g = raw[:, FEATURES.index("carbs_g")]
+        self.glycemic_load = self.carbs_g * self.glycemic_index / 100.0
+        self.impact = _impact_codes(self.glycemic_load)
+
+        self.tag_index: dict[str, int] = {}
+        self.tag_bits = np.zeros(n, dtype=np.uint64)
+        for i, r in enumerate(rows):
+            bits = 0
+            for tag in (r[3] or "").split(","):
+                tag = tag.strip()
+                if not tag:
+                    continue
+                bit = self.tag_index.get(tag)
+                if bit is None and len(self.tag_index) < MAX_TAG_BITS:
+                    bit = self.tag_index[tag] = len(self.tag_index)
+                if bit is not None:
+                    bits |= 1 << bit
+            self.tag_bits[i] = bits
+
+        # Catalog positions sorted by GL (unknown GL last), for top-N queries.
+        self.gl_order = np.argsort(np.nan_to_num(self.glycemic_load, nan=np.inf), kind="stable")
+
+        self.matrix = MealMatrix(
+            version=hash(fingerprint),
+            ids=self.ids,
+            names=list(self.names),
+            vectors=scale_features(raw),
+            glycemic_load=self.glycemic_load,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def gl_value(self, i: int) -> float | None:
+        gl = self.glycemic_load[i]
+        return None if np.isnan(gl) else float(gl)
+
+    def impact_name(self, i: int) -> str:
+        return IMPACTS[self.impact[i]]
+
+    def select(
+        self,
+        impacts: set[str] | None = None,
+        tags: list[str] | None = None,
+        limit: int | None = None,
+    ) -> np.ndarray:
+        """Catalog positions matching the filters, lowest GL first."""
+        mask = np.ones(len(self), dtype=bool)
+        if impacts is not None:
+            mask &= np.isin(self.impact, [_IMPACT_CODE[i] for i in impacts if i in _IMPACT_CODE])
+        if tags:
+            wanted = 0
+            for tag in tags:
+                bit = self.tag_index.get(tag)
+                if bit is None:
+                    return np.empty(0, dtype=np.int64)
+                wanted |= 1 << bit
+            wanted = np.uint64(wanted)
+            mask &= (self.tag_bits & wanted) == wanted
+
+        ordered = self.gl_order[mask[self.gl_order]]
+        return ordered[:limit] if limit is not None else ordered
+
+
+_EMPTY = MealCatalog(fingerprint=(0, None, None), rows=[])
+
+
+class _CatalogHolder:
+    def __init__(self):
+        self._catalog = _EMPTY
+        self._checked_at = 0.0
+        self._lock = Lock()
+
+    def get(self, db: Session) -> MealCatalog:
+        if time.monotonic() - self._checked_at < settings.catalog_refresh_seconds:
+            return self._catalog
+
+        with self._lock:
+            # Another request may have refreshed while we waited.
+            if time.monotonic() - self._checked_at < settings.catalog_refresh_seconds:
+                return self._catalog
+
+            Meal = models.Meal
+            fingerprint = tuple(
+                db.execute(
+                    select(func.count(Meal.id), func.max(Meal.id), func.max(Meal.timestamp))
+                    .where(Meal.user_id.is_(None))
+                ).one()
+            )
+            if fingerprint != self._catalog.fingerprint:
+                rows = db.execute(
+                    select(
+                        Meal.id, Meal.name, Meal.glycemic_index, Meal.tags,
+                        *(getattr(Meal, f) for f in FEATURES),
+                    ).where(Meal.user_id.is_(None))
+                ).all()
+                self._catalog = MealCatalog(fingerprint, rows)
+            self._checked_at = time.monotonic()
+            return self._catalog
+
+    def invalidate(self) -> None:
+        self._checked_at = 0.0
+
+
+catalog = _CatalogHolder()
+
+
+def get_catalog(db: Session) -> MealCatalog:
+    return catalog.get(db)
@@ -0,0 +1,353 @@
+# app/cohorts.py
+"""
+Cohort-wide glucose analytics for clinicians and admins.
+
+A report covers every user with a given role over a time window:
+
+- pooled time below / in / above range (70-180 mg/dL), mean and SD
+- per-user time-in-range distribution (10%-wide bins)
+- top glycemic meals across users: logged meals ranked by the mean BG
+  rise (bg_after - bg_before), grouped by normalized name and kept only
+  when logged by at least `min_users` users
+
+Users are split into partitions of `cohort_partition_users`. Each
+partition is aggregated in SQL (plus decoded chunk-store blocks) on a
+process pool, and the resulting `CohortPartial`s are summed. Partitions
+don't share users, so every figure except the SD (pooled sums) merges
+exactly. Workers open their own connections, to DATABASE_READ_URL when
+set. `run_report()` yields progress events as partitions finish.
+
+    python -m app.cohorts report --days 14
+    python -m app.cohorts grant clinician@example.com clinician
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from threading import Lock
+from typing import Iterator
+
+import numpy as np
+from sqlalchemy import case, create_engine, func, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from . import models, schemas, timeseries
+from .config import settings
+
+LOW, HIGH = 70.0, 180.0  # mg/dL, standard CGM target range
+TIR_BINS = 10
+
+
+@dataclass
+class CohortPartial:
+    """Mergeable aggregates for a disjoint set of users."""
+
+    users: int = 0
+    users_with_data: int = 0
+    readings: int = 0
+    below: int = 0
+    above: int = 0
+    total: float = 0.0
+    total_sq: float = 0.0
+    tir_hist: list[int] = field(default_factory=lambda: [0] * TIR_BINS)
+    # normalized meal name -> [users, logs, rise sum, GL sum, GL count]
+    meals: dict[str, list[float]] = field(default_factory=dict)
+
+    def merge(self, other: "CohortPartial") -> "CohortPartial":
+        self.users += other.users
+        self.users_with_data += other.users_with_data
+        self.readings += other.readings
+        self.below += other.below
+        self.above += other.above
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.tir_hist = [a + b for a, b in zip(self.tir_hist, other.tir_hist)]
+        for name, stats in other.meals.items():
+            mine = self.meals.get(name)
+            if mine is None:
+                self.meals[name] = list(stats)
+            else:
+                for i, value in enumerate(stats):
+                    mine[i] += value
+        return self
+
+
+def aggregate(conn: Connection, user_ids: list[int], since: datetime, until: datetime) -> CohortPartial:
+    """Aggregate one partition of users."""
+    Reading = models.BloodGlucoseReading
+    # user_id -> [count, below, above, sum, sum of squares]
+    per_user: dict[int, list[float]] = {}
+
+    rows = conn.execute(
+        select(
+            Reading.user_id,
+            func.count(Reading.id),
+            func.sum(case((Reading.value < LOW, 1), else_=0)),
+            func.sum(case((Reading.value > HIGH, 1), else_=0)),
+            func.sum(Reading.value),
+            func.sum(Reading.value * Reading.value),
+        )
+        .where(Reading.user_id.in_(user_ids), Reading.timestamp >= since, Reading.timestamp < until)
+        .group_by(Reading.user_id)
+    )
+    for user_id, count, below, above, total, total_sq in rows:
+        per_user[user_id] = [count, below or 0, above or 0, total or 0.0, total_sq or 0.0]
+
+    if settings.bg_chunk_store:
+        Block = models.BGReadingBlock
+        blocks = conn.execute(
+            select(Block.user_id, Block.payload).where(
+                Block.user_id.in_(user_ids), Block.day >= since.date(), Block.day <= until.date()
+            )
+        )
+        start, end = np.datetime64(since, "us"), np.datetime64(until, "us")
+        for user_id, payload in blocks:
+            block = timeseries.decode_block(payload)
+            values = block.values[(block.timestamps >= start) & (block.timestamps < end)]
+            stats = per_user.setdefault(user_id, [0, 0, 0, 0.0, 0.0])
+            stats[0] += len(values)
+            stats[1] += int((values < LOW).sum())
+            stats[2] += int((values > HIGH).sum())
+            stats[3] += float(values.sum())
+            stats[4] += float((values * values).sum())
+
+    partial = CohortPartial(users=len(user_ids))
+    for count, below, above, total, total_sq in per_user.values():
+        if not count:
+            continue
+        partial.users_with_data += 1
+        partial.readings += count
+        partial.below += below
+        partial.above += above
+        partial.total += total
+        partial.total_sq += total_sq
+        tir = (count - below - above) / count
+        partial.tir_hist[min(int(tir * TIR_BINS), TIR_BINS - 1)] += 1
+
+    Meal, Log = models.Meal, models.MealLog
+    has_gl = Meal.carbs_g.is_not(None) & Meal.glycemic_index.is_not(None)
+    name = func.lower(func.trim(Meal.name))
+    rows = conn.execute(
+        select(
+            name,
+            func.count(func.distinct(Log.user_id)),
+            func.count(Log.id),
+            func.sum(Log.bg_after - Log.bg_before),
+            func.sum(case((has_gl, Meal.carbs_g * Meal.glycemic_index / 100.0), else_=0.0)),
+            func.sum(case((has_gl, 1), else_=0)),
+        )
+        .join(Meal, Meal.id == Log.meal_id)
+        .where(
+            Log.user_id.in_(user_ids),
+            Log.timestamp >= since,
+            Log.timestamp < until,
+            Log.bg_before.is_not(None),
+            Log.bg_after.is_not(None),
+        )
+        .group_by(name)
+    )
+    for meal_name, users, logs, rise, gl_sum, gl_count in rows:
+        partial.meals[meal_name] = [users, logs, rise or 0.0, gl_sum or 0.0, gl_count or 0]
+    return partial
+
+
+# ---------- Process pool ----------
+
+_worker_engine: Engine | None = None
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = Lock()
+
+
+def _init_worker(database_url: str) -> None:
+    global _worker_engine
+    _worker_engine = create_engine(database_url)
+
+
+def _aggregate_in_worker(user_ids: list[int], since: datetime, until: datetime) -> CohortPartial:
+    with _worker_engine.connect() as conn:
+        return aggregate(conn, user_ids, since, until)
+
+
+def _workers() -> int:
+    if settings.cohort_workers is None:
+        return os.cpu_count() or 1
+    return settings.cohort_workers
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Shared pool, started on first use. "spawn" keeps the app's threads and connections out of workers."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from .db import DATABASE_READ_URL, DATABASE_URL
+
+            _executor = ProcessPoolExecutor(
+                max_workers=_workers(),
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(DATABASE_READ_URL or DATABASE_URL,),
+            )
+        return _executor
+
+
+def shutdown() -> None:
+    """Stop the worker pool if one was started (app shutdown)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+# ---------- Reports ----------
+
+def cohort_user_ids(conn: Connection, role: str) -> list[int]:
+    User = models.User
+    return list(conn.scalars(select(User.id).where(User.role == role).order_by(User.id)))
+
+
+def build_report(
+    partial: CohortPartial, since: datetime, until: datetime, min_users: int, top: int, seconds: float
+) -> schemas.CohortReport:
+    n = partial.readings
+    mean = partial.total / n if n else None
+    std = ((partial.total_sq - n * mean * mean) / (n - 1)) ** 0.5 if n > 1 else None
+
+    meals = [
+        schemas.CohortMealImpact(
+            name=name,
+            users=int(users),
+            logs=int(logs),
+            mean_bg_rise=rise / logs,
+            mean_glycemic_load=gl_sum / gl_count if gl_count else None,
+        )
+        for name, (users, logs, rise, gl_sum, gl_count) in partial.meals.items()
+        if users >= min_users and logs
+    ]
+    meals.sort(key=lambda m: m.mean_bg_rise, reverse=True)
+
+    return schemas.CohortReport(
+        since=since,
+        until=until,
+        users=partial.users,
+        users_with_data=partial.users_with_data,
+        readings=n,
+        mean_bg=mean,
+        std_dev=std,
+        time_below_range_pct=100.0 * partial.below / n if n else None,
+        time_in_range_pct=100.0 * (n - partial.below - partial.above) / n if n else None,
+        time_above_range_pct=100.0 * partial.above / n if n else None,
+        tir_distribution=[
+            schemas.CohortTIRBin(lower_pct=i * 100 // TIR_BINS, upper_pct=(i + 1) * 100 // TIR_BINS, users=count)
+            for i, count in enumerate(partial.tir_hist)
+        ],
+        top_meals=meals[:top],
+        seconds=seconds,
+    )
+
+
+def run_report(
+    engine: Engine,
+    user_ids: list[int],
+    since: datetime,
+    until: datetime,
+    min_users: int = 3,
+    top: int = 20,
+) -> Iterator[dict]:
+    """
+    Yield {"event": "progress", ...} as partitions finish, then
+    {"event": "result", "report": CohortReport}.
+    """
+    started = time.perf_counter()
+    size = settings.cohort_partition_users
+    chunks = [user_ids[i:i + size] for i in range(0, len(user_ids), size)]
+    merged = CohortPartial()
+
+    def progress(done: int) -> dict:
+        return {
+            "event": "progress",
+            "partitions_done": done,
+            "partitions": len(chunks),
+            "users_done": min(done * size, len(user_ids)),
+            "users": len(user_ids),
+            "seconds": time.perf_counter() - started,
+        }
+
+    yield progress(0)
+    if len(chunks) <= 1 or _workers() == 0:
+        with engine.connect() as conn:
+            for done, chunk in enumerate(chunks, 1):
+                merged.merge(aggregate(conn, chunk, since, until))
+                yield progress(done)
+    else:
+        futures = [_get_executor().submit(_aggregate_in_worker, chunk, since, until) for chunk in chunks]
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                merged.merge(future.result())
+                yield progress(done)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    report = build_report(merged, since, until, min_users, top, time.perf_counter() - started)
+    yield {"event": "result", "report": report}
+
+
+def grant_role(db: Session, email: str, role: str) -> models.User | None:
+    """
+    Set a user's role and drop their cached copy (see deps.get_current_user).
+    With the "local" cache backend the running workers' copies aren't
+    reached, and pick the role up within CACHE_USER_TTL_SECONDS.
+    """
+    from .cache import cache
+
+    user = db.scalars(select(models.User).where(models.User.email == email)).first()
+    if user is None:
+        return None
+    user.role = role
+    db.commit()
+    cache.invalidate(f"user:{user.id}")
+    return user
+
+
+def main() -> None:
+    from .db import SessionLocal, engine, read_engine
+
+    parser = argparse.ArgumentParser(description="Cohort analytics and clinician/admin roles.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="print a cohort report as JSON (progress on stderr)")
+    report.add_argument("--days", type=int, default=14)
+    report.add_argument("--role", default="user", choices=models.ROLES)
+    report.add_argument("--min-users", type=int, default=3)
+    grant = sub.add_parser("grant", help="set a user's role")
+    grant.add_argument("email")
+    grant.add_argument("role", choices=models.ROLES)
+    args = parser.parse_args()
+
+    if args.command == "grant":
+        with SessionLocal() as db:
+            if grant_role(db, args.email, args.role) is None:
+                raise SystemExit(f"No user {args.email}")
+        print(f"{args.email}: {args.role}")
+        return
+
+    until = datetime.utcnow()
+    since = until - timedelta(days=args.days)
+    source = read_engine or engine
+    with source.connect() as conn:
+        user_ids = cohort_user_ids(conn, args.role)
+    for event in run_report(source, user_ids, since, until, args.min_users):
+        if event["event"] == "progress":
+            print(f"{event['users_done']}/{event['users']} users {event['seconds']:.1f}s", file=sys.stderr)
+        else:
+            print(json.dumps(event["report"].model_dump(mode="json"), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# app/compression.py
+"""
+Response compression (gzip, or brotli when the `brotli` package is
+installed), negotiated from Accept-Encoding.
+
+- Bodies sent in one piece are compressed only if at least
+  `compression_min_bytes` long. Smaller ones go out as-is.
+- Streaming bodies (exports) are compressed chunk by chunk with a
+  flush after each chunk. Memory stays flat, and the client still sees
+  data as it is produced.
+- Already-encoded responses, `application/gzip` downloads and SSE
+  streams are passed through untouched.
+
+Pure ASGI like the other middlewares here.
+"""
+import zlib
+
+from starlette.datastructures import MutableHeaders
+
+from .config import settings
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+# Content types that are already compressed or must not be buffered.
+SKIP_CONTENT_TYPES = ("text/event-stream", "application/gzip", "application/zip", "image/")
+
+
+class _GzipEncoder:
+    name = "gzip"
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliEncoder:
+    name = "br"
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=settings.compression_brotli_quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+def choose_encoding(accept_encoding: str) -> type | None:
+    """Preferred encoder for an Accept-Encoding header (brotli first)."""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return _BrotliEncoder
+    if "gzip" in accepted or "*" in accepted:
+        return _GzipEncoder
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.compression_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        encoder_cls = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                encoder_cls = choose_encoding(value.decode("latin-1"))
+                break
+        if encoder_cls is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, encoder, passthrough
+
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", []))
+                headers = MutableHeaders(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or content_type.startswith(SKIP_CONTENT_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message  # held until we see the body
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if encoder is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < settings.compression_min_bytes:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                encoder = encoder_cls()
+                headers["Content-Encoding"] = encoder.name
+                if more_body:
+                    del headers["Content-Length"]
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": encoder.chunk(body), "more_body": True})
+                else:
+                    compressed = encoder.finish(body)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressed})
+                return
+
+            if more_body:
+                await send({"type": "http.response.body", "body": encoder.chunk(body), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": encoder.finish(body)})
+
+        await self.app(scope, receive, compressing_send)
@@ -1,13 +1,148 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     # USDA FoodData Central API key (from env var FDC_API_KEY)
     fdc_api_key: str | None = None
+    # Overridable so benchmarks can point at a local stub
+    fdc_base_url: str = "https://api.nal.usda.gov/fdc/v1"
 
     # Optional: accept DATABASE_URL without blowing up,
     # even if we don't use it here
     database_url: str | None = None
 
+    # Server-Sent Events stream of BG readings:
+    # seconds between keep-alive comments, and max queued events per client
+    sse_heartbeat_seconds: float = 15.0
+    sse_buffer_size: int = 32
+
+    # Hypo/hyper + trend alerts on BG ingest (mg/dL, minutes)
+    alert_low_mg_dl: float = 70.0
+    alert_high_mg_dl: float = 180.0
+    alert_prediction_minutes: int = 30
+    alert_rapid_rate_mg_dl_per_min: float = 2.0
+    alert_max_tracked_users: int = 200_000
+
+    # Columnar day-block storage for older BG readings (see app/timeseries.py).
+    # Reads merge blocks with live rows only while this is enabled.
+    bg_chunk_store: bool = False
+    bg_chunk_store_min_age_days: int = 2
+
+    # Bulk CGM/meter file import: LibreView "Device Timestamp" format
+    # (US exports use month first; EU exports use "%d-%m-%Y %H:%M")
+    import_libre_timestamp_format: str = "%m-%d-%Y %H:%M"
+    import_max_upload_mb: int = 200
+
+    # Per-user meal nutrient matrices kept in memory for /meals/{id}/similar
+    meal_matrix_cache_users: int = 10_000
+
+    # Shared meal catalog (user_id NULL): seconds between version checks
+    catalog_refresh_seconds: float = 60.0
+
+    # Per-user memo of /meals/analysis/all (LRU across users)
+    analysis_cache_max_users: int = 50_000
+    analysis_cache_max_mb: int = 64
+
+    # Per-user precomputed recommendations for every BG band (LRU)
+    recommendation_snapshot_max_users: int = 50_000
+
+    # Cache layer (app/cache.py): "local", "sqlite" or "redis"
+    cache_backend: Literal["local", "sqlite", "redis"] = "local"
+    cache_sqlite_path: str = "./cache.sqlite3"
+    cache_redis_url: str = "redis://localhost:6379/0"
+    cache_local_max_entries: int = 10_000
+    cache_l1_ttl_seconds: float = 5.0
+    cache_user_ttl_seconds: float = 300.0
+    cache_usda_search_ttl_seconds: float = 24 * 3600.0
+    cache_analysis_ttl_seconds: float = 3600.0
+
+    # Response compression (app/compression.py); brotli is used when the
+    # optional `brotli` package is installed and the client accepts it.
+    compression_enabled: bool = True
+    compression_min_bytes: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+
+    # Idempotency-Key support for POSTs (app/idempotency.py): how long a
+    # key's response is replayed, how long an unfinished request holds
+    # its key, and how many recent responses each worker keeps in memory.
+    idempotency_enabled: bool = True
+    idempotency_ttl_seconds: float = 24 * 3600.0
+    idempotency_lock_seconds: float = 60.0
+    idempotency_memory_keys: int = 10_000
+
+    # Rate limiting (app/ratelimit.py). Keys are path prefixes ("" = any
+    # other route); rate_limits values are (requests per second, burst)
+    # per user, concurrency_limits values are max in-flight per worker.
+    rate_limit_enabled: bool = True
+    rate_limits: dict[str, tuple[float, int]] = {
+        "": (20.0, 100),
+        "/auth/login": (0.5, 10),
+        "/food-search": (2.0, 20),
+        "/diabetes/bg-readings": (5.0, 60),
+    }
+    concurrency_limits: dict[str, int] = {
+        "/diabetes/bg-stats": 8,
+        "/diabetes/recommend-meals": 8,
+        "/diabetes/bg-readings/import": 2,
+        "/meals/analysis": 8,
+        "/export": 4,
+        "/cohorts": 2,
+    }
+
+    # Instrumentation (app/metrics.py): Prometheus text at /metrics, and
+    # an optional Server-Timing header with DB / stage breakdowns.
+    metrics_enabled: bool = True
+    metrics_server_timing: bool = False
+
+    # Development / CI query debugging (app/querydebug.py): flags repeated
+    # SELECT shapes (N+1) and EXPLAINs statements slower than the threshold.
+    query_debug: bool = False
+    query_debug_slow_ms: float = 100.0
+    query_debug_n_plus_one: int = 5
+
+    # Monthly range partitioning of bg_readings (Postgres only, see
+    # app/partitions.py). Retention None keeps every partition attached.
+    bg_partitioning: bool = False
+    bg_partition_months_ahead: int = 2
+    bg_partition_retention_months: int | None = None
+    bg_partition_check_hours: float = 24.0
+
+    # Retention tiers (app/retention.py): raw readings older than
+    # bg_retention_raw_days are rolled into hourly + daily summaries;
+    # hourly rows older than bg_retention_hourly_days are dropped.
+    # None disables the tier. batch_days caps days rolled per user per run.
+    bg_retention_raw_days: int | None = None
+    bg_retention_hourly_days: int | None = None
+    bg_retention_check_hours: float = 6.0
+    bg_retention_batch_days: int = 31
+
+    # With DATABASE_READ_URL set, how long a user's reads stay on the
+    # primary after one of their writes commits (read-your-writes).
+    # The pin is shared through the cache, so a replica requires
+    # cache_backend "sqlite" or "redis".
+    read_replica_sticky_seconds: float = 10.0
+
+    # Cohort reports (app/cohorts.py): process pool size (None = CPU
+    # count, 0 = run in the request thread) and users per partition.
+    cohort_workers: int | None = None
+    cohort_partition_users: int = 500
+
+    # Startup (lifespan in app/main.py). schema_on_startup: "upgrade"
+    # creates tables and applies migrations in every worker; "verify"
+    # refuses to start with a stale schema, for deploys that run
+    # `python -m app.migrations upgrade` as a release step; "off" skips
+    # both. startup_warmup loads the meal catalog, password hasher and
+    # USDA client before the first request instead of during it.
+    schema_on_startup: Literal["upgrade", "verify", "off"] = "upgrade"
+    startup_warmup: bool = False
+
+    # Delta sync (app/sync.py): days of BG readings in an initial
+    # (since=0) snapshot, and how long applied upload op ids are kept.
+    sync_initial_bg_days: int = 90
+    sync_op_retention_days: int = 30
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
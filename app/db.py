@@ -1,9 +1,12 @@
 import os
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine.url import make_url
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+
+from .cache import cache
+from .config import settings
 
 # Load .env file if present
 load_dotenv()
@@ -11,15 +14,87 @@ load_dotenv()
 # Default to SQLite for dev, can be overridden by .env
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./diabetic.db")
 
+# Optional read replica for read-only handlers (see RoutingSession).
+# Locally, a copy of the SQLite file or a second Postgres instance
+# works; nothing replicates to it, so refresh it by hand.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
+
+def _create_engine(database_url: str):
+    connect_args = {}
+    # Only SQLite needs check_same_thread
+    if make_url(database_url).drivername.startswith("sqlite"):
+        connect_args = {"check_same_thread": False}
+    return create_engine(database_url, connect_args=connect_args)
+
+
 url = make_url(DATABASE_URL)
 
-connect_args = {}
-# Only SQLite needs check_same_thread
-if url.drivername.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+engine = _create_engine(DATABASE_URL)
+read_engine = _create_engine(DATABASE_READ_URL) if DATABASE_READ_URL else None
+
+
+class RoutingSession(Session):
+    """
+    Sends reads to `read_engine` while `info["replica"]` is set (see
+    deps.use_read_replica). Flushes and INSERT/UPDATE/DELETE statements
+    always go to the primary, and once a session has written, its later
+    reads do too.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if read_engine is not None and self.info.get("replica"):
+            if not self._flushing and not getattr(clause, "is_dml", False):
+                return read_engine
+            self.info["replica"] = False
+        if clause is not None and getattr(clause, "is_dml", False):
+            self.info["wrote"] = True
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+def mark_primary(user_id: int) -> None:
+    """
+    Pin the user's reads to the primary for `read_replica_sticky_seconds`.
+    The pin lives in the cache, so every worker has to see it: the app
+    refuses to start with a read replica on the per-process "local"
+    backend (see `check_read_replica`).
+    """
+    cache.set(f"db-primary:{user_id}", 1, ttl=settings.read_replica_sticky_seconds)
+
+
+def is_pinned_to_primary(user_id: int) -> bool:
+    return cache.get(f"db-primary:{user_id}") is not None
+
+
+def check_read_replica() -> None:
+    if read_engine is not None and settings.cache_backend == "local":
+        raise RuntimeError(
+            "DATABASE_READ_URL needs a shared cache (CACHE_BACKEND=sqlite or redis): "
+            "read-your-writes pins are kept in the cache, and the local backend is per-process"
+        )
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+if read_engine is not None:
+    # Read-your-writes: a user's committed writes pin their next reads
+    # to the primary until the replica has (probably) caught up.
+    @event.listens_for(SessionLocal, "after_flush")
+    def _flushed(session, flush_context):
+        session.info["wrote"] = True
+
+    @event.listens_for(SessionLocal, "after_commit")
+    def _committed(session):
+        if session.info.pop("wrote", False) and session.info.get("user_id") is not None:
+            mark_primary(session.info["user_id"])
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+Base = declarative_base()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Development / CI: per-request statement counts, N+1 and slow-query
+# reports (QUERY_DEBUG=true).
+if settings.query_debug:
+    from .querydebug import attach
 
-Base = declarative_base()
\ No newline at end of file
+    attach(engine)
+    if read_engine is not None:
+        attach(read_engine)
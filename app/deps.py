@@ -1,19 +1,37 @@
 # app/deps.py
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from jose import JWTError
 
-from .db import SessionLocal
-from . import models
+from .cache import cache
+from .config import settings
+from .db import SessionLocal, is_pinned_to_primary, read_engine
+from . import metrics, models
 from .security import decode_access_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
-def get_db():
+def use_read_replica(request: Request):
+    """
+    Route-level dependency marking a read-only handler that may be
+    served from DATABASE_READ_URL. Must be listed in the route's
+    `dependencies=` so it runs before get_db.
+    """
+    request.state.read_replica = True
+
+
+def get_db(request: Request):
     db = SessionLocal()
+    if read_engine is not None and getattr(request.state, "read_replica", False):
+        db.info["replica"] = True
     try:
+        if settings.metrics_enabled:
+            # Check the connection out up front so pool wait shows up as
+            # its own stage instead of inside the first query.
+            with metrics.timed("pool_wait"):
+                db.connection()
         yield db
     finally:
         db.close()
@@ -24,10 +42,12 @@ def get_current_user(
     db: Session = Depends(get_db),
 ):
     try:
-        payload = decode_access_token(token)
+        with metrics.timed("jwt_decode"):
+            payload = decode_access_token(token)
         user_id = payload.get("sub")
         if user_id is None:
             raise ValueError()
+        user_id = int(user_id)
     except (JWTError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -35,10 +55,28 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user = db.query(models.User).filter(models.User.id == int(user_id)).first()
+    # Writes by this user are attributed to them for read-your-writes.
+    db.info["user_id"] = user_id
+    if db.info.get("replica") and is_pinned_to_primary(user_id):
+        db.info["replica"] = False
+
+    # Cached as a detached User without the password hash; routes only
+    # need the id (and occasionally email / name / role).
+    key = f"user:{user_id}"
+    cached = cache.get(key)
+    if cached is not None:
+        return models.User(**cached)
+
+    with metrics.timed("user_lookup"):
+        user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
 
+    cache.set(
+        key,
+        {"id": user.id, "email": user.email, "full_name": user.full_name, "role": user.role},
+        ttl=settings.cache_user_ttl_seconds,
+    )
     return user
 
 
@@ -46,3 +84,14 @@ def get_current_active_user(
     current_user = Depends(get_current_user),
 ):
     return current_user
+
+
+def require_role(*roles: str):
+    """Dependency factory: the current user must have one of `roles`."""
+
+    def check(current_user: models.User = Depends(get_current_active_user)):
+        if (current_user.role or "user") not in roles:
+            raise HTTPException(status_code=403, detail="Not permitted for this account")
+        return current_user
+
+    return check
@@ -0,0 +1,102 @@
+# app/events.py
+"""
+In-process pub/sub used to push new BG readings and alerts to
+connected Server-Sent Events clients.
+
+Each subscriber gets a small bounded queue. Publishing never blocks:
+if a slow client's queue is full we drop its oldest event, so one
+stalled browser tab can't grow memory without bound.
+"""
+import asyncio
+import json
+from collections import defaultdict
+from typing import Any
+
+from .config import settings
+
+
+class Subscription:
+    __slots__ = ("user_id", "queue", "dropped")
+
+    def __init__(self, user_id: int, maxsize: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, event: dict[str, Any]) -> None:
+        if self.queue.full():
+            # Drop the oldest event rather than blocking the publisher.
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EventBroker:
+    """
+    Fan-out of per-user events to every subscription for that user.
+
+    `publish` is safe to call from sync route handlers (which FastAPI
+    runs in a threadpool): delivery is handed to the event loop that
+    owns the subscriber queues.
+    """
+
+    def __init__(self, buffer_size: int = 32):
+        self.buffer_size = buffer_size
+        self._subscribers: dict[int, set[Subscription]] = defaultdict(set)
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def subscribe(self, user_id: int) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        sub = Subscription(user_id, self.buffer_size)
+        self._subscribers[user_id].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subscribers.get(sub.user_id)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subscribers[sub.user_id]
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return user_id in self._subscribers
+
+    def connection_count(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def publish(self, user_id: int, event: dict[str, Any]) -> None:
+        # Cheap early exit: most writes happen with nobody listening.
+        if user_id not in self._subscribers or self._loop is None:
+            return
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self._loop:
+            self._fan_out(user_id, event)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fan_out, user_id, event)
+
+    def _fan_out(self, user_id: int, event: dict[str, Any]) -> None:
+        for sub in tuple(self._subscribers.get(user_id, ())):
+            sub.offer(event)
+
+
+def format_sse(event: dict[str, Any]) -> str:
+    """
+    Encode an event dict ({"event": ..., "id": ..., "data": ...})
+    as a text/event-stream frame.
+    """
+    lines = []
+    if event.get("id") is not None:
+        lines.append(f"id: {event['id']}")
+    if event.get("event"):
+        lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event.get('data'), default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+broker = EventBroker(buffer_size=settings.sse_buffer_size)
@@ -0,0 +1,57 @@
+# app/fieldsets.py
+"""
+Sparse fieldsets (`?fields=id,name,carbs_g`) for list endpoints.
+
+The requested names are checked against the endpoint's response
+schema. Only those columns are selected from the database, so a client
+that skips description / photo_url doesn't pay to load or transfer
+them. Responses built here bypass `response_model` validation, since
+partial rows wouldn't pass it.
+"""
+import json
+from datetime import date, datetime
+from typing import Iterable
+
+from fastapi import HTTPException, Query
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+FIELDS_QUERY = Query(
+    default=None,
+    description="Comma-separated subset of response fields to return, e.g. `id,name,carbs_g`.",
+)
+
+
+def parse(fields: str | None, schema: type[BaseModel]) -> list[str] | None:
+    """Requested field names in order, or None for the full schema."""
+    if fields is None:
+        return None
+    names = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [n for n in names if n not in schema.model_fields]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {unknown}")
+    return names or None
+
+
+def columns(model, names: list[str]) -> list:
+    return [getattr(model, name) for name in names]
+
+
+def json_default(value):
+    """`default=` for json.dumps: dates and datetimes as ISO 8601."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def response(names: list[str], rows: Iterable[tuple]) -> Response:
+    # Plain json.dumps (same output as JSONResponse); jsonable_encoder
+    # would cost more than the columns we skipped.
+    body = json.dumps(
+        [dict(zip(names, row)) for row in rows],
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=json_default,
+    )
+    return Response(body.encode("utf-8"), media_type="application/json")
@@ -0,0 +1,283 @@
+# app/idempotency.py
+"""
+Idempotency-Key support for POST requests.
+
+A client that may retry a write (flaky mobile networks) sends a unique
+`Idempotency-Key` header. The first request with a given key runs
+normally and its response (status, content type, body) is stored. A
+retry with the same key gets that stored response back, marked with
+`Idempotent-Replayed: true`, without running the handler again.
+
+- Keys are scoped to the caller: the JWT subject, or the client IP for
+  anonymous requests.
+- Reusing a key for a different method, path or body answers 422.
+- A retry while the first request is still running answers 409. If a
+  worker died mid-request, its claim is taken over after
+  `idempotency_lock_seconds`.
+- 5xx responses are not stored, so the client can retry them.
+- Entries expire after `idempotency_ttl_seconds`.
+
+Storage: the `idempotency_keys` table is authoritative, so every
+worker sees every key. Each worker also keeps its most recent
+responses in an in-memory LRU, so a replay on the same worker never
+touches the database. Requests without the header cost one header
+scan.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+from .config import settings
+from .db import SessionLocal
+from .ratelimit import request_subject
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+# Expired rows are deleted every this many new keys.
+_SWEEP_EVERY = 1000
+
+
+class _Stored:
+    __slots__ = ("request_hash", "status", "content_type", "body", "expires")
+
+    def __init__(self, request_hash: str, status: int, content_type: str | None, body: bytes, expires: float):
+        self.request_hash = request_hash
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.expires = expires
+
+
+class _Conflict(Exception):
+    def __init__(self, status: int, detail: str):
+        self.status = status
+        self.detail = detail
+
+
+class IdempotencyStore:
+    def __init__(self, max_memory_keys: int):
+        self.max_memory_keys = max_memory_keys
+        self._memory: OrderedDict[tuple[str, str], _Stored] = OrderedDict()
+        self._lock = Lock()
+        self._claims = 0
+
+    # ---------- in-memory LRU ----------
+
+    def recent(self, subject: str, key: str) -> _Stored | None:
+        with self._lock:
+            stored = self._memory.get((subject, key))
+            if stored is None:
+                return None
+            if stored.expires < time.time():
+                del self._memory[subject, key]
+                return None
+            self._memory.move_to_end((subject, key))
+            return stored
+
+    def _remember(self, subject: str, key: str, stored: _Stored) -> None:
+        with self._lock:
+            self._memory[subject, key] = stored
+            self._memory.move_to_end((subject, key))
+            while len(self._memory) > self.max_memory_keys:
+                self._memory.popitem(last=False)
+
+    # ---------- table ----------
+
+    def claim(self, subject: str, key: str, request_hash: str) -> _Stored | None:
+        """
+        Claim the key for a new request (returns None), or return the
+        stored response for a replay. Raises _Conflict on mismatch or
+        while another request holds the key.
+        """
+        now = datetime.utcnow()
+        Key = models.IdempotencyKey
+        with SessionLocal() as db:
+            # New keys are the common case: insert first, look up on conflict.
+            for _ in range(2):
+                db.add(Key(
+                    subject=subject,
+                    key=key,
+                    request_hash=request_hash,
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=settings.idempotency_ttl_seconds),
+                ))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+                else:
+                    self._claims += 1
+                    if self._claims % _SWEEP_EVERY == 0:
+                        db.execute(delete(Key).where(Key.expires_at <= now))
+                        db.commit()
+                    return None
+
+                row = db.scalar(select(Key).where(Key.subject == subject, Key.key == key))
+                if row is None or row.expires_at <= now:
+                    if row is not None:
+                        db.delete(row)
+                        db.commit()
+                    continue
+                break
+            else:
+                raise _Conflict(409, "A request with this Idempotency-Key is already in progress")
+
+            if row.request_hash != request_hash:
+                raise _Conflict(422, "Idempotency-Key was already used for a different request")
+            if row.status_code is None:
+                if row.created_at > now - timedelta(seconds=settings.idempotency_lock_seconds):
+                    raise _Conflict(409, "A request with this Idempotency-Key is already in progress")
+                # The worker that claimed it never finished; take over.
+                row.created_at = now
+                db.commit()
+                return None
+
+            stored = _Stored(
+                row.request_hash, row.status_code, row.content_type, row.body or b"",
+                time.time() + (row.expires_at - now).total_seconds(),
+            )
+        self._remember(subject, key, stored)
+        return stored
+
+    def complete(
+        self, subject: str, key: str, request_hash: str, status: int, content_type: str | None, body: bytes
+    ) -> None:
+        Key = models.IdempotencyKey
+        with SessionLocal() as db:
+            row = db.scalar(select(Key).where(Key.subject == subject, Key.key == key))
+            if row is None:
+                return
+            if status >= 500:
+                db.delete(row)
+                db.commit()
+                return
+            row.status_code = status
+            row.content_type = content_type
+            row.body = body
+            expires = time.time() + (row.expires_at - datetime.utcnow()).total_seconds()
+            db.commit()
+        self._remember(subject, key, _Stored(request_hash, status, content_type, body, expires))
+
+
+def _request_hash(scope, body: bytes) -> str:
+    digest = hashlib.sha256()
+    digest.update(scope["method"].encode())
+    digest.update(b" ")
+    digest.update(scope["path"].encode())
+    digest.update(b"?")
+    digest.update(scope.get("query_string", b""))
+    digest.update(b"\n")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+async def _send_stored(send, stored: _Stored, replayed: bool) -> None:
+    headers = [(b"content-length", str(len(stored.body)).encode())]
+    if stored.content_type:
+        headers.append((b"content-type", stored.content_type.encode("latin-1")))
+    if replayed:
+        headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": stored.status, "headers": headers})
+    await send({"type": "http.response.body", "body": stored.body})
+
+
+async def _send_error(send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await _send_stored(send, _Stored("", status, "application/json", body, 0.0), replayed=False)
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware; only POSTs carrying an Idempotency-Key are touched."""
+
+    def __init__(self, app, store: "IdempotencyStore | None" = None):
+        self.app = app
+        self.store = store or idempotency_store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not settings.idempotency_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        key = None
+        for name, value in scope["headers"]:
+            if name == HEADER:
+                key = value.decode("latin-1").strip()
+                break
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _send_error(send, 400, "Idempotency-Key is too long")
+            return
+
+        # Buffer the body: it is part of the fingerprint, and the app
+        # still needs to read it afterwards.
+        chunks = []
+        more = True
+        while more:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        subject = request_subject(scope)
+        request_hash = _request_hash(scope, body)
+
+        stored = self.store.recent(subject, key)
+        if stored is None:
+            try:
+                stored = await run_in_threadpool(self.store.claim, subject, key, request_hash)
+            except _Conflict as exc:
+                await _send_error(send, exc.status, exc.detail)
+                return
+        elif stored.request_hash != request_hash:
+            await _send_error(send, 422, "Idempotency-Key was already used for a different request")
+            return
+
+        if stored is not None:
+            await _send_stored(send, stored, replayed=True)
+            return
+
+        replayed_body = False
+
+        async def replay_receive():
+            nonlocal replayed_body
+            if not replayed_body:
+                replayed_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status = 500
+        content_type = None
+        response = []
+
+        async def capture_send(message):
+            nonlocal status, content_type
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-type":
+                        content_type = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                response.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        finally:
+            await run_in_threadpool(
+                self.store.complete, subject, key, request_hash, status, content_type, b"".join(response)
+            )
+
+
+idempotency_store = IdempotencyStore(max_memory_keys=settings.idempotency_memory_keys)
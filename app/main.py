@@ -1,22 +1,77 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
 from . import models, schemas
-from .db import engine, Base
-from .deps import get_db
+from .db import SessionLocal, check_read_replica, engine, read_engine
+from .deps import get_db, require_role
 from .routes_meals import router as meals_router
 from .routes_diabetes import router as diabetes_router
 from .routes_auth import router as auth_router
 from .routes_recommendations import router as recommendations_router
 from .routes_food_search import router as food_search_router
-from .security import get_password_hash
+from .routes_export import router as export_router
+from .routes_sync import router as sync_router
+from .routes_cohorts import router as cohorts_router
+from .config import settings
+from .cache import cache
+from .catalog import get_catalog
+from .cohorts import shutdown as shutdown_cohort_workers
+from .migrations import check as check_schema, upgrade as upgrade_schema
+from .partitions import start_maintenance as start_partition_maintenance
+from .retention import start_job as start_retention_job
+from .compression import CompressionMiddleware
+from .idempotency import IdempotencyMiddleware
+from .metrics import MetricsMiddleware, instrument_engine, render_prometheus
+from .querydebug import QueryDebugMiddleware
+from .ratelimit import RateLimitMiddleware
+from .security import get_password_hash, pwd_context
+
+
+def warm_up() -> None:
+    """Pay the first-request costs at startup (STARTUP_WARMUP=true)."""
+    with SessionLocal() as db:
+        get_catalog(db)
+    # Loads the bcrypt backend without hashing anything.
+    pwd_context().handler("bcrypt").get_backend()
+    if settings.fdc_api_key:
+        import httpx  # noqa: F401
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema work, background jobs and warm-up run here rather than at
+    # import, so importing the app (workers, CLIs, tests) stays cheap.
+    check_read_replica()
+    if settings.schema_on_startup == "upgrade":
+        upgrade_schema(engine)
+    elif settings.schema_on_startup == "verify":
+        problems = check_schema(engine)
+        if problems:
+            raise RuntimeError(
+                f"Database schema is out of date ({'; '.join(problems)}); "
+                "run `python -m app.migrations upgrade`"
+            )
+    cache.start_listener()
+    stop = threading.Event()
+    start_partition_maintenance(engine, stop)
+    start_retention_job(stop)
+    if settings.startup_warmup:
+        warm_up()
+    yield
+    stop.set()
+    shutdown_cohort_workers()
 
 
 app = FastAPI(
     title="Diabetic Meal Planner API",
     version="0.3.0",
-    description="Backend API for a diabetic meal recommendation app."
+    description="Backend API for a diabetic meal recommendation app.",
+    lifespan=lifespan,
 )
 
 origins = [
@@ -24,6 +79,16 @@ origins = [
     "http://127.0.0.1:3000",
 ]
 
+# Innermost: replays of an Idempotency-Key still count against rate limits.
+app.add_middleware(IdempotencyMiddleware)
+
+# Added before CORS so CORS stays outermost and 429/503s get CORS headers.
+app.add_middleware(RateLimitMiddleware)
+
+# Outside idempotency, so stored responses are replayed in whatever
+# encoding the retry accepts.
+app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -32,20 +97,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.query_debug:
+    app.add_middleware(QueryDebugMiddleware)
+
+# Outermost, so request latency includes rate limiting and CORS.
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    if read_engine is not None:
+        instrument_engine(read_engine, pool_gauge="db_read_pool_checked_out")
+
 # Register the meals and diabetes router
 app.include_router(auth_router)
 app.include_router(meals_router)
 app.include_router(diabetes_router)
 app.include_router(recommendations_router)
 app.include_router(food_search_router)
-
-# Create database tables on startup
-Base.metadata.create_all(bind=engine)
+app.include_router(export_router)
+app.include_router(sync_router)
+app.include_router(cohorts_router)
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.post("/users", response_model=schemas.UserRead, status_code=status.HTTP_201_CREATED)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     # check if user already exists
@@ -65,7 +146,23 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return db_user
 
 
-@app.get("/users", response_model=list[schemas.UserRead])
-def list_users(db: Session = Depends(get_db)):
-    users = db.query(models.User).all()
-    return users
+@app.get(
+    "/users",
+    response_model=list[schemas.UserRead],
+    dependencies=[Depends(require_role("admin"))],
+)
+def list_users(
+    after_id: int = 0,
+    limit: int = Query(default=100, ge=1, le=1000),
+    role: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Admin only. Keyset-paginated by id: pass the last id of a page as
+    `after_id` to get the next one. Served from the primary key, or
+    from ix_users_role_id when filtering by role.
+    """
+    query = db.query(models.User).filter(models.User.id > after_id)
+    if role is not None:
+        query = query.filter(models.User.role == role)
+    return query.order_by(models.User.id).limit(limit).all()
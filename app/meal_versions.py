@@ -0,0 +1,40 @@
+# app/meal_versions.py
+"""
+Per-user meal-set version counters.
+
+Every meal write bumps the owner's version. In-memory structures
+derived from a user's meals (nutrient matrices, analysis results)
+remember the version they were built from and rebuild when it moves.
+
+With a shared cache backend the counters live there (INCR), so every
+worker sees a write made by any other worker; the Redis/SQLite store
+must not evict these TTL-less keys. If it is unreachable, `bump()`
+returns None and other workers may serve derived results built before
+the write until it recovers; meal writes themselves still succeed.
+With the local backend they are plain in-process counters.
+"""
+from threading import Lock
+
+from .cache import cache
+
+_versions: dict[int | None, int] = {}
+_lock = Lock()
+
+
+def _key(user_id: int | None) -> str:
+    return f"meal-version:{'catalog' if user_id is None else user_id}"
+
+
+def current(user_id: int | None) -> int:
+    if cache.shared:
+        return int(cache.get(_key(user_id)) or 0)
+    return _versions.get(user_id, 0)
+
+
+def bump(user_id: int | None) -> int | None:
+    if cache.shared:
+        return cache.incr(_key(user_id))
+    with _lock:
+        version = _versions.get(user_id, 0) + 1
+        _versions[user_id] = version
+        return version
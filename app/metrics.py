@@ -0,0 +1,289 @@
+# app/metrics.py
+"""
+Request timing and hot-path instrumentation, exported in Prometheus
+text format at /metrics.
+
+- MetricsMiddleware: per-route latency histograms and status counts,
+  plus an optional `Server-Timing` header per response
+- SQLAlchemy cursor events: statement counts and time, attributed to
+  the current request through a context variable
+- `timed(stage)`: named stages on the hot path (JWT decode, user
+  lookup, pool wait, USDA calls)
+- `usda_*` counters for upstream latency and cache hit rates
+
+Nothing is registered when `metrics_enabled` is false, so the cost
+when disabled is a settings check at startup.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _label_str(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{self._label_str(k)} {v:g}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Gauge read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, func):
+        super().__init__(name, help_text)
+        self.func = func
+
+    def render(self) -> list[str]:
+        return self.header() + [f"{self.name} {self.func():g}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., sum, count]
+        self._series: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = self.header()
+        for labels, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = self._label_str(labels, 'le="%g"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative:g}")
+            le = self._label_str(labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {series[-1]:g}")
+            lines.append(f"{self.name}_sum{self._label_str(labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{self._label_str(labels)} {series[-1]:g}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+http_requests = _register(Counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+))
+http_latency = _register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route")
+))
+http_db_queries = _register(Histogram(
+    "http_request_db_queries", "DB statements issued per request.", ("route",), COUNT_BUCKETS
+))
+http_db_time = _register(Histogram(
+    "http_request_db_seconds", "Time spent in DB statements per request.", ("route",)
+))
+db_query_time = _register(Histogram(
+    "db_query_duration_seconds", "Individual DB statement latency."
+))
+stage_time = _register(Histogram(
+    "app_stage_duration_seconds", "Latency of named hot-path stages.", ("stage",)
+))
+usda_requests = _register(Counter(
+    "usda_requests_total", "Upstream USDA FoodData Central calls.", ("endpoint", "status")
+))
+usda_latency = _register(Histogram(
+    "usda_request_duration_seconds", "Upstream USDA call latency.", ("endpoint",)
+))
+usda_cache = _register(Counter(
+    "usda_cache_total", "USDA data lookups served from cache vs upstream.", ("cache", "result")
+))
+
+
+class RequestStats:
+    __slots__ = ("db_queries", "db_seconds", "stages")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.stages: dict[str, float] = {}
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> RequestStats | None:
+    return _current.get()
+
+
+@contextmanager
+def timed(stage: str):
+    """Record a named stage both globally and on the current request."""
+    if not settings.metrics_enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_time.observe(elapsed, stage)
+        stats = _current.get()
+        if stats is not None:
+            stats.stages[stage] = stats.stages.get(stage, 0.0) + elapsed
+
+
+class _UsdaCall:
+    __slots__ = ("status",)
+
+    def __init__(self):
+        self.status = "error"
+
+
+@contextmanager
+def usda_call(endpoint: str):
+    """Time one upstream USDA call; set `.status` on the yielded object."""
+    call = _UsdaCall()
+    if not settings.metrics_enabled:
+        yield call
+        return
+    with timed(f"usda_{endpoint}"):
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            usda_latency.observe(time.perf_counter() - start, endpoint)
+            usda_requests.inc(endpoint, call.status)
+
+
+def cache_result(cache: str, hit: bool, amount: int = 1) -> None:
+    if settings.metrics_enabled and amount:
+        usda_cache.inc(cache, "hit" if hit else "miss", amount=amount)
+
+
+def instrument_engine(engine: Engine, pool_gauge: str = "db_pool_checked_out") -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_query_time.observe(elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+
+    pool = engine.pool
+    if hasattr(pool, "checkedout"):
+        _register(Gauge(pool_gauge, "Connections currently checked out.", pool.checkedout))
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+                if settings.metrics_server_timing:
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", _server_timing(stats, time.perf_counter() - start).encode())
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+
+            http_requests.inc(method, route_path, status_holder[0])
+            http_latency.observe(elapsed, method, route_path)
+            http_db_queries.observe(stats.db_queries, route_path)
+            http_db_time.observe(stats.db_seconds, route_path)
+
+
+def _server_timing(stats: RequestStats, total: float) -> str:
+    parts = [f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.db_queries} queries"']
+    parts += [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in stats.stages.items()]
+    parts.append(f"app;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+def render_prometheus() -> str:
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,355 @@
+# app/migrations.py
+"""
+Schema migrations.
+
+`upgrade()` runs from the CLI, and at startup unless
+SCHEMA_ON_STARTUP is "verify" (just `check()`: refuse to start on a
+stale schema) or "off". It first lets
+`create_all` create any missing tables (together with their indexes),
+then applies, in order, the versioned migrations below that this
+database hasn't recorded in `schema_migrations`. Those cover what
+`create_all` can't do to existing tables, such as new indexes and
+columns.
+
+Index migrations are online-safe on Postgres: CREATE INDEX CONCURRENTLY
+outside a transaction, dropping a leftover INVALID index from an
+interrupted build first. A Postgres advisory lock keeps several workers
+from migrating at once; on SQLite every step is IF NOT EXISTS.
+
+    python -m app.migrations upgrade
+    python -m app.migrations check
+    python -m app.migrations status
+    python -m app.migrations report [--email user@example.com]
+
+`report` replays every read-only GET route as one user, EXPLAINs each
+distinct SELECT they issue and flags full table scans, so a query that
+misses an index shows up before it shows up in latency.
+"""
+import argparse
+import sys
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import MetaData, Table, event, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateTable
+
+from . import models, partitions
+from .db import Base, SessionLocal, engine as default_engine
+
+_ADVISORY_LOCK_KEY = 0x6D65616C  # "meal"
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Engine], None]
+
+
+def add_missing_columns(engine: Engine, table_name: str) -> list[str]:
+    """
+    ALTER TABLE ADD COLUMN for model columns an existing table lacks.
+    Columns are added nullable, since existing rows have no value for them.
+    """
+    table = Base.metadata.tables[table_name]
+    existing = {c["name"] for c in inspect(engine).get_columns(table_name)}
+    added = []
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            col_type = column.type.compile(dialect=engine.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {col_type}")
+            added.append(column.name)
+    return added
+
+
+def _legacy_meals(engine: Engine) -> None:
+    # Pre-0.3 databases have meals(id, name, carbs NOT NULL, category NOT NULL, tags).
+    # Adding the new columns isn't enough: inserts that leave out carbs and
+    # category break the old NOT NULLs, so the table gets the current shape.
+    # Data moves to carbs_g; category has no counterpart and is dropped.
+    columns = {c["name"] for c in inspect(engine).get_columns("meals")}
+    if not columns & {"carbs", "category"}:
+        add_missing_columns(engine, "meals")
+        return
+
+    if engine.dialect.name == "postgresql":
+        add_missing_columns(engine, "meals")
+        with engine.begin() as conn:
+            if "carbs" in columns:
+                conn.exec_driver_sql("UPDATE meals SET carbs_g = carbs WHERE carbs_g IS NULL")
+            conn.exec_driver_sql("UPDATE meals SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL")
+            for name in columns & {"carbs", "category"}:
+                conn.exec_driver_sql(f"ALTER TABLE meals DROP COLUMN {name}")
+        return
+
+    # SQLite can't drop NOT NULL: create the new table, copy, drop, rename.
+    table = Base.metadata.tables["meals"]
+    values = {c.name: c.name for c in table.columns if c.name in columns}
+    if "carbs" in columns:
+        values["carbs_g"] = "COALESCE(carbs_g, carbs)" if "carbs_g" in columns else "carbs"
+    values["timestamp"] = "COALESCE(timestamp, CURRENT_TIMESTAMP)" if "timestamp" in columns else "CURRENT_TIMESTAMP"
+    rebuilt = Table("meals_rebuilt", MetaData(), *(c._copy() for c in table.columns))
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE IF EXISTS meals_rebuilt")  # left by an interrupted run
+        conn.execute(CreateTable(rebuilt))
+        conn.exec_driver_sql(
+            f"INSERT INTO meals_rebuilt ({', '.join(values)}) SELECT {', '.join(values.values())} FROM meals"
+        )
+        conn.exec_driver_sql("DROP TABLE meals")
+        conn.exec_driver_sql("ALTER TABLE meals_rebuilt RENAME TO meals")
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def create_index(engine: Engine, name: str) -> None:
+    """Create an index declared on the models, if it doesn't exist yet."""
+    index = next(
+        ix for table in Base.metadata.tables.values() for ix in table.indexes if ix.name == name
+    )
+    columns = ", ".join(c.name for c in index.columns)
+    table = index.table.name
+
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            invalid = conn.exec_driver_sql(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = %(name)s AND NOT i.indisvalid",
+                {"name": name},
+            ).first()
+            if invalid:
+                conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            conn.exec_driver_sql(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+    else:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def _hot_path_indexes(engine: Engine) -> None:
+    for name in (
+        "ix_bg_readings_user_id_timestamp",
+        "ix_meals_user_id_timestamp",
+        "ix_meal_logs_user_id_timestamp",
+        "ix_meal_logs_user_id_meal_id",
+    ):
+        create_index(engine, name)
+
+
+def _sync_sequences(engine: Engine) -> None:
+    # Old cursors are change ids, so seq = id keeps them valid.
+    add_missing_columns(engine, "sync_changes")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE sync_changes SET seq = id WHERE seq IS NULL")
+        conn.exec_driver_sql(
+            "INSERT INTO sync_sequences (user_id, last_seq) "
+            "SELECT user_id, MAX(seq) FROM sync_changes GROUP BY user_id "
+            "ON CONFLICT (user_id) DO UPDATE SET last_seq = excluded.last_seq "
+            "WHERE excluded.last_seq > sync_sequences.last_seq"
+        )
+    create_index(engine, "ix_sync_changes_user_id_seq")
+
+
+def _user_roles(engine: Engine) -> None:
+    add_missing_columns(engine, "users")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE users SET role = 'user' WHERE role IS NULL")
+    create_index(engine, "ix_users_role_id")
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "rebuild pre-0.3 meals tables in the current shape", _legacy_meals),
+    Migration(2, "hot-path (user_id, timestamp) and (user_id, meal_id) indexes", _hot_path_indexes),
+    Migration(3, "users.role for clinician/admin endpoints, (role, id) index", _user_roles),
+    Migration(4, "commit-ordered sync cursor (sync_changes.seq, sync_sequences)", _sync_sequences),
+    # Version 1 used to only add columns, leaving carbs/category NOT NULL.
+    Migration(5, "rebuild pre-0.3 meals tables that version 1 only added columns to", _legacy_meals),
+]
+
+
+@contextmanager
+def _migration_lock(engine: Engine):
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql(f"SELECT pg_advisory_lock({_ADVISORY_LOCK_KEY})")
+        try:
+            yield
+        finally:
+            conn.exec_driver_sql(f"SELECT pg_advisory_unlock({_ADVISORY_LOCK_KEY})")
+
+
+def applied_versions(engine: Engine) -> dict[int, models.SchemaMigration]:
+    with SessionLocal(bind=engine) as db:
+        return {m.version: m for m in db.scalars(select(models.SchemaMigration))}
+
+
+def check(engine: Engine = default_engine) -> list[str]:
+    """Missing tables and pending migrations, without changing anything."""
+    existing = set(inspect(engine).get_table_names())
+    problems = [f"table {name} missing" for name in Base.metadata.tables if name not in existing]
+    if models.SchemaMigration.__tablename__ in existing:
+        applied = applied_versions(engine)
+        problems += [f"migration {m.version} pending" for m in MIGRATIONS if m.version not in applied]
+    return problems
+
+
+def upgrade(engine: Engine = default_engine) -> list[int]:
+    """Create missing tables and apply pending migrations. Returns versions applied."""
+    done: list[int] = []
+    # create_all too: workers booting together would race on CREATE TABLE.
+    with _migration_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        applied = applied_versions(engine)
+        for migration in MIGRATIONS:
+            if migration.version in applied:
+                continue
+            migration.upgrade(engine)
+            try:
+                with SessionLocal(bind=engine) as db:
+                    db.add(models.SchemaMigration(version=migration.version, name=migration.name))
+                    db.commit()
+            except IntegrityError:
+                pass  # another worker recorded it first (SQLite has no lock)
+            done.append(migration.version)
+
+        if partitions.enabled(engine):
+            partitions.convert(engine)
+            partitions.maintain(engine)
+    return done
+
+
+# ---------- Index usage report ----------
+
+# Streaming / unbounded / non-DB routes the report doesn't replay.
+_REPORT_SKIP = {
+    "/health", "/metrics", "/diabetes/bg-readings/stream", "/cohorts/report/stream",
+    "/export/bg-readings", "/export/meals", "/export/meal-logs",
+}
+
+
+def _full_scans(plan: str, dialect: str) -> list[str]:
+    """Plan lines that read a whole table."""
+    flagged = []
+    for line in plan.splitlines():
+        detail = line.rsplit(" | ", 1)[-1]
+        if dialect == "sqlite":
+            if detail.startswith("SCAN ") and "USING" not in detail and "CONSTANT ROW" not in detail:
+                flagged.append(detail)
+        elif "Seq Scan on" in detail:
+            flagged.append(detail.strip())
+    return flagged
+
+
+def index_report(engine: Engine = default_engine, email: str | None = None) -> list[dict]:
+    """
+    Replay the GET routes as one user and EXPLAIN their SELECTs.
+    Returns one entry per (route, query shape).
+    """
+    from fastapi.routing import APIRoute
+    from fastapi.testclient import TestClient
+
+    from .main import app
+    from .querydebug import explain, fingerprint
+    from .security import create_access_token
+
+    with SessionLocal(bind=engine) as db:
+        stmt = select(models.User).order_by(models.User.id)
+        if email:
+            stmt = stmt.where(models.User.email == email)
+        user = db.scalars(stmt).first()
+        if user is None:
+            raise SystemExit("No matching user; populate the database first (python -m benchmarks.populate).")
+        meal_id = db.scalar(
+            select(models.Meal.id).where(
+                models.Meal.user_id == user.id, models.Meal.glycemic_index.is_not(None)
+            )
+        ) or db.scalar(select(models.Meal.id).where(models.Meal.user_id == user.id))
+        job_id = db.scalar(select(models.ImportJob.id).where(models.ImportJob.user_id == user.id))
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+    current = [""]
+    seen: dict[tuple[str, str], tuple[str, object]] = {}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and current[0]:
+            seen.setdefault((current[0], fingerprint(statement)), (statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        client = TestClient(app)
+        for route in app.routes:
+            if not isinstance(route, APIRoute) or "GET" not in route.methods or route.path in _REPORT_SKIP:
+                continue
+            path = route.path
+            if "{meal_id}" in path:
+                if meal_id is None:
+                    continue
+                path = path.replace("{meal_id}", str(meal_id))
+            if "{job_id}" in path:
+                if job_id is None:
+                    continue
+                path = path.replace("{job_id}", str(job_id))
+            current[0] = route.path
+            client.get(path, headers=headers)
+        current[0] = ""
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    results = []
+    raw = engine.raw_connection()
+    try:
+        for (route, shape), (statement, parameters) in seen.items():
+            plan = explain(raw.driver_connection, engine.dialect.name, statement, parameters)
+            results.append({
+                "route": route,
+                "query": shape,
+                "plan": plan,
+                "full_scans": _full_scans(plan, engine.dialect.name),
+            })
+    finally:
+        raw.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Schema migrations and index usage report.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("upgrade", help="create missing tables and apply pending migrations")
+    sub.add_parser("check", help="exit 1 if tables are missing or migrations pending")
+    sub.add_parser("status", help="list migrations and whether they are applied")
+    report = sub.add_parser("report", help="EXPLAIN every GET route's queries and flag full scans")
+    report.add_argument("--email", help="user to replay routes as (default: first user)")
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        done = upgrade()
+        print(f"applied {done}" if done else "schema up to date")
+    elif args.command == "check":
+        problems = check()
+        print("\n".join(problems) if problems else "schema up to date")
+        sys.exit(1 if problems else 0)
+    elif args.command == "status":
+        Base.metadata.create_all(bind=default_engine)
+        applied = applied_versions(default_engine)
+        for m in MIGRATIONS:
+            state = f"applied {applied[m.version].applied_at:%Y-%m-%d %H:%M}" if m.version in applied else "pending"
+            print(f"{m.version:4}  {state:24}  {m.name}")
+    else:
+        results = index_report(email=args.email)
+        for r in results:
+            status = "FULL SCAN" if r["full_scans"] else "ok"
+            print(f"{status:9}  {r['route']}\n           {r['query'][:160]}")
+            for scan in r["full_scans"]:
+                print(f"           -> {scan}")
+        flagged = sum(1 for r in results if r["full_scans"])
+        print(f"\n{len(results)} queries, {flagged} with full table scans")
+        sys.exit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,37 @@
 import datetime as dt
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    UniqueConstraint,
+)
 from .db import Base
 
 
+ROLES = ("user", "clinician", "admin")
+
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_role_id", "role", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, nullable=False, index=True)
     full_name = Column(String, nullable=True)
     hashed_password = Column(String, nullable=False)
+    role = Column(String, nullable=False, default="user", server_default="user")  # one of ROLES
 
 class Meal(Base):
     __tablename__ = "meals"
+    __table_args__ = (Index("ix_meals_user_id_timestamp", "user_id", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -41,8 +59,29 @@ class Meal(Base):
         nullable=False,
     )
 
+class UsdaFood(Base):
+    """Local cache of USDA FoodData Central foods (nutrients per 100 g)."""
+    __tablename__ = "usda_foods"
+
+    fdc_id = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    brand_owner = Column(String, nullable=True)
+    data_type = Column(String, nullable=True)
+    serving_size_g = Column(Float, nullable=True)  # label serving (branded foods)
+
+    calories_kcal = Column(Float, nullable=True)
+    carbs_g = Column(Float, nullable=True)
+    protein_g = Column(Float, nullable=True)
+    fat_g = Column(Float, nullable=True)
+    fiber_g = Column(Float, nullable=True)
+    sugar_g = Column(Float, nullable=True)
+
+    fetched_at = Column(DateTime, default=dt.datetime.utcnow, nullable=False)
+
+
 class BloodGlucoseReading(Base):
     __tablename__ = "bg_readings"
+    __table_args__ = (Index("ix_bg_readings_user_id_timestamp", "user_id", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -51,8 +90,83 @@ class BloodGlucoseReading(Base):
     context = Column(String, nullable=True)  # e.g., "fasting", "pre_meal", "post_meal"
 
 
+class BGReadingBlock(Base):
+    """One user-day of compacted readings (see app/timeseries.py)."""
+    __tablename__ = "bg_reading_blocks"
+    __table_args__ = (UniqueConstraint("user_id", "day", name="uq_bg_reading_blocks_user_day"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)  # zlib'd delta/column arrays
+
+
+class BGSummary(Base):
+    """Hourly/daily roll-up of expired raw readings (see app/retention.py)."""
+    __tablename__ = "bg_summaries"
+    __table_args__ = (
+        UniqueConstraint("user_id", "resolution", "bucket_start", name="uq_bg_summaries_user_res_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    resolution = Column(String, nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False)
+    mean = Column(Float, nullable=False)
+    m2 = Column(Float, nullable=False)  # sum of squared deviations from mean
+    minimum = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+    p10 = Column(Float, nullable=False)
+    p50 = Column(Float, nullable=False)
+    p90 = Column(Float, nullable=False)
+
+
+class BGAlert(Base):
+    __tablename__ = "bg_alerts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    reading_id = Column(Integer, ForeignKey("bg_readings.id"), nullable=True)
+
+    kind = Column(String, nullable=False)  # e.g. "low", "predicted_high", "rapid_fall"
+    value = Column(Float, nullable=False)  # mg/dL at the triggering reading
+    rate_mg_dl_per_min = Column(Float, nullable=True)
+    predicted_value = Column(Float, nullable=True)  # mg/dL, prediction horizon ahead
+    message = Column(String, nullable=False)
+
+    timestamp = Column(DateTime, default=dt.datetime.utcnow, nullable=False)
+
+
+class ImportJob(Base):
+    """Progress of a bulk BG file import (see app/bg_import.py)."""
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    filename = Column(String, nullable=True)
+    source_format = Column(String, nullable=True)  # "dexcom", "libre", "generic"
+    status = Column(String, nullable=False, default="queued")  # queued, running, completed, failed
+    error = Column(String, nullable=True)
+
+    bytes_total = Column(Integer, nullable=False, default=0)
+    bytes_processed = Column(Integer, nullable=False, default=0)
+    rows_read = Column(Integer, nullable=False, default=0)
+    rows_inserted = Column(Integer, nullable=False, default=0)
+    rows_duplicate = Column(Integer, nullable=False, default=0)
+    rows_invalid = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, default=dt.datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+
 class MealLog(Base):
     __tablename__ = "meal_logs"
+    __table_args__ = (
+        Index("ix_meal_logs_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_meal_logs_user_id_meal_id", "user_id", "meal_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -66,4 +180,71 @@ class MealLog(Base):
         DateTime,
         default=dt.datetime.utcnow,
         nullable=False,
-    )
\ No newline at end of file
+    )
+
+
+class SyncChange(Base):
+    """
+    Per-user change log behind GET /sync (see app/sync.py). `seq` is
+    the sync cursor, allocated from the user's SyncSequence row so it
+    follows commit order; the id is never reused (AUTOINCREMENT).
+    """
+    __tablename__ = "sync_changes"
+    __table_args__ = (
+        Index("ix_sync_changes_user_id_id", "user_id", "id"),
+        Index("ix_sync_changes_user_id_seq", "user_id", "seq"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    seq = Column(Integer, nullable=True)  # nullable only for rows from before migration 4
+    entity = Column(String, nullable=False)  # "meal", "meal_log", "bg_reading"
+    entity_id = Column(Integer, nullable=False)
+    deleted = Column(Boolean, nullable=False, default=False)
+
+
+class SyncSequence(Base):
+    """Last sync cursor handed out per user. Writers lock the row until commit."""
+    __tablename__ = "sync_sequences"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_seq = Column(Integer, nullable=False, default=0)
+
+
+class SyncOp(Base):
+    """Client operation ids already applied by POST /sync, for idempotent retries."""
+    __tablename__ = "sync_ops"
+    __table_args__ = (UniqueConstraint("user_id", "op_id", name="uq_sync_ops_user_op"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    op_id = Column(String(64), nullable=False)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=dt.datetime.utcnow, nullable=False, index=True)
+
+
+class IdempotencyKey(Base):
+    """Stored responses for Idempotency-Key replays (see app/idempotency.py)."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("subject", "key", name="uq_idempotency_keys_subject_key"),)
+
+    id = Column(Integer, primary_key=True)
+    subject = Column(String(64), nullable=False)  # "u:<user id>" or "ip:<address>"
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # sha256 of method, path, body
+    status_code = Column(Integer, nullable=True)  # NULL while the request is in flight
+    content_type = Column(String, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=dt.datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class SchemaMigration(Base):
+    """Versioned migrations applied to this database (see app/migrations.py)."""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=dt.datetime.utcnow, nullable=False)
@@ -0,0 +1,257 @@
+# app/partitions.py
+"""
+Monthly range partitioning of bg_readings on Postgres (BG_PARTITIONING=true).
+
+- `convert()` turns an existing plain bg_readings into a table
+  partitioned by RANGE (timestamp). It keeps ids and the id sequence.
+  Postgres requires the partition key in the primary key, so the
+  primary key becomes (id, timestamp). Foreign keys pointing at
+  bg_readings.id (bg_alerts.reading_id) are dropped, since Postgres
+  can't reference a partitioned table by id alone. It copies every row
+  under an exclusive lock, so run it in a maintenance window on big
+  tables.
+- `maintain()` creates partitions up to `bg_partition_months_ahead`
+  months ahead. A DEFAULT partition catches rows outside the existing
+  partitions, e.g. years-old readings from a CGM export import;
+  `maintain()` moves those into new partitions for their months. If
+  `bg_partition_retention_months` is set, it also detaches partitions
+  older than that and renames them bg_readings_archive_YYYY_MM, ready
+  to dump or drop. The detach is a plain DETACH: Postgres doesn't allow
+  CONCURRENTLY while a DEFAULT partition exists. It is a catalog-only
+  change, so the lock on the parent is brief.
+
+Both run from `upgrade()` in app/migrations.py, under its migration
+lock, so only one worker converts. `maintain()` also runs
+every `bg_partition_check_hours` in a background thread. Queries only
+get partition pruning from plain range predicates on `timestamp`
+(`timestamp >= :start AND timestamp < :end`), not from expressions
+such as date(timestamp).
+
+    python -m app.partitions status
+    python -m app.partitions maintain
+"""
+import argparse
+import logging
+import threading
+from datetime import date
+
+from sqlalchemy.engine import Engine
+
+from .config import settings
+from .db import engine as default_engine
+
+logger = logging.getLogger("app.partitions")
+
+PARENT = "bg_readings"
+_LOCK_KEY = 0x62677061  # "bgpa"
+
+
+def _add_months(month: date, n: int) -> date:
+    years, index = divmod(month.month - 1 + n, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_{month:%Y_%m}"
+
+
+def enabled(engine: Engine) -> bool:
+    return settings.bg_partitioning and engine.dialect.name == "postgresql"
+
+
+def is_partitioned(conn) -> bool:
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = %(name)s",
+        {"name": PARENT},
+    ).first() is not None
+
+
+def list_partitions(conn) -> list[tuple[str, str]]:
+    """(name, bound expression) of each attached partition."""
+    return [
+        tuple(row)
+        for row in conn.exec_driver_sql(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %(name)s ORDER BY c.relname",
+            {"name": PARENT},
+        )
+    ]
+
+
+def create_partition(conn, month: date) -> bool:
+    """Create the partition for `month` if missing. Caller's transaction."""
+    name = partition_name(month)
+    exists = conn.exec_driver_sql("SELECT to_regclass(%(name)s)", {"name": name}).scalar()
+    if exists:
+        return False
+    start, end = month.isoformat(), _add_months(month, 1).isoformat()
+    bounds = f"FOR VALUES FROM ('{start}') TO ('{end}')"
+
+    stray = conn.exec_driver_sql(
+        f"SELECT 1 FROM {PARENT}_default WHERE timestamp >= %(start)s AND timestamp < %(end)s LIMIT 1",
+        {"start": start, "end": end},
+    ).first()
+    if not stray:
+        conn.exec_driver_sql(f"CREATE TABLE {name} PARTITION OF {PARENT} {bounds}")
+        return True
+
+    # Rows for this month landed in the default partition; move them
+    # into a standalone table and attach that.
+    conn.exec_driver_sql(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    conn.exec_driver_sql(
+        f"WITH moved AS (DELETE FROM {PARENT}_default "
+        f"WHERE timestamp >= %(start)s AND timestamp < %(end)s RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        {"start": start, "end": end},
+    )
+    conn.exec_driver_sql(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} {bounds}")
+    return True
+
+
+def convert(engine: Engine = default_engine) -> bool:
+    """Turn a plain bg_readings into a partitioned one. Returns False if already done."""
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            return False
+        conn.exec_driver_sql(f"LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE")
+        if is_partitioned(conn):
+            return False  # converted by another process while we waited for the lock
+        first = conn.exec_driver_sql(f"SELECT min(timestamp) FROM {PARENT}").scalar()
+        sequence = conn.exec_driver_sql(
+            "SELECT pg_get_serial_sequence(%(table)s, 'id')", {"table": PARENT}
+        ).scalar()
+        if sequence is None:
+            sequence = f"{PARENT}_id_seq"
+            conn.exec_driver_sql(f"CREATE SEQUENCE IF NOT EXISTS {sequence}")
+
+        old = f"{PARENT}_unpartitioned"
+        conn.exec_driver_sql(f"ALTER TABLE {PARENT} RENAME TO {old}")
+        for (index,) in conn.exec_driver_sql(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %(table)s", {"table": old}
+        ).all():
+            if index.startswith((f"{PARENT}_", f"ix_{PARENT}_")):
+                conn.exec_driver_sql(f"ALTER INDEX {index} RENAME TO {index.replace(PARENT, old, 1)}")
+        for name, table in conn.exec_driver_sql(
+            "SELECT conname, conrelid::regclass::text FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid = %(table)s::regclass",
+            {"table": old},
+        ).all():
+            conn.exec_driver_sql(f"ALTER TABLE {table} DROP CONSTRAINT {name}")
+
+        conn.exec_driver_sql(
+            f"""
+            CREATE TABLE {PARENT} (
+                id integer NOT NULL DEFAULT nextval('{sequence}'),
+                user_id integer REFERENCES users (id),
+                value double precision NOT NULL,
+                timestamp timestamp without time zone NOT NULL,
+                context varchar,
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp)
+            """
+        )
+        conn.exec_driver_sql(f"CREATE INDEX ix_{PARENT}_user_id_timestamp ON {PARENT} (user_id, timestamp)")
+        conn.exec_driver_sql(f"CREATE TABLE {PARENT}_default PARTITION OF {PARENT} DEFAULT")
+
+        this_month = date.today().replace(day=1)
+        month = (first.date() if first else this_month).replace(day=1)
+        while month <= _add_months(this_month, settings.bg_partition_months_ahead):
+            create_partition(conn, month)
+            month = _add_months(month, 1)
+
+        conn.exec_driver_sql(
+            f"INSERT INTO {PARENT} (id, user_id, value, timestamp, context) "
+            f"SELECT id, user_id, value, timestamp, context FROM {old}"
+        )
+        conn.exec_driver_sql(
+            f"SELECT setval('{sequence}', coalesce(max(id), 0) + 1, false) FROM {PARENT}"
+        )
+        conn.exec_driver_sql(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT}.id")
+        conn.exec_driver_sql(f"DROP TABLE {old}")
+    return True
+
+
+def maintain(engine: Engine = default_engine, today: date | None = None) -> dict[str, list[str]]:
+    """Create upcoming partitions and archive expired ones. Safe to run from every worker."""
+    done: dict[str, list[str]] = {"created": [], "archived": []}
+    this_month = (today or date.today()).replace(day=1)
+
+    retention = settings.bg_partition_retention_months
+    oldest = _add_months(this_month, -retention) if retention else None
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        if not lock_conn.exec_driver_sql(f"SELECT pg_try_advisory_lock({_LOCK_KEY})").scalar():
+            return done  # another worker is on it
+        try:
+            with engine.begin() as conn:
+                if not is_partitioned(conn):
+                    return done
+                months = [_add_months(this_month, n) for n in range(settings.bg_partition_months_ahead + 1)]
+                months += conn.exec_driver_sql(
+                    f"SELECT DISTINCT date_trunc('month', timestamp)::date FROM {PARENT}_default"
+                ).scalars().all()
+                for month in sorted(set(months)):
+                    if oldest and month < oldest:
+                        continue  # past retention; stays in the default partition
+                    if create_partition(conn, month):
+                        done["created"].append(partition_name(month))
+
+            if oldest:
+                cutoff = partition_name(oldest)
+                for name, _ in list_partitions(lock_conn):
+                    if name == f"{PARENT}_default" or name >= cutoff:
+                        continue
+                    archive = name.replace(PARENT, f"{PARENT}_archive", 1)
+                    lock_conn.exec_driver_sql(f"ALTER TABLE {PARENT} DETACH PARTITION {name}")
+                    lock_conn.exec_driver_sql(f"ALTER TABLE {name} RENAME TO {archive}")
+                    done["archived"].append(archive)
+        finally:
+            lock_conn.exec_driver_sql(f"SELECT pg_advisory_unlock({_LOCK_KEY})")
+    return done
+
+
+def start_maintenance(
+    engine: Engine = default_engine, stop: threading.Event | None = None
+) -> threading.Thread | None:
+    """Run `maintain()` every `bg_partition_check_hours` in a daemon thread until `stop` is set."""
+    if not enabled(engine):
+        return None
+    stop = stop or threading.Event()
+
+    def loop():
+        while not stop.wait(settings.bg_partition_check_hours * 3600):
+            try:
+                maintain(engine)
+            except Exception:  # retried next interval; never kill the worker
+                logger.exception("bg_readings partition maintenance failed")
+
+    thread = threading.Thread(target=loop, name="bg-partition-maintenance", daemon=True)
+    thread.start()
+    return thread
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="bg_readings partition maintenance (Postgres).")
+    parser.add_argument("command", choices=["status", "convert", "maintain"])
+    args = parser.parse_args()
+    if default_engine.dialect.name != "postgresql":
+        raise SystemExit("Partitioning needs a Postgres DATABASE_URL.")
+
+    if args.command == "convert":
+        print("converted" if convert() else "already partitioned")
+    elif args.command == "maintain":
+        done = maintain()
+        print(f"created {done['created'] or 'none'}, archived {done['archived'] or 'none'}")
+    else:
+        with default_engine.connect() as conn:
+            if not is_partitioned(conn):
+                print(f"{PARENT} is not partitioned")
+                return
+            for name, bound in list_partitions(conn):
+                print(f"{name:32} {bound}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# app/pytest_querycount.py
+"""
+pytest plugin that keeps hot endpoints from regressing their DB cost.
+
+Enable with `pytest -p app.pytest_querycount` (or list it under
+`pytest_plugins` in a conftest). Then either cap a whole test:
+
+    @pytest.mark.max_queries(2)
+    def test_list_meals(client, auth_headers):
+        client.get("/meals/", headers=auth_headers)
+
+or a block inside one:
+
+    def test_list_meals(client, auth_headers, max_queries):
+        with max_queries(2):
+            client.get("/meals/", headers=auth_headers)
+
+Statements are collected from every thread, so requests made through
+TestClient count. Failures list each query shape with its repeat count.
+"""
+from contextlib import contextmanager
+
+import pytest
+
+from . import querydebug
+from .db import engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _check(log: querydebug.QueryLog, limit: int, where: str) -> None:
+    if log.count > limit:
+        raise QueryBudgetExceeded(
+            f"{where} issued {log.count} statements (max {limit}):\n{log.summary()}"
+        )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "max_queries(n): fail if the test issues more than n SQL statements"
+    )
+    querydebug.attach(engine)
+
+
+@pytest.fixture
+def max_queries():
+    @contextmanager
+    def _budget(limit: int):
+        with querydebug.track() as log:
+            yield log
+        _check(log, limit, "block")
+
+    return _budget
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker("max_queries")
+    if marker is None:
+        yield
+        return
+    with querydebug.track() as log:
+        outcome = yield
+    if outcome.excinfo is None:
+        try:
+            _check(log, marker.args[0], item.nodeid)
+        except QueryBudgetExceeded as exc:
+            outcome.force_exception(exc)
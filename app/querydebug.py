@@ -0,0 +1,179 @@
+# app/querydebug.py
+"""
+Development / CI query debugging (QUERY_DEBUG=true).
+
+Attaches to the engine and, per request:
+- counts statements and groups them by fingerprint (the SQL with
+  literals and IN-lists collapsed)
+- flags N+1 patterns: the same SELECT shape run `query_debug_n_plus_one`
+  or more times in one request
+- runs EXPLAIN (EXPLAIN QUERY PLAN on SQLite) for statements slower
+  than `query_debug_slow_ms`
+
+Findings are logged on the "app.querydebug" logger, and responses carry
+an `X-Query-Count` header. `track()` collects statements from every
+thread for the duration of a block; the pytest plugin in
+app/pytest_querycount.py builds on it.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+logger = logging.getLogger("app.querydebug")
+
+_PARAM = r"(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)"
+_PARAM_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)")
+_VALUES_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Normalize a statement so queries of the same shape compare equal."""
+    sql = _STRING.sub("?", statement)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PARAM_LIST.sub("(...)", sql)
+    sql = _VALUES_ROWS.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class QueryLog:
+    """Statements seen in one request (or one `track()` block)."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter[str] = Counter()
+        self.slow: list[tuple[str, float, str]] = []  # (statement, seconds, plan)
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed: float, plan: str | None) -> None:
+        shape = fingerprint(statement)
+        with self._lock:
+            self.count += 1
+            self.seconds += elapsed
+            self.shapes[shape] += 1
+            if plan is not None:
+                self.slow.append((statement, elapsed, plan))
+
+    def repeated(self, threshold: int | None = None) -> list[tuple[str, int]]:
+        """SELECT shapes issued at least `threshold` times: likely N+1s."""
+        threshold = threshold or settings.query_debug_n_plus_one
+        return [
+            (shape, n)
+            for shape, n in self.shapes.most_common()
+            if n >= threshold and shape.upper().startswith("SELECT")
+        ]
+
+    def summary(self) -> str:
+        lines = [f"{self.count} statements, {self.seconds * 1000:.1f} ms"]
+        lines += [f"  {n}x {shape}" for shape, n in self.shapes.most_common()]
+        return "\n".join(lines)
+
+
+_request_log: ContextVar[QueryLog | None] = ContextVar("query_log", default=None)
+_trackers: list[QueryLog] = []
+_trackers_lock = threading.Lock()
+_attached: set[int] = set()
+
+
+def explain(dbapi_connection, dialect: str, statement: str, parameters) -> str:
+    """
+    EXPLAIN (EXPLAIN QUERY PLAN on SQLite) on a raw DBAPI connection,
+    so it doesn't re-enter the engine events. One plan line per row.
+    """
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    try:
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return "\n".join(" | ".join(str(col) for col in row) for row in cursor.fetchall())
+        finally:
+            cursor.close()
+    except Exception as exc:  # EXPLAIN is best-effort
+        return f"(EXPLAIN failed: {exc})"
+
+
+def attach(engine: Engine) -> None:
+    """Install the statement hooks on `engine` (idempotent)."""
+    if id(engine) in _attached:
+        return
+    _attached.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("querydebug_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["querydebug_start"].pop()
+        request_log = _request_log.get()
+        if request_log is None and not _trackers:
+            return
+
+        plan = None
+        if elapsed * 1000 >= settings.query_debug_slow_ms and not executemany:
+            plan = explain(cursor.connection, conn.dialect.name, statement, parameters)
+            logger.warning(
+                "slow query (%.1f ms): %s\n%s", elapsed * 1000, fingerprint(statement), plan
+            )
+
+        if request_log is not None:
+            request_log.record(statement, elapsed, plan)
+        with _trackers_lock:
+            trackers = list(_trackers)
+        for log in trackers:
+            log.record(statement, elapsed, plan)
+
+
+@contextmanager
+def track():
+    """Collect every statement run on attached engines, from any thread."""
+    log = QueryLog()
+    with _trackers_lock:
+        _trackers.append(log)
+    try:
+        yield log
+    finally:
+        with _trackers_lock:
+            _trackers.remove(log)
+
+
+class QueryDebugMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = _request_log.set(log)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-query-count", str(log.count).encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_log.reset(token)
+            route = getattr(scope.get("route"), "path", scope["path"])
+            for shape, n in log.repeated():
+                logger.warning("possible N+1 in %s %s: %dx %s", scope["method"], route, n, shape)
+            logger.debug("%s %s: %s", scope["method"], route, log.summary())
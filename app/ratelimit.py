@@ -0,0 +1,209 @@
+# app/ratelimit.py
+"""
+Per-user, per-route rate limiting and admission control.
+
+- Token buckets keyed by (JWT subject, route group). Anonymous or
+  invalid-token requests are keyed by client IP. Buckets live in a
+  fixed number of dict shards, each with its own lock, so concurrent
+  requests rarely contend.
+- Concurrency caps bound how many requests of an expensive route group
+  (analytics, export, imports, recommendations) run at once in this
+  worker, protecting the DB pool. Over the cap we fail fast with 503
+  instead of queueing.
+
+Both answer with `Retry-After`. Route groups are path prefixes, and
+rate and concurrency groups are resolved independently: a request takes
+a token from the longest matching `rate_limits` prefix ("" catches
+everything else) and counts against the longest matching
+`concurrency_limits` prefix, if any. Both can be overridden with JSON
+env vars, e.g. RATE_LIMITS='{"/food-search": [1, 10]}'.
+"""
+import json
+import math
+import threading
+import time
+
+from jose import JWTError
+
+from .config import settings
+from .security import decode_access_token
+
+_SHARDS = 16
+# Idle buckets older than this are dropped when a shard is swept.
+_BUCKET_IDLE_SECONDS = 600.0
+_SWEEP_EVERY = 4096
+_TOKEN_CACHE_SIZE = 10_000
+
+
+class _Shard:
+    __slots__ = ("lock", "buckets", "ops")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets: dict[tuple, list[float]] = {}  # key -> [tokens, last refill]
+        self.ops = 0
+
+
+class TokenBuckets:
+    def __init__(self):
+        self._shards = [_Shard() for _ in range(_SHARDS)]
+
+    def take(self, key: tuple, rate: float, burst: int) -> float:
+        """
+        Take one token. Returns 0.0 if allowed, otherwise the seconds
+        until a token will be available.
+        """
+        shard = self._shards[hash(key) % _SHARDS]
+        now = time.monotonic()
+        with shard.lock:
+            bucket = shard.buckets.get(key)
+            if bucket is None:
+                shard.buckets[key] = [burst - 1.0, now]
+                wait = 0.0
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+                if tokens >= 1.0:
+                    bucket[0] = tokens - 1.0
+                    wait = 0.0
+                else:
+                    bucket[0] = tokens
+                    wait = (1.0 - tokens) / rate
+
+            shard.ops += 1
+            if shard.ops >= _SWEEP_EVERY:
+                shard.ops = 0
+                cutoff = now - _BUCKET_IDLE_SECONDS
+                for k in [k for k, b in shard.buckets.items() if b[1] < cutoff]:
+                    del shard.buckets[k]
+        return wait
+
+
+class _RateGroup:
+    __slots__ = ("prefix", "rate", "burst")
+
+    def __init__(self, prefix: str, rate: float, burst: int):
+        self.prefix = prefix
+        self.rate = rate
+        self.burst = burst
+
+
+class _ConcurrencyGroup:
+    __slots__ = ("prefix", "max_concurrent", "active", "lock")
+
+    def __init__(self, prefix: str, max_concurrent: int):
+        self.prefix = prefix
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.lock = threading.Lock()
+
+
+def _longest_first(groups: list) -> list:
+    return sorted(groups, key=lambda g: len(g.prefix), reverse=True)
+
+
+def _match(groups: list, path: str):
+    for group in groups:
+        if path.startswith(group.prefix):
+            return group
+    return None
+
+
+_token_subjects: dict[str, tuple[str | None, float]] = {}
+
+
+def token_subject(token: str) -> str | None:
+    # Verifying a JWT costs tens of µs; remember verified tokens.
+    now = time.time()
+    cached = _token_subjects.get(token)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    try:
+        payload = decode_access_token(token)
+    except JWTError:
+        return None
+    sub = payload.get("sub")
+    if len(_token_subjects) >= _TOKEN_CACHE_SIZE:
+        _token_subjects.clear()
+    _token_subjects[token] = (sub, float(payload.get("exp", now + 60)))
+    return sub
+
+
+def request_subject(scope) -> str:
+    """"u:<JWT subject>" for a valid bearer token, otherwise "ip:<client>"."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            if value[:7].lower() == b"bearer ":
+                sub = token_subject(value[7:].decode("latin-1"))
+                if sub is not None:
+                    return "u:" + sub
+            break
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+def _json_response(status: int, detail: str, retry_after: float) -> tuple[dict, dict]:
+    body = json.dumps({"detail": detail}).encode()
+    start = {
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    }
+    return start, {"type": "http.response.body", "body": body}
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware (no per-request Request/Response objects)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.buckets = TokenBuckets()
+
+        # Longest prefix first; "" (the default group) matches everything.
+        self.rate_groups = _longest_first(
+            [_RateGroup(prefix, rate, burst) for prefix, (rate, burst) in settings.rate_limits.items()]
+        )
+        self.concurrency_groups = _longest_first(
+            [_ConcurrencyGroup(prefix, limit) for prefix, limit in settings.concurrency_limits.items()]
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.rate_limit_enabled or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        rate_group = _match(self.rate_groups, path)
+        if rate_group is not None:
+            wait = self.buckets.take(
+                (request_subject(scope), rate_group.prefix), rate_group.rate, rate_group.burst
+            )
+            if wait:
+                start, body = _json_response(429, "Rate limit exceeded", wait)
+                await send(start)
+                await send(body)
+                return
+
+        group = _match(self.concurrency_groups, path)
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        with group.lock:
+            admitted = group.active < group.max_concurrent
+            if admitted:
+                group.active += 1
+        if not admitted:
+            start, body = _json_response(503, "Server busy, try again shortly", 1.0)
+            await send(start)
+            await send(body)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            with group.lock:
+                group.active -= 1
@@ -0,0 +1,72 @@
+# app/recommendation_snapshots.py
+"""
+Per-user precomputed /diabetes/recommend-meals results.
+
+The recommendation depends only on the user's meals, the shared
+catalog and which BG band the latest reading falls in. A snapshot
+holds the finished (explanation, suggestions) pair for every band,
+with and without catalog meals. A request is then one latest-reading
+lookup plus a dict hit.
+
+Snapshots remember the meal-set version (app/meal_versions.py) and
+catalog fingerprint they were built from. When either moves, the next
+request rebuilds the snapshot. Requests without catalog meals don't
+load the catalog at all: they get a snapshot built without it (no
+fingerprint), and accept any snapshot at the current version. Catalog
+requests need a snapshot with catalog bands at the current fingerprint. Building one costs about the same as
+one uncached request used to. Snapshots are small and cheap to
+rebuild, so they stay in-process (LRU across users). Versions live in
+the shared cache, so a write on any worker still invalidates them
+everywhere.
+"""
+from collections import OrderedDict
+from threading import Lock
+
+from . import meal_versions, schemas
+from .config import settings
+
+# (bg_category, include_catalog) -> (explanation, suggestions)
+Bands = dict[tuple[str, bool], tuple[str, list[schemas.MealSuggestion]]]
+
+
+class _Snapshot:
+    __slots__ = ("version", "catalog", "bands")
+
+    def __init__(self, version: int, catalog: tuple | None, bands: Bands):
+        self.version = version
+        self.catalog = catalog
+        self.bands = bands
+
+
+class SnapshotCache:
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._entries: OrderedDict[int, _Snapshot] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, user_id: int, catalog_fingerprint: tuple | None) -> Bands | None:
+        """`catalog_fingerprint` is None when the catalog bands aren't needed."""
+        version = meal_versions.current(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry.version != version:
+                return None
+            if catalog_fingerprint is not None and entry.catalog != catalog_fingerprint:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry.bands
+
+    def store(self, user_id: int, version: int, catalog_fingerprint: tuple | None, bands: Bands) -> None:
+        """`version` must be read *before* loading the meals it describes."""
+        with self._lock:
+            self._entries[user_id] = _Snapshot(version, catalog_fingerprint, bands)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+recommendation_snapshots = SnapshotCache(max_users=settings.recommendation_snapshot_max_users)
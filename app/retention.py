@@ -0,0 +1,354 @@
+# app/retention.py
+"""
+Retention and downsampling tiers for BG readings.
+
+With `bg_retention_raw_days` set, raw readings older than that many
+days (whole days, from live rows and from chunk-store blocks) are
+rolled up into `bg_summaries` rows and then deleted:
+
+- one "hour" row per user-hour
+- one "day" row per user-day
+
+Each row stores count, mean, M2 (sum of squared deviations), min, max
+and p10/p50/p90. Counts, means and M2 merge exactly, so full-history
+variance is still exact. Percentiles are exact when a bucket is rolled
+up in one go. If raw data for an already-summarised bucket shows up
+later (a late import), they are count-weighted averages. Hour rows
+older than `bg_retention_hourly_days` are dropped; the day rows stay.
+
+The roll-up deletes a day's readings with DELETE ... RETURNING and
+summarises what came back. Two workers racing on the same day can't
+both count it: the second one gets no rows. It is incremental. Each
+run handles at most `bg_retention_batch_days` days per user, one
+transaction per day. It runs every `bg_retention_check_hours` in a
+background thread, or from the CLI:
+
+    python -m app.retention run
+
+Reads stay transparent. The stats endpoints merge summaries with raw
+data, and GET /diabetes/bg-readings/series serves a range at
+raw / hour / day resolution, mixing in summaries where raw data is
+gone. Deleted raw readings are not sent to sync clients as deletions.
+Retention is a storage tier, not a user edit.
+"""
+import argparse
+import logging
+import threading
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from . import models, timeseries
+from .config import settings
+from .db import SessionLocal
+
+logger = logging.getLogger("app.retention")
+
+RESOLUTIONS = {"hour": "datetime64[h]", "day": "datetime64[D]"}
+
+
+class Moments:
+    """Count / mean / M2, mergeable without revisiting the data (Chan et al.)."""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def of(cls, values: np.ndarray) -> "Moments":
+        if not len(values):
+            return cls()
+        mean = float(values.mean())
+        return cls(len(values), mean, float(((values - mean) ** 2).sum()))
+
+    @classmethod
+    def from_sums(cls, count: int, total: float | None, total_sq: float | None) -> "Moments":
+        if not count:
+            return cls()
+        mean = total / count
+        return cls(count, mean, max(total_sq - count * mean * mean, 0.0))
+
+    def merge(self, other: "Moments") -> "Moments":
+        if not other.count:
+            return self
+        if not self.count:
+            return other
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        return Moments(
+            n,
+            self.mean + delta * other.count / n,
+            self.m2 + other.m2 + delta * delta * self.count * other.count / n,
+        )
+
+    @property
+    def std_dev(self) -> float | None:
+        return (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else None
+
+
+def summarize(timestamps: np.ndarray, values: np.ndarray, resolution: str) -> list[dict]:
+    """Per-bucket summary rows (without user_id) for time-sorted readings."""
+    if not len(values):
+        return []
+    buckets = timestamps.astype(RESOLUTIONS[resolution])
+    starts, first = np.unique(buckets, return_index=True)
+    rows = []
+    for bucket, group in zip(starts, np.split(values, first[1:])):
+        moments = Moments.of(group)
+        p10, p50, p90 = np.percentile(group, [10, 50, 90])
+        rows.append({
+            "resolution": resolution,
+            "bucket_start": bucket.astype("datetime64[us]").astype(datetime),
+            "count": moments.count,
+            "mean": moments.mean,
+            "m2": moments.m2,
+            "minimum": float(group.min()),
+            "maximum": float(group.max()),
+            "p10": float(p10),
+            "p50": float(p50),
+            "p90": float(p90),
+        })
+    return rows
+
+
+def merge_rows(a: dict, b: dict) -> dict:
+    """Merge two summaries of the same bucket (percentiles approximate)."""
+    merged = Moments(a["count"], a["mean"], a["m2"]).merge(Moments(b["count"], b["mean"], b["m2"]))
+    weight = b["count"] / merged.count
+    return {
+        **a,
+        "count": merged.count,
+        "mean": merged.mean,
+        "m2": merged.m2,
+        "minimum": min(a["minimum"], b["minimum"]),
+        "maximum": max(a["maximum"], b["maximum"]),
+        **{p: a[p] * (1 - weight) + b[p] * weight for p in ("p10", "p50", "p90")},
+    }
+
+
+def _row_dict(row: models.BGSummary) -> dict:
+    return {
+        c: getattr(row, c)
+        for c in ("resolution", "bucket_start", "count", "mean", "m2", "minimum", "maximum", "p10", "p50", "p90")
+    }
+
+
+def _store(db: Session, user_id: int, rows: list[dict]) -> None:
+    """Insert summary rows, merging into any that already exist."""
+    Summary = models.BGSummary
+    for resolution in RESOLUTIONS:
+        batch = [r for r in rows if r["resolution"] == resolution]
+        if not batch:
+            continue
+        existing = {
+            s.bucket_start: s
+            for s in db.scalars(
+                select(Summary).where(
+                    Summary.user_id == user_id,
+                    Summary.resolution == resolution,
+                    Summary.bucket_start.in_([r["bucket_start"] for r in batch]),
+                )
+            )
+        }
+        for row in batch:
+            current = existing.get(row["bucket_start"])
+            if current is None:
+                db.add(Summary(user_id=user_id, **row))
+            else:
+                for key, value in merge_rows(_row_dict(current), row).items():
+                    setattr(current, key, value)
+
+
+def _take_day(db: Session, user_id: int, day: date) -> tuple[np.ndarray, np.ndarray]:
+    """Delete one user-day of raw readings and return (timestamps, values)."""
+    Reading = models.BloodGlucoseReading
+    start = datetime.combine(day, time.min)
+    in_day = (Reading.user_id == user_id, Reading.timestamp >= start, Reading.timestamp < start + timedelta(days=1))
+
+    db.execute(
+        update(models.BGAlert)
+        .where(models.BGAlert.reading_id.in_(select(Reading.id).where(*in_day)))
+        .values(reading_id=None)
+    )
+    rows = db.execute(delete(Reading).where(*in_day).returning(Reading.timestamp, Reading.value)).all()
+    timestamps = [np.array([r.timestamp for r in rows], dtype="datetime64[us]")]
+    values = [np.array([r.value for r in rows], dtype=np.float64)]
+
+    Block = models.BGReadingBlock
+    for payload in db.scalars(
+        delete(Block).where(Block.user_id == user_id, Block.day == day).returning(Block.payload)
+    ):
+        block = timeseries.decode_block(payload)
+        timestamps.append(block.timestamps)
+        values.append(block.values)
+
+    ts = np.concatenate(timestamps)
+    order = np.argsort(ts, kind="stable")
+    return ts[order], np.concatenate(values)[order]
+
+
+def _oldest_raw_day(db: Session, user_id: int) -> date | None:
+    Reading = models.BloodGlucoseReading
+    first = db.scalar(select(func.min(Reading.timestamp)).where(Reading.user_id == user_id))
+    first_block = db.scalar(
+        select(func.min(models.BGReadingBlock.day)).where(models.BGReadingBlock.user_id == user_id)
+    )
+    days = [d for d in (first.date() if first else None, first_block) if d is not None]
+    return min(days) if days else None
+
+
+def cutoff_day(today: date | None = None) -> date | None:
+    if settings.bg_retention_raw_days is None:
+        return None
+    return (today or date.today()) - timedelta(days=settings.bg_retention_raw_days)
+
+
+def rollup_user(db: Session, user_id: int, before: date, max_days: int) -> int:
+    """Summarise and delete up to `max_days` days of raw data before `before`."""
+    done = 0
+    while done < max_days:
+        day = _oldest_raw_day(db, user_id)
+        if day is None or day >= before:
+            break
+        timestamps, values = _take_day(db, user_id, day)
+        _store(db, user_id, summarize(timestamps, values, "hour") + summarize(timestamps, values, "day"))
+        db.commit()
+        done += 1
+    return done
+
+
+def expire_hourly(db: Session, today: date | None = None) -> int:
+    if settings.bg_retention_hourly_days is None:
+        return 0
+    cutoff = datetime.combine((today or date.today()) - timedelta(days=settings.bg_retention_hourly_days), time.min)
+    result = db.execute(
+        delete(models.BGSummary).where(
+            models.BGSummary.resolution == "hour", models.BGSummary.bucket_start < cutoff
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def run_once(db: Session, today: date | None = None) -> int:
+    """One incremental pass over every user with data past the cutoff."""
+    before = cutoff_day(today)
+    if before is None:
+        return 0
+    Reading = models.BloodGlucoseReading
+    cutoff = datetime.combine(before, time.min)
+    user_ids = set(db.scalars(select(Reading.user_id).where(Reading.timestamp < cutoff).distinct()))
+    user_ids |= set(db.scalars(
+        select(models.BGReadingBlock.user_id).where(models.BGReadingBlock.day < before).distinct()
+    ))
+    days = sum(
+        rollup_user(db, user_id, before, settings.bg_retention_batch_days)
+        for user_id in sorted(u for u in user_ids if u is not None)
+    )
+    expire_hourly(db, today)
+    return days
+
+
+def start_job(stop: threading.Event | None = None) -> threading.Thread | None:
+    """Run `run_once()` every `bg_retention_check_hours` in a daemon thread until `stop` is set."""
+    if settings.bg_retention_raw_days is None:
+        return None
+    stop = stop or threading.Event()
+
+    def loop():
+        while not stop.wait(settings.bg_retention_check_hours * 3600):
+            try:
+                with SessionLocal() as db:
+                    run_once(db)
+            except Exception:  # retried next interval; never kill the worker
+                logger.exception("BG retention roll-up failed")
+
+    thread = threading.Thread(target=loop, name="bg-retention", daemon=True)
+    thread.start()
+    return thread
+
+
+# ---------- Reads ----------
+
+def summary_moments(db: Session, user_id: int, start: datetime | None = None, end: datetime | None = None) -> Moments:
+    """Combined moments of the user's day summaries in [start, end)."""
+    Summary = models.BGSummary
+    query = select(Summary.count, Summary.mean, Summary.m2).where(
+        Summary.user_id == user_id, Summary.resolution == "day"
+    )
+    if start is not None:
+        query = query.where(Summary.bucket_start >= start)
+    if end is not None:
+        query = query.where(Summary.bucket_start < end)
+    rows = db.execute(query).all()
+    if not rows:
+        return Moments()
+    counts, means, m2s = (np.array(col, dtype=np.float64) for col in zip(*rows))
+    n = counts.sum()
+    mean = float((counts * means).sum() / n)
+    return Moments(int(n), mean, float(m2s.sum() + (counts * (means - mean) ** 2).sum()))
+
+
+def summaries(
+    db: Session, user_id: int, resolution: str, start: datetime, end: datetime
+) -> list[dict]:
+    """Stored summaries whose bucket overlaps [start, end)."""
+    Summary = models.BGSummary
+    start = np.datetime64(start, "us").astype(RESOLUTIONS[resolution]).astype("datetime64[us]").astype(datetime)
+    return [
+        _row_dict(s)
+        for s in db.scalars(
+            select(Summary)
+            .where(
+                Summary.user_id == user_id,
+                Summary.resolution == resolution,
+                Summary.bucket_start >= start,
+                Summary.bucket_start < end,
+            )
+            .order_by(Summary.bucket_start)
+        )
+    ]
+
+
+def series(db: Session, user_id: int, start: datetime, end: datetime, resolution: str) -> list[dict]:
+    """
+    Points for [start, end) at the given resolution ("raw", "hour",
+    "day"), from raw readings plus stored summaries. At "raw", spans
+    whose readings were rolled up come back as hourly points.
+    """
+    raw = timeseries.read_range(db, user_id, start, end)
+    if resolution == "raw":
+        points = [
+            {
+                "resolution": "raw", "bucket_start": ts, "count": 1, "mean": v,
+                "minimum": v, "maximum": v, "p10": None, "p50": None, "p90": None,
+            }
+            for ts, v in zip(raw.timestamps.astype(datetime).tolist(), raw.values.tolist())
+        ]
+        points += summaries(db, user_id, "hour", start, end)
+    else:
+        merged = {row["bucket_start"]: row for row in summaries(db, user_id, resolution, start, end)}
+        for row in summarize(raw.timestamps, raw.values, resolution):
+            current = merged.get(row["bucket_start"])
+            merged[row["bucket_start"]] = merge_rows(current, row) if current else row
+        points = list(merged.values())
+    return sorted(points, key=lambda p: p["bucket_start"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Roll old BG readings into hourly/daily summaries.")
+    parser.add_argument("command", choices=["run"])
+    parser.parse_args()
+    if settings.bg_retention_raw_days is None:
+        raise SystemExit("Set BG_RETENTION_RAW_DAYS to enable retention.")
+    with SessionLocal() as db:
+        print(f"rolled up {run_once(db)} user-days")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# app/routes_cohorts.py
+"""
+Cohort analytics for clinicians and admins (see app/cohorts.py).
+
+GET /cohorts/report returns the finished report. GET
+/cohorts/report/stream sends NDJSON instead: one `progress` line per
+finished partition, then a `result` line with the report, so a client
+can show progress on large cohorts.
+"""
+import json
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from . import cohorts, models, schemas
+from .db import engine, read_engine
+from .deps import get_db, require_role, use_read_replica
+
+router = APIRouter(prefix="/cohorts", tags=["Cohorts"])
+
+clinician = require_role("clinician", "admin")
+
+
+def _window(days: int) -> tuple[datetime, datetime]:
+    until = datetime.utcnow()
+    return until - timedelta(days=days), until
+
+
+@router.get(
+    "/report",
+    response_model=schemas.CohortReport,
+    dependencies=[Depends(use_read_replica)],
+)
+def cohort_report(
+    days: int = Query(default=14, ge=1, le=365),
+    min_users: int = Query(default=3, ge=1),
+    top: int = Query(default=20, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(clinician),
+):
+    """Time in range and top glycemic meals across all patients."""
+    since, until = _window(days)
+    user_ids = cohorts.cohort_user_ids(db.connection(), "user")
+    for event in cohorts.run_report(read_engine or engine, user_ids, since, until, min_users, top):
+        if event["event"] == "result":
+            return event["report"]
+
+
+@router.get("/report/stream", dependencies=[Depends(use_read_replica)])
+def cohort_report_stream(
+    days: int = Query(default=14, ge=1, le=365),
+    min_users: int = Query(default=3, ge=1),
+    top: int = Query(default=20, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(clinician),
+):
+    """Same report as NDJSON, preceded by progress lines."""
+    since, until = _window(days)
+    user_ids = cohorts.cohort_user_ids(db.connection(), "user")
+
+    def lines():
+        for event in cohorts.run_report(read_engine or engine, user_ids, since, until, min_users, top):
+            if event["event"] == "result":
+                event = {"event": "result", "report": event["report"].model_dump(mode="json")}
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
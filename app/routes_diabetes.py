@@ -1,11 +1,23 @@
-from datetime import datetime, timedelta, date
-from sqlalchemy import func
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone, date
+from typing import Literal
+from sqlalchemy import func, select
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from . import models, schemas
-from .deps import get_db, get_current_active_user
+import numpy as np
+
+from . import fieldsets, models, retention, schemas, sync, timeseries
+from .alerts import detector
+from .bg_import import run_import_job
+from .config import settings
+from .deps import get_db, get_current_active_user, use_read_replica
+from .events import broker, format_sse
 from .models import User
+from .routes_recommendations import _bg_category_and_explanation
 
 
 router = APIRouter(
@@ -26,16 +38,112 @@ def create_bg_reading(
         user_id=current_user.id,
     )
     db.add(db_reading)
-    db.commit()
+    db.flush()
+
+    # Trend/threshold detection runs on the ingest path; any alerts are
+    # persisted in the same transaction as the reading.
+    detected = detector.observe(
+        db,
+        current_user.id,
+        db_reading.value,
+        db_reading.timestamp,
+        reading_id=db_reading.id,
+    )
+    try:
+        db_alerts = [
+            models.BGAlert(
+                user_id=current_user.id,
+                reading_id=db_reading.id,
+                kind=a.kind,
+                value=a.value,
+                rate_mg_dl_per_min=a.rate,
+                predicted_value=a.predicted_value,
+                message=a.message,
+                timestamp=db_reading.timestamp,
+            )
+            for a in detected
+        ]
+        db.add_all(db_alerts)
+        sync.record_changes(db, current_user.id, sync.BG_READING, [db_reading.id])
+
+        db.commit()
+    except Exception:
+        # The reading was never stored; don't keep it in the trend.
+        detector.forget(current_user.id)
+        raise
     db.refresh(db_reading)
+
+    _publish_reading(current_user.id, db_reading, db_alerts)
     return db_reading
 
 
-@router.get("/bg-readings", response_model=list[schemas.BGReadingRead])
+def _publish_reading(
+    user_id: int,
+    db_reading: models.BloodGlucoseReading,
+    db_alerts: list[models.BGAlert],
+) -> None:
+    """
+    Push a new reading (a threshold alert if it is out of range, and
+    any trend alerts from the detector) to SSE clients for this user.
+    """
+    if not broker.has_subscribers(user_id):
+        return
+
+    reading = schemas.BGReadingRead.model_validate(db_reading)
+    broker.publish(
+        user_id,
+        {"event": "reading", "id": reading.id, "data": reading.model_dump(mode="json")},
+    )
+
+    bg_category, explanation, _ = _bg_category_and_explanation(reading.value)
+    if bg_category != "in_range":
+        broker.publish(
+            user_id,
+            {
+                "event": "alert",
+                "id": reading.id,
+                "data": {
+                    "reading_id": reading.id,
+                    "value": reading.value,
+                    "bg_category": bg_category,
+                    "explanation": explanation,
+                    "timestamp": reading.timestamp.isoformat(),
+                },
+            },
+        )
+
+    for db_alert in db_alerts:
+        alert = schemas.BGAlertRead.model_validate(db_alert)
+        broker.publish(
+            user_id,
+            {"event": "trend_alert", "id": alert.id, "data": alert.model_dump(mode="json")},
+        )
+
+
+@router.get(
+    "/bg-readings",
+    response_model=list[schemas.BGReadingRead],
+    dependencies=[Depends(use_read_replica)],
+)
 def list_bg_readings(
+    fields: str | None = fieldsets.FIELDS_QUERY,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
+    names = fieldsets.parse(fields, schemas.BGReadingRead)
+
+    if settings.bg_chunk_store:
+        rows = timeseries.read_range(db, current_user.id).to_dicts()
+        if names is not None:
+            return fieldsets.response(names, ([row[n] for n in names] for row in rows))
+        return rows
+
+    if names is not None:
+        return fieldsets.response(names, db.execute(
+            select(*fieldsets.columns(models.BloodGlucoseReading, names))
+            .where(models.BloodGlucoseReading.user_id == current_user.id)
+        ))
+
     return (
         db.query(models.BloodGlucoseReading)
         .where(models.BloodGlucoseReading.user_id == current_user.id)
@@ -43,12 +151,207 @@ def list_bg_readings(
     )
 
 
-@router.get("/bg-stats/today", response_model=schemas.BGStatsToday)
+def _naive_utc(value: datetime | None) -> datetime | None:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@router.get(
+    "/bg-readings/series",
+    response_model=schemas.BGSeriesResponse,
+    dependencies=[Depends(use_read_replica)],
+)
+def get_bg_series(
+    start: datetime,
+    end: datetime | None = None,
+    resolution: Literal["auto", "raw", "hour", "day"] = "auto",
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Readings for [start, end) at a resolution suited to the range.
+    `auto` picks raw up to 2 days, hourly up to 60 days, daily beyond.
+    Ranges reaching past the retention window are served from the
+    hourly/daily summaries (see app/retention.py).
+    """
+    start, end = _naive_utc(start), _naive_utc(end) or datetime.utcnow()
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if resolution == "auto":
+        span = end - start
+        resolution = "raw" if span <= timedelta(days=2) else "hour" if span <= timedelta(days=60) else "day"
+
+    return schemas.BGSeriesResponse(
+        resolution=resolution,
+        start=start,
+        end=end,
+        points=retention.series(db, current_user.id, start, end, resolution),
+    )
+
+
+@router.post(
+    "/bg-readings/import",
+    response_model=schemas.ImportJobRead,
+    status_code=202,
+)
+def import_bg_readings(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    unit: Literal["auto", "mg/dL", "mmol/L"] = "auto",
+    utc_offset_minutes: int = 0,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Upload a Dexcom / LibreView / generic meter CSV export.
+
+    The file is spooled to disk and imported in the background in
+    chunks; poll GET /diabetes/bg-readings/import/{job_id} for progress.
+    `utc_offset_minutes` is the device's offset from UTC (e.g. -300 for
+    US Eastern) for exports with local, offset-less timestamps.
+    """
+    max_bytes = settings.import_max_upload_mb * 1024 * 1024
+    fd, path = tempfile.mkstemp(prefix="bg-import-", suffix=".csv")
+    size = 0
+    with os.fdopen(fd, "wb") as out:
+        while chunk := file.file.read(1024 * 1024):
+            size += len(chunk)
+            if size > max_bytes:
+                break
+            out.write(chunk)
+    if size > max_bytes:
+        os.remove(path)
+        raise HTTPException(status_code=413, detail="Import file is too large.")
+
+    job = models.ImportJob(
+        user_id=current_user.id,
+        filename=file.filename,
+        status="queued",
+        bytes_total=size,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    background_tasks.add_task(
+        run_import_job,
+        job.id,
+        path,
+        None if unit == "auto" else unit,
+        utc_offset_minutes,
+    )
+    return job
+
+
+@router.get("/bg-readings/import/{job_id}", response_model=schemas.ImportJobRead)
+def get_import_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    job = (
+        db.query(models.ImportJob)
+        .filter(
+            models.ImportJob.id == job_id,
+            models.ImportJob.user_id == current_user.id,
+        )
+        .first()
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+@router.get(
+    "/alerts",
+    response_model=list[schemas.BGAlertRead],
+    dependencies=[Depends(use_read_replica)],
+)
+def list_alerts(
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Most recent hypo/hyper and trend alerts for the user, newest first.
+    """
+    return (
+        db.query(models.BGAlert)
+        .filter(models.BGAlert.user_id == current_user.id)
+        .order_by(models.BGAlert.timestamp.desc(), models.BGAlert.id.desc())
+        .limit(min(max(limit, 1), 1000))
+        .all()
+    )
+
+
+@router.get("/bg-readings/stream")
+async def stream_bg_readings(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Server-Sent Events stream of the user's new BG readings and
+    threshold alerts, replacing repeated polling of /bg-readings.
+
+    Events:
+    - `reading`: a BGReadingRead payload
+    - `alert`: emitted for readings outside the in-range band
+    A comment line is sent every `sse_heartbeat_seconds` so proxies
+    keep idle connections open.
+    """
+    user_id = current_user.id
+    # Auth is done; don't pin a pooled DB connection for the lifetime
+    # of a long-lived stream.
+    db.close()
+
+    sub = broker.subscribe(user_id)
+    heartbeat = settings.sse_heartbeat_seconds
+
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            broker.unsubscribe(sub)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get(
+    "/bg-stats/today",
+    response_model=schemas.BGStatsToday,
+    dependencies=[Depends(use_read_replica)],
+)
 def get_bg_stats_today(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
     today = date.today()
+    # Plain range on timestamp (not date(timestamp)) so the index and,
+    # on partitioned Postgres, partition pruning apply.
+    start = datetime.combine(today, datetime.min.time())
+
+    if settings.bg_chunk_store:
+        values = timeseries.read_range(db, current_user.id, start, start + timedelta(days=1)).values
+        if not len(values):
+            return schemas.BGStatsToday(count=0)
+        return schemas.BGStatsToday(
+            average=float(values.mean()),
+            minimum=float(values.min()),
+            maximum=float(values.max()),
+            count=len(values),
+        )
 
     avg_value, min_value, max_value, count_value = db.query(
         func.avg(models.BloodGlucoseReading.value),
@@ -57,7 +360,8 @@ def get_bg_stats_today(
         func.count(models.BloodGlucoseReading.id),
     ).filter(
         models.BloodGlucoseReading.user_id == current_user.id,
-        func.date(models.BloodGlucoseReading.timestamp) == today,
+        models.BloodGlucoseReading.timestamp >= start,
+        models.BloodGlucoseReading.timestamp < start + timedelta(days=1),
     ).one()
 
     return schemas.BGStatsToday(
@@ -68,13 +372,28 @@ def get_bg_stats_today(
     )
 
 
-@router.get("/bg-stats/7d", response_model=schemas.BGStats7Days)
+@router.get(
+    "/bg-stats/7d",
+    response_model=schemas.BGStats7Days,
+    dependencies=[Depends(use_read_replica)],
+)
 def get_bg_stats_7_days(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
     today = date.today()
     start_date = today - timedelta(days=6)  # last 7 days including today
+    start = datetime.combine(start_date, datetime.min.time())
+
+    if settings.bg_chunk_store:
+        arrays = timeseries.read_range(db, current_user.id, start, start + timedelta(days=7))
+        days = arrays.timestamps.astype("datetime64[D]")
+        unique_days, inverse, counts = np.unique(days, return_inverse=True, return_counts=True)
+        sums = np.bincount(inverse, weights=arrays.values, minlength=len(unique_days))
+        return _with_day_summaries(db, current_user.id, start, [
+            schemas.BGStatsDaily(date=day.astype(date), average=float(total / count), count=int(count))
+            for day, total, count in zip(unique_days, sums, counts)
+        ])
 
     rows = (
         db.query(
@@ -84,8 +403,8 @@ def get_bg_stats_7_days(
         )
         .filter(
             models.BloodGlucoseReading.user_id == current_user.id,
-            func.date(models.BloodGlucoseReading.timestamp) >= start_date,
-            func.date(models.BloodGlucoseReading.timestamp) <= today,
+            models.BloodGlucoseReading.timestamp >= start,
+            models.BloodGlucoseReading.timestamp < start + timedelta(days=7),
         )
         .group_by(func.date(models.BloodGlucoseReading.timestamp))
         .order_by(func.date(models.BloodGlucoseReading.timestamp))
@@ -102,33 +421,63 @@ def get_bg_stats_7_days(
             )
         )
 
-    return schemas.BGStats7Days(daily=daily_stats)
+    return _with_day_summaries(db, current_user.id, start, daily_stats)
 
 
-@router.get("/bg-stats/variability", response_model=schemas.BGVariabilityStats)
+def _with_day_summaries(
+    db: Session, user_id: int, start: datetime, daily: list[schemas.BGStatsDaily]
+) -> schemas.BGStats7Days:
+    """Fold in retention day summaries for days whose raw readings were rolled up."""
+    if settings.bg_retention_raw_days is None:
+        return schemas.BGStats7Days(daily=daily)
+
+    by_day = {d.date: d for d in daily}
+    for row in retention.summaries(db, user_id, "day", start, start + timedelta(days=7)):
+        day = row["bucket_start"].date()
+        current = by_day.get(day)
+        if current is None or not current.count:
+            by_day[day] = schemas.BGStatsDaily(date=day, average=row["mean"], count=row["count"])
+        else:
+            count = current.count + row["count"]
+            average = (current.average * current.count + row["mean"] * row["count"]) / count
+            by_day[day] = schemas.BGStatsDaily(date=day, average=average, count=count)
+    return schemas.BGStats7Days(daily=sorted(by_day.values(), key=lambda d: d.date))
+
+
+@router.get(
+    "/bg-stats/variability",
+    response_model=schemas.BGVariabilityStats,
+    dependencies=[Depends(use_read_replica)],
+)
 def get_bg_variability(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
-    values = [
-        v[0]
-        for v in db.query(models.BloodGlucoseReading.value)
-        .filter(models.BloodGlucoseReading.user_id == current_user.id)
-        .all()
-    ]
-
-    count = len(values)
+    if settings.bg_chunk_store:
+        moments = retention.Moments.of(timeseries.read_range(db, current_user.id).values)
+    else:
+        # Aggregate in SQL rather than pulling every reading into Python.
+        count, total, total_sq = db.query(
+            func.count(models.BloodGlucoseReading.id),
+            func.sum(models.BloodGlucoseReading.value),
+            func.sum(models.BloodGlucoseReading.value * models.BloodGlucoseReading.value),
+        ).filter(models.BloodGlucoseReading.user_id == current_user.id).one()
+        moments = retention.Moments.from_sums(count or 0, total, total_sq)
+
+    if settings.bg_retention_raw_days is not None:
+        moments = moments.merge(retention.summary_moments(db, current_user.id))
+
+    count = moments.count
     if count == 0:
         return schemas.BGVariabilityStats(count=0)
 
-    mean = sum(values) / count
+    mean = moments.mean
 
     if count < 2:
         # Not enough data for real variability metrics
         return schemas.BGVariabilityStats(mean=float(mean), count=count)
 
-    variance = sum((v - mean) ** 2 for v in values) / (count - 1)
-    std_dev = variance ** 0.5
+    std_dev = moments.std_dev
 
     cv = std_dev / mean if mean > 0 else None
 
@@ -153,12 +502,18 @@ def create_meal_log(
         user_id=current_user.id,
     )
     db.add(db_log)
+    db.flush()
+    sync.record_changes(db, current_user.id, sync.MEAL_LOG, [db_log.id])
     db.commit()
     db.refresh(db_log)
     return db_log
 
 
-@router.get("/meal-logs", response_model=list[schemas.MealLogRead])
+@router.get(
+    "/meal-logs",
+    response_model=list[schemas.MealLogRead],
+    dependencies=[Depends(use_read_replica)],
+)
 def list_meal_logs(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user),
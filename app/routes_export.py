@@ -0,0 +1,202 @@
+# app/routes_export.py
+"""
+Streaming exports of a user's full history for clinicians.
+
+Rows are pulled from server-side cursors in batches (`yield_per`) and
+written out as CSV or NDJSON chunk by chunk, optionally gzip'd on the
+fly, so memory stays flat no matter how much history a user has.
+"""
+import csv
+import heapq
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import Iterable, Iterator, Literal
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models, timeseries
+from .config import settings
+from .deps import get_db, get_current_active_user, use_read_replica
+from .fieldsets import json_default
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+ExportFormat = Literal["csv", "ndjson"]
+
+# Rows fetched per round trip from the server-side cursor.
+BATCH_SIZE = 2000
+
+
+def _encode_rows(columns: list[str], rows: Iterable[tuple], fmt: ExportFormat) -> Iterator[bytes]:
+    """Turn row tuples into CSV / NDJSON byte chunks of ~BATCH_SIZE rows each."""
+    buf = io.StringIO()
+    writer = csv.writer(buf) if fmt == "csv" else None
+    if writer is not None:
+        writer.writerow(columns)
+
+    pending = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow(
+                [v.isoformat() if isinstance(v, (datetime, date)) else v for v in row]
+            )
+        else:
+            buf.write(json.dumps(dict(zip(columns, row)), default=json_default))
+            buf.write("\n")
+
+        pending += 1
+        if pending >= BATCH_SIZE:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+
+    tail = buf.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def _streaming_response(
+    filename: str,
+    columns: list[str],
+    rows: Iterable[tuple],
+    fmt: ExportFormat,
+    gzip: bool,
+) -> StreamingResponse:
+    body = _encode_rows(columns, rows, fmt)
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    filename = f"{filename}.{fmt}"
+
+    if gzip:
+        body = _gzip(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _stream(db: Session, stmt) -> Iterator[tuple]:
+    result = db.execute(stmt.execution_options(yield_per=BATCH_SIZE))
+    for row in result:
+        yield tuple(row)
+
+
+def _block_rows(db: Session, user_id: int) -> Iterator[tuple]:
+    """Compacted readings, one decoded day block in memory at a time."""
+    blocks = select(models.BGReadingBlock.payload).where(
+        models.BGReadingBlock.user_id == user_id
+    ).order_by(models.BGReadingBlock.day)
+    for (payload,) in _stream(db, blocks):
+        block = timeseries.decode_block(payload)
+        yield from zip(
+            block.ids.tolist(),
+            block.timestamps.tolist(),
+            block.values.tolist(),
+            block.contexts.tolist(),
+        )
+
+
+def _bg_reading_rows(db: Session, user_id: int) -> Iterator[tuple]:
+    Reading = models.BloodGlucoseReading
+    live = _stream(
+        db,
+        select(Reading.id, Reading.timestamp, Reading.value, Reading.context)
+        .where(Reading.user_id == user_id)
+        .order_by(Reading.timestamp, Reading.id),
+    )
+    if not settings.bg_chunk_store:
+        yield from live
+        return
+
+    # Live rows aren't always newer than the blocks: an import can add
+    # history for days that were already compacted. Both streams are
+    # time-sorted, so merge them lazily.
+    yield from heapq.merge(_block_rows(db, user_id), live, key=lambda row: (row[1], row[0]))
+
+
+@router.get(
+    "/bg-readings",
+    dependencies=[Depends(use_read_replica)],
+)
+def export_bg_readings(
+    format: ExportFormat = "csv",
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    return _streaming_response(
+        "bg_readings",
+        ["id", "timestamp", "value", "context"],
+        _bg_reading_rows(db, current_user.id),
+        format,
+        gzip,
+    )
+
+
+@router.get(
+    "/meals",
+    dependencies=[Depends(use_read_replica)],
+)
+def export_meals(
+    format: ExportFormat = "csv",
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    Meal = models.Meal
+    columns = [
+        "id", "timestamp", "name", "description",
+        "calories_kcal", "carbs_g", "protein_g", "fat_g", "fiber_g", "sugar_g",
+        "glycemic_index", "tags", "photo_url",
+    ]
+    stmt = (
+        select(*(getattr(Meal, c) for c in columns))
+        .where(Meal.user_id == current_user.id)
+        .order_by(Meal.timestamp, Meal.id)
+    )
+    return _streaming_response("meals", columns, _stream(db, stmt), format, gzip)
+
+
+@router.get(
+    "/meal-logs",
+    dependencies=[Depends(use_read_replica)],
+)
+def export_meal_logs(
+    format: ExportFormat = "csv",
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    Log = models.MealLog
+    Meal = models.Meal
+    stmt = (
+        select(Log.id, Log.timestamp, Log.meal_id, Meal.name, Log.bg_before, Log.bg_after)
+        .join(Meal, Meal.id == Log.meal_id, isouter=True)
+        .where(Log.user_id == current_user.id)
+        .order_by(Log.timestamp, Log.id)
+    )
+    return _streaming_response(
+        "meal_logs",
+        ["id", "timestamp", "meal_id", "meal_name", "bg_before", "bg_after"],
+        _stream(db, stmt),
+        format,
+        gzip,
+    )
@@ -1,13 +1,15 @@
 # app/routes_food_search.py
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
+from . import metrics, usda
+from .cache import cache
 from .deps import get_db
 from .config import settings
 
-import httpx
 from pydantic import BaseModel
 
 
@@ -38,12 +40,17 @@ class FoodSearchResponse(BaseModel):
     foods: List[FoodSearchResult]
 
 
+def _cache_search_results(db: Session, foods_raw: list[dict]) -> None:
+    usda.cache_foods(db, foods_raw)
+    db.commit()
+
+
 @router.get("/search-foods", response_model=FoodSearchResponse)
 async def search_foods(
     q: str,
     page: int = 1,
     page_size: int = 10,
-    db: Session = Depends(get_db),  # kept for future local caching, not used yet
+    db: Session = Depends(get_db),
 ):
     """
     Proxy search to USDA FoodData Central.
@@ -52,6 +59,14 @@ async def search_foods(
     if not settings.fdc_api_key:
         raise HTTPException(status_code=500, detail="USDA API key not configured")
 
+    # Search results are shared across users (and workers, with a shared
+    # cache backend), which saves USDA quota for popular queries.
+    cache_key = f"usda-search:{page}:{page_size}:{q.strip().lower()}"
+    cached = await run_in_threadpool(cache.get, cache_key)
+    metrics.cache_result("search", cached is not None)
+    if cached is not None:
+        return FoodSearchResponse(**cached)
+
     params = {
         "api_key": settings.fdc_api_key,
         "query": q,
@@ -60,10 +75,14 @@ async def search_foods(
         "dataType": "Branded,Survey (FNDDS),SR Legacy",
     }
 
-    url = "https://api.nal.usda.gov/fdc/v1/foods/search"
+    url = f"{usda.FDC_BASE_URL}/foods/search"
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(url, params=params)
+    import httpx  # deferred like in usda.fetch_foods
+
+    with metrics.usda_call("search") as call:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            resp = await client.get(url, params=params)
+        call.status = resp.status_code
 
     if resp.status_code != 200:
         raise HTTPException(
@@ -76,6 +95,10 @@ async def search_foods(
     total_hits = data.get("totalHits", 0)
     foods_raw = data.get("foods", [])
 
+    # Remember full nutrient data for these foods so /meals/from-food
+    # can build meals from them without another USDA call.
+    await run_in_threadpool(_cache_search_results, db, foods_raw)
+
     foods: List[FoodSearchResult] = []
 
     for f in foods_raw:
@@ -104,9 +127,13 @@ async def search_foods(
             )
         )
 
-    return FoodSearchResponse(
+    response = FoodSearchResponse(
         total_hits=total_hits,
         page=page,
         page_size=page_size,
         foods=foods,
     )
+    await run_in_threadpool(
+        cache.set, cache_key, response.model_dump(), settings.cache_usda_search_ttl_seconds
+    )
+    return response
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+import numpy as np
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
 
-from . import models, schemas
-from .deps import get_db, get_current_active_user
+from . import fieldsets, meal_versions, models, schemas, sync, usda
+from .analysis_cache import analysis_cache
+from .catalog import IMPACTS, MealCatalog, get_catalog
+from .similarity import matrix_cache, meal_vector, nearest_lower_gl, FEATURES
+from .deps import get_db, get_current_active_user, use_read_replica
 
 
 def _classify_glycemic_load(gl: float | None) -> str:
@@ -23,8 +28,43 @@ def _classify_glycemic_load(gl: float | None) -> str:
         return "high"
 
 
+def _meal_analysis(meal) -> schemas.MealAnalysis:
+    """GL + impact for anything with Meal's id/name/carbs_g/glycemic_index."""
+    carbs = meal.carbs_g
+    gi = meal.glycemic_index
+
+    if carbs is not None and gi is not None:
+        glycemic_load = carbs * gi / 100.0
+    else:
+        glycemic_load = None
+
+    return schemas.MealAnalysis(
+        meal_id=meal.id,
+        name=meal.name,
+        carbs_g=carbs,
+        glycemic_index=gi,
+        glycemic_load=glycemic_load,
+        impact_category=_classify_glycemic_load(glycemic_load),
+    )
+
+
+def _record_meal_writes(user_id: int, meals) -> None:
+    """
+    Bump the user's meal-set version after a committed write and patch
+    the cached analysis with just the written meals.
+    """
+    version = meal_versions.bump(user_id)
+    if version is None:  # shared cache unreachable
+        analysis_cache.invalidate(user_id)
+        return
+    analysis_cache.apply(user_id, version, [(m.timestamp, _meal_analysis(m)) for m in meals])
+
+
 router = APIRouter(prefix="/meals", tags=["Meals"])
 
+# Upper bound on meals accepted by one POST /meals/batch request
+MAX_BATCH_MEALS = 1000
+
 
 @router.post("/", response_model=schemas.MealRead)
 def create_meal(
@@ -47,16 +87,119 @@ def create_meal(
         photo_url=meal.photo_url,
     )
     db.add(db_meal)
+    db.flush()
+    sync.record_changes(db, current_user.id, sync.MEAL, [db_meal.id])
     db.commit()
     db.refresh(db_meal)
+    _record_meal_writes(current_user.id, [db_meal])
     return db_meal
 
 
-@router.get("/", response_model=list[schemas.MealRead])
+@router.post("/batch", response_model=list[schemas.MealRead])
+def create_meals_batch(
+    meals: list[schemas.MealCreate] = Body(..., max_length=MAX_BATCH_MEALS),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Create many meals in one transaction with a single
+    INSERT ... RETURNING, e.g. for imports and the meal editor.
+    """
+    if not meals:
+        return []
+
+    created = db.scalars(
+        insert(models.Meal).returning(models.Meal),
+        [{**meal.model_dump(), "user_id": current_user.id} for meal in meals],
+    ).all()
+    # Serialize before commit so expired attributes aren't reloaded row by row.
+    result = [schemas.MealRead.model_validate(m) for m in created]
+    sync.record_changes(db, current_user.id, sync.MEAL, (m.id for m in result))
+    db.commit()
+    _record_meal_writes(current_user.id, result)
+    return result
+
+
+@router.post("/from-food", response_model=list[schemas.MealRead])
+def create_meals_from_food(
+    req: schemas.MealFromFoodRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Create meal(s) from USDA FoodData Central foods.
+
+    Nutrients come from the local USDA cache (filled by food search);
+    any ids not cached yet are fetched in one batched USDA call.
+    """
+    try:
+        foods = usda.get_foods(db, (i.fdc_id for i in req.ingredients))
+    except RuntimeError as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    except usda.UpstreamError as exc:
+        raise HTTPException(status_code=502, detail=f"USDA API error: {exc}")
+
+    missing = sorted({i.fdc_id for i in req.ingredients} - foods.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"USDA foods not found: {missing}")
+
+    portions = []
+    for ingredient in req.ingredients:
+        food = foods[ingredient.fdc_id]
+        grams = ingredient.grams or (food.serving_size_g or 100.0) * ingredient.servings
+        portions.append((food, grams / 100.0))
+
+    def nutrient_totals(items) -> dict[str, float | None]:
+        totals = {}
+        for column in usda.NUTRIENT_COLUMNS:
+            known = [getattr(food, column) * factor for food, factor in items if getattr(food, column) is not None]
+            totals[column] = round(sum(known), 1) if known else None
+        return totals
+
+    shared = {
+        "user_id": current_user.id,
+        "description": req.description,
+        "glycemic_index": req.glycemic_index,
+        "tags": req.tags,
+    }
+    if req.combine:
+        rows = [{
+            **shared,
+            **nutrient_totals(portions),
+            "name": req.name or ", ".join(food.description for food, _ in portions),
+        }]
+    else:
+        rows = [
+            {**shared, **nutrient_totals([(food, factor)]), "name": food.description}
+            for food, factor in portions
+        ]
+
+    created = db.scalars(insert(models.Meal).returning(models.Meal), rows).all()
+    result = [schemas.MealRead.model_validate(m) for m in created]
+    sync.record_changes(db, current_user.id, sync.MEAL, (m.id for m in result))
+    db.commit()
+    _record_meal_writes(current_user.id, result)
+    return result
+
+
+@router.get(
+    "/",
+    response_model=list[schemas.MealRead],
+    dependencies=[Depends(use_read_replica)],
+)
 def list_meals(
+    fields: str | None = fieldsets.FIELDS_QUERY,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
+    names = fieldsets.parse(fields, schemas.MealRead)
+    if names is not None:
+        return fieldsets.response(names, db.execute(
+            select(*fieldsets.columns(models.Meal, names))
+            .where(models.Meal.user_id == current_user.id)
+            .order_by(models.Meal.timestamp.desc())
+        ))
+
     return (
         db.query(models.Meal)
         .filter(models.Meal.user_id == current_user.id)
@@ -65,6 +208,50 @@ def list_meals(
     )
 
 
+def _catalog_analysis(cat: MealCatalog, i: int) -> schemas.MealAnalysis:
+    carbs = cat.carbs_g[i]
+    gi = cat.glycemic_index[i]
+    return schemas.MealAnalysis(
+        meal_id=int(cat.ids[i]),
+        name=cat.names[i],
+        carbs_g=None if np.isnan(carbs) else float(carbs),
+        glycemic_index=None if np.isnan(gi) else float(gi),
+        glycemic_load=cat.gl_value(i),
+        impact_category=cat.impact_name(i),
+        shared=True,
+    )
+
+
+@router.get(
+    "/catalog",
+    response_model=list[schemas.MealAnalysis],
+    dependencies=[Depends(use_read_replica)],
+)
+def list_catalog_meals(
+    tag: list[str] = Query(default=[]),
+    impact: list[str] = Query(default=[]),
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Browse the shared meal catalog, lowest glycemic load first.
+    Filters: every `tag` must be present; `impact` is any of
+    low / medium / high / unknown.
+    """
+    unknown = set(impact) - set(IMPACTS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown impact categories: {sorted(unknown)}")
+
+    cat = get_catalog(db)
+    positions = cat.select(
+        impacts=set(impact) or None,
+        tags=tag,
+        limit=min(max(limit, 1), 500),
+    )
+    return [_catalog_analysis(cat, int(i)) for i in positions]
+
+
 @router.post("/logs", response_model=schemas.MealLogRead)
 def create_meal_log(
     log: schemas.MealLogCreate,
@@ -90,16 +277,31 @@ def create_meal_log(
         bg_after=log.bg_after,
     )
     db.add(db_log)
+    db.flush()
+    sync.record_changes(db, current_user.id, sync.MEAL_LOG, [db_log.id])
     db.commit()
     db.refresh(db_log)
     return db_log
 
 
-@router.get("/logs", response_model=list[schemas.MealLogRead])
+@router.get(
+    "/logs",
+    response_model=list[schemas.MealLogRead],
+    dependencies=[Depends(use_read_replica)],
+)
 def list_meal_logs(
+    fields: str | None = fieldsets.FIELDS_QUERY,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
+    names = fieldsets.parse(fields, schemas.MealLogRead)
+    if names is not None:
+        return fieldsets.response(names, db.execute(
+            select(*fieldsets.columns(models.MealLog, names))
+            .where(models.MealLog.user_id == current_user.id)
+            .order_by(models.MealLog.timestamp.desc())
+        ))
+
     return (
         db.query(models.MealLog)
         .filter(models.MealLog.user_id == current_user.id)
@@ -107,7 +309,11 @@ def list_meal_logs(
         .all()
     )
 
-@router.get("/{meal_id}/analysis", response_model=schemas.MealAnalysis)
+@router.get(
+    "/{meal_id}/analysis",
+    response_model=schemas.MealAnalysis,
+    dependencies=[Depends(use_read_replica)],
+)
 def analyze_single_meal(
     meal_id: int,
     db: Session = Depends(get_db),
@@ -124,65 +330,113 @@ def analyze_single_meal(
     if not meal:
         raise HTTPException(status_code=404, detail="Meal not found.")
 
-    carbs = meal.carbs_g
-    gi = meal.glycemic_index
+    return _meal_analysis(meal)
 
-    if carbs is not None and gi is not None:
-        glycemic_load = carbs * gi / 100.0
-    else:
-        glycemic_load = None
 
-    impact = _classify_glycemic_load(glycemic_load)
-
-    return schemas.MealAnalysis(
-        meal_id=meal.id,
-        name=meal.name,
-        carbs_g=carbs,
-        glycemic_index=gi,
-        glycemic_load=glycemic_load,
-        impact_category=impact,
-    )
+@router.get(
+    "/analysis/all",
+    response_model=list[schemas.MealAnalysis],
+    dependencies=[Depends(use_read_replica)],
+)
+def analyze_all_meals(
+    include_catalog: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    GL analysis of all the user's meals, newest first. Served from a
+    per-user memo that meal writes update incrementally.
+    """
+    cached = analysis_cache.get(current_user.id)
+    if cached is None:
+        # Read the version before the meals so a concurrent write
+        # can't leave a stale entry looking current.
+        version = meal_versions.current(current_user.id)
+        Meal = models.Meal
+        meals = db.execute(
+            select(Meal.id, Meal.name, Meal.carbs_g, Meal.glycemic_index, Meal.timestamp)
+            .where(Meal.user_id == current_user.id)
+            .order_by(Meal.timestamp.desc())
+        ).all()
+        analyzed = [(meal.timestamp, _meal_analysis(meal)) for meal in meals]
+        analysis_cache.store(current_user.id, version, analyzed)
+        cached = [a for _, a in analyzed]
+
+    results = list(cached)
+
+    if include_catalog:
+        cat = get_catalog(db)
+        results.extend(_catalog_analysis(cat, i) for i in range(len(cat)))
 
+    return results
 
-@router.get("/analysis/all", response_model=list[schemas.MealAnalysis])
-def analyze_all_meals(
+@router.get(
+    "/{meal_id}/similar",
+    response_model=schemas.SimilarMealsResponse,
+    dependencies=[Depends(use_read_replica)],
+)
+def similar_meals(
+    meal_id: int,
+    k: int = 5,
+    include_catalog: bool = False,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
-    meals = (
+    """
+    Meals closest in macro profile (calories, carbs, protein, fat,
+    fiber, sugar) to this one, but with a lower glycemic load.
+    Optionally also searches the shared catalog (meals with no owner).
+    """
+    meal = (
         db.query(models.Meal)
-        .filter(models.Meal.user_id == current_user.id)
-        .order_by(models.Meal.timestamp.desc())
-        .all()
+        .filter(
+            models.Meal.id == meal_id,
+            models.Meal.user_id == current_user.id,
+        )
+        .first()
     )
+    if not meal:
+        raise HTTPException(status_code=404, detail="Meal not found.")
+    if meal.carbs_g is None or meal.glycemic_index is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Meal needs carbs_g and glycemic_index to compare glycemic load.",
+        )
 
-    results: list[schemas.MealAnalysis] = []
-
-    for meal in meals:
-        carbs = meal.carbs_g
-        gi = meal.glycemic_index
-
-        if carbs is not None and gi is not None:
-            glycemic_load = carbs * gi / 100.0
-        else:
-            glycemic_load = None
-
-        impact = _classify_glycemic_load(glycemic_load)
-
-        results.append(
-            schemas.MealAnalysis(
-                meal_id=meal.id,
-                name=meal.name,
-                carbs_g=carbs,
-                glycemic_index=gi,
-                glycemic_load=glycemic_load,
-                impact_category=impact,
+    glycemic_load = meal.carbs_g * meal.glycemic_index / 100.0
+    query = meal_vector(getattr(meal, f) for f in FEATURES)
+    k = min(max(k, 1), 50)
+
+    candidates = []
+    owners = [current_user.id, None] if include_catalog else [current_user.id]
+    for owner in owners:
+        matrix = matrix_cache.get(db, owner) if owner is not None else get_catalog(db).matrix
+        for i, distance in nearest_lower_gl(matrix, query, glycemic_load, k, exclude_id=meal.id):
+            gl = float(matrix.glycemic_load[i])
+            candidates.append(
+                schemas.SimilarMeal(
+                    meal_id=int(matrix.ids[i]),
+                    name=matrix.names[i],
+                    glycemic_load=gl,
+                    impact_category=_classify_glycemic_load(gl),
+                    distance=distance,
+                    shared=owner is None,
+                )
             )
-        )
 
-    return results
+    candidates.sort(key=lambda s: s.distance)
+    return schemas.SimilarMealsResponse(
+        meal_id=meal.id,
+        glycemic_load=glycemic_load,
+        suggestions=candidates[:k],
+    )
+
 
-@router.get("/{meal_id}", response_model=schemas.MealRead)
+@router.get(
+    "/{meal_id}",
+    response_model=schemas.MealRead,
+    dependencies=[Depends(use_read_replica)],
+)
 def get_meal(
     meal_id: int,
     db: Session = Depends(get_db),
@@ -233,6 +487,42 @@ def update_meal(
     db_meal.tags = meal_update.tags
     db_meal.photo_url = meal_update.photo_url
 
+    sync.record_changes(db, current_user.id, sync.MEAL, [db_meal.id])
     db.commit()
     db.refresh(db_meal)
+    _record_meal_writes(current_user.id, [db_meal])
     return db_meal
+
+
+@router.patch("/{meal_id}", response_model=schemas.MealRead)
+def patch_meal(
+    meal_id: int,
+    meal_patch: schemas.MealPatch,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Partial update: one UPDATE ... RETURNING touching only the columns
+    present in the request body, without loading the row first.
+    """
+    changes = meal_patch.model_dump(exclude_unset=True)
+    if "name" in changes and changes["name"] is None:
+        raise HTTPException(status_code=422, detail="Meal name cannot be null")
+
+    owned = (models.Meal.id == meal_id, models.Meal.user_id == current_user.id)
+    if changes:
+        stmt = update(models.Meal).where(*owned).values(**changes).returning(models.Meal)
+    else:
+        stmt = select(models.Meal).where(*owned)
+
+    db_meal = db.scalars(stmt).one_or_none()
+    if db_meal is None:
+        raise HTTPException(status_code=404, detail="Meal not found")
+
+    result = schemas.MealRead.model_validate(db_meal)
+    if changes:
+        sync.record_changes(db, current_user.id, sync.MEAL, [result.id])
+    db.commit()
+    if changes:
+        _record_meal_writes(current_user.id, [result])
+    return result
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, select
 
-from . import models, schemas
-from .deps import get_db, get_current_active_user
+from . import meal_versions, models, schemas, timeseries
+from .catalog import MealCatalog, get_catalog
+from .config import settings
+from .deps import get_db, get_current_active_user, use_read_replica
 from .models import User
+from .recommendation_snapshots import Bands, recommendation_snapshots
 
 router = APIRouter(prefix="/diabetes", tags=["Recommendations"])
 
@@ -26,6 +29,46 @@ def _classify_glycemic_load(gl: float | None) -> str:
         return "high"
 
 
+# BG bands, ascending: (upper bound mg/dL, category, explanation,
+# allowed impact categories for meals).
+BG_BANDS = (
+    (
+        70,
+        "low",
+        "Your blood glucose is low. Prefer medium to higher-impact meals to help raise it, and follow your care plan.",
+        frozenset({"medium", "high"}),
+    ),
+    (
+        130,
+        "in_range",
+        "Your blood glucose is in range. You can choose low or medium-impact meals.",
+        frozenset({"low", "medium"}),
+    ),
+    (
+        180,
+        "mild_high",
+        "Your blood glucose is slightly high. Prefer lower-impact meals, with some medium-impact options.",
+        frozenset({"low", "medium"}),
+    ),
+    (
+        240,
+        "high",
+        "Your blood glucose is high. Stick to low-impact meals that won’t spike you further.",
+        frozenset({"low"}),
+    ),
+    (
+        float("inf"),
+        "very_high",
+        "Your blood glucose is very high. Focus on low-impact meals only and follow your care plan or provider instructions.",
+        frozenset({"low"}),
+    ),
+)
+
+NO_MEALS_EXPLANATION = (
+    "You don't have any meals saved yet. Create meals first, then the app can recommend from them."
+)
+
+
 def _bg_category_and_explanation(bg_now: float) -> tuple[str, str, set[str]]:
     """
     Map current blood glucose to:
@@ -33,131 +76,141 @@ def _bg_category_and_explanation(bg_now: float) -> tuple[str, str, set[str]]:
     - an explanation string
     - a set of allowed impact categories for meals
     """
-    if bg_now < 70:
-        return (
-            "low",
-            "Your blood glucose is low. Prefer medium to higher-impact meals to help raise it, and follow your care plan.",
-            {"medium", "high"},
-        )
-    elif bg_now < 130:
-        return (
-            "in_range",
-            "Your blood glucose is in range. You can choose low or medium-impact meals.",
-            {"low", "medium"},
-        )
-    elif bg_now < 180:
-        return (
-            "mild_high",
-            "Your blood glucose is slightly high. Prefer lower-impact meals, with some medium-impact options.",
-            {"low", "medium"},
-        )
-    elif bg_now < 240:
-        return (
-            "high",
-            "Your blood glucose is high. Stick to low-impact meals that won’t spike you further.",
-            {"low"},
-        )
+    for upper, category, explanation, impacts in BG_BANDS:
+        if bg_now < upper:
+            return category, explanation, set(impacts)
+    _, category, explanation, impacts = BG_BANDS[-1]
+    return category, explanation, set(impacts)
+
+
+def _catalog_suggestion(cat: MealCatalog, i: int) -> schemas.MealSuggestion:
+    carbs = cat.carbs_g[i]
+    gi = cat.glycemic_index[i]
+    return schemas.MealSuggestion(
+        meal_id=int(cat.ids[i]),
+        name=cat.names[i],
+        glycemic_load=cat.gl_value(i),
+        impact_category=cat.impact_name(i),
+        carbs_g=None if carbs != carbs else float(carbs),  # NaN -> None
+        glycemic_index=None if gi != gi else float(gi),
+        shared=True,
+    )
+
+
+def _meal_suggestion(meal) -> schemas.MealSuggestion:
+    carbs = meal.carbs_g
+    gi = meal.glycemic_index
+
+    if carbs is not None and gi is not None:
+        glycemic_load = carbs * gi / 100.0
     else:
-        return (
-            "very_high",
-            "Your blood glucose is very high. Focus on low-impact meals only and follow your care plan or provider instructions.",
-            {"low"},
-        )
+        glycemic_load = None
+
+    return schemas.MealSuggestion(
+        meal_id=meal.id,
+        name=meal.name,
+        glycemic_load=glycemic_load,
+        impact_category=_classify_glycemic_load(glycemic_load),
+        carbs_g=carbs,
+        glycemic_index=gi,
+    )
+
+
+def _build_snapshot(db: Session, user_id: int, cat: MealCatalog | None) -> Bands:
+    """
+    Finished recommendations for every BG band, without the catalog and,
+    if `cat` is given, with it.
+    """
+    meals = db.execute(
+        select(models.Meal.id, models.Meal.name, models.Meal.carbs_g, models.Meal.glycemic_index)
+        .where(models.Meal.user_id == user_id)
+    ).all()
+    suggestions = [_meal_suggestion(meal) for meal in meals]
+    known_impact_suggestions = [s for s in suggestions if s.impact_category != "unknown"]
 
+    # Sort by glycemic load (ascending), treating None as "large"
+    def sort_key(s: schemas.MealSuggestion):
+        return s.glycemic_load if s.glycemic_load is not None else 9999.0
 
-@router.get("/recommend-meals", response_model=schemas.MealRecommendationResponse)
+    bands: Bands = {}
+    for _, bg_category, explanation, allowed_impacts in BG_BANDS:
+        # Shared catalog meals come precomputed; take the lowest-GL ones
+        # from the allowed buckets.
+        catalog_suggestions = [
+            _catalog_suggestion(cat, int(i)) for i in cat.select(impacts=allowed_impacts, limit=5)
+        ] if cat is not None else []
+        for include_catalog in (False, True) if cat is not None else (False,):
+            extra = catalog_suggestions if include_catalog else []
+            if not suggestions and not extra:
+                bands[bg_category, include_catalog] = (NO_MEALS_EXPLANATION, [])
+                continue
+
+            filtered = [
+                s for s in known_impact_suggestions if s.impact_category in allowed_impacts
+            ] + extra
+
+            # If filtering removed everything (e.g. all meals unknown or wrong bucket),
+            # fall back to all known-impact meals, then finally all meals.
+            if not filtered:
+                filtered = known_impact_suggestions or suggestions
+
+            bands[bg_category, include_catalog] = (explanation, sorted(filtered, key=sort_key)[:5])
+    return bands
+
+
+@router.get(
+    "/recommend-meals",
+    response_model=schemas.MealRecommendationResponse,
+    dependencies=[Depends(use_read_replica)],
+)
 def recommend_meals(
+    include_catalog: bool = False,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
     """
     Recommend meals based on the user's latest blood glucose reading
     and the glycemic load classification of their saved meals.
+    `include_catalog` adds shared catalog meals (`shared: true`); those
+    can't be fetched or logged through the user-scoped /meals routes.
+
+    Results for all BG bands are precomputed per user and rebuilt only
+    when the user's meals or the catalog change (see
+    app/recommendation_snapshots.py).
     """
     # 1) Get the latest BG reading
-    latest_bg = (
-        db.query(models.BloodGlucoseReading)
-        .filter(models.BloodGlucoseReading.user_id == current_user.id)
-        .order_by(desc(models.BloodGlucoseReading.timestamp))
-        .first()
-    )
+    if settings.bg_chunk_store:
+        latest_value = timeseries.latest_value(db, current_user.id)
+    else:
+        latest_value = db.scalar(
+            select(models.BloodGlucoseReading.value)
+            .where(models.BloodGlucoseReading.user_id == current_user.id)
+            .order_by(desc(models.BloodGlucoseReading.timestamp))
+            .limit(1)
+        )
 
-    if not latest_bg:
+    if latest_value is None:
         raise HTTPException(
             status_code=400,
             detail="No blood glucose readings found. Add a reading before requesting recommendations.",
         )
 
-    bg_now = float(latest_bg.value)
-
-    # 2) Determine BG category, explanation, and allowed meal impact buckets
-    bg_category, explanation, allowed_impacts = _bg_category_and_explanation(bg_now)
-
-    # 3) Get all meals for this user
-    meals = (
-        db.query(models.Meal)
-        .filter(models.Meal.user_id == current_user.id)
-        .all()
-    )
+    bg_now = float(latest_value)
+    bg_category, _, _ = _bg_category_and_explanation(bg_now)
 
-    if not meals:
-        return schemas.MealRecommendationResponse(
-            bg_now=bg_now,
-            bg_category=bg_category,
-            explanation="You don't have any meals saved yet. Create meals first, then the app can recommend from them.",
-            suggestions=[],
-        )
-
-    suggestions: list[schemas.MealSuggestion] = []
-
-    # 4) Compute glycemic load and impact classification for each meal
-    for meal in meals:
-        carbs = meal.carbs_g
-        gi = meal.glycemic_index
-
-        if carbs is not None and gi is not None:
-            glycemic_load = carbs * gi / 100.0
-        else:
-            glycemic_load = None
-
-        impact = _classify_glycemic_load(glycemic_load)
-
-        # We'll build the suggestion object no matter what, but filter below.
-        suggestions.append(
-            schemas.MealSuggestion(
-                meal_id=meal.id,
-                name=meal.name,
-                glycemic_load=glycemic_load,
-                impact_category=impact,
-                carbs_g=carbs,
-                glycemic_index=gi,
-            )
-        )
-
-    # 5) Filter suggestions by allowed impact categories, if we have any with known impact
-    known_impact_suggestions = [s for s in suggestions if s.impact_category != "unknown"]
-
-    filtered = [
-        s for s in known_impact_suggestions if s.impact_category in allowed_impacts
-    ]
-
-    # If filtering removed everything (e.g. all meals unknown or wrong bucket),
-    # fall back to all known-impact meals, then finally all meals.
-    if not filtered:
-        filtered = known_impact_suggestions or suggestions
-
-    # 6) Sort by glycemic load (ascending), treating None as "large"
-    def sort_key(s: schemas.MealSuggestion):
-        return s.glycemic_load if s.glycemic_load is not None else 9999.0
-
-    filtered_sorted = sorted(filtered, key=sort_key)
-
-    # 7) Limit to top N (e.g. 5)
-    top_n = filtered_sorted[:5]
+    # 2) Look up (or rebuild) the user's snapshot
+    cat = get_catalog(db) if include_catalog else None
+    fingerprint = cat.fingerprint if cat is not None else None
+    bands = recommendation_snapshots.get(current_user.id, fingerprint)
+    if bands is None:
+        version = meal_versions.current(current_user.id)
+        bands = _build_snapshot(db, current_user.id, cat)
+        recommendation_snapshots.store(current_user.id, version, fingerprint, bands)
 
+    explanation, suggestions = bands[bg_category, include_catalog]
     return schemas.MealRecommendationResponse(
         bg_now=bg_now,
         bg_category=bg_category,
         explanation=explanation,
-        suggestions=top_n,
-    )
\ No newline at end of file
+        suggestions=suggestions,
+    )
@@ -0,0 +1,213 @@
+# app/routes_sync.py
+"""
+Delta sync for offline-capable clients.
+
+GET /sync?since=<cursor> returns only what changed since the cursor
+(see app/sync.py). POST /sync applies a batch of client-queued writes.
+Each operation carries a client-generated `op_id`: one that was already
+applied is reported as a duplicate and not applied again, so a client
+can resend the whole queue after a dropped connection.
+
+Each operation runs in its own savepoint, so one bad operation doesn't
+sink the batch. Readings uploaded here skip trend alerting and the SSE
+stream. They are usually hours old by the time an offline client
+reconnects.
+"""
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import meal_versions, models, schemas, sync
+from .analysis_cache import analysis_cache
+from .config import settings
+from .deps import get_db, get_current_active_user
+from .routes_meals import _record_meal_writes
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+_MODELS = {
+    sync.MEAL: models.Meal,
+    sync.MEAL_LOG: models.MealLog,
+    sync.BG_READING: models.BloodGlucoseReading,
+}
+_CREATE_SCHEMAS: dict[str, type[BaseModel]] = {
+    sync.MEAL: schemas.MealCreate,
+    sync.MEAL_LOG: schemas.SyncMealLogCreate,
+    sync.BG_READING: schemas.SyncBGReadingCreate,
+}
+_PATCH_SCHEMAS: dict[str, type[BaseModel]] = {
+    sync.MEAL: schemas.MealPatch,
+    sync.MEAL_LOG: schemas.SyncMealLogPatch,
+    sync.BG_READING: schemas.SyncBGReadingPatch,
+}
+
+
+class _OperationError(Exception):
+    pass
+
+
+def _utc_naive(value: datetime | None) -> datetime | None:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _check_meal_owner(db: Session, user_id: int, meal_id: int) -> None:
+    owned = db.scalar(
+        select(models.Meal.id).where(models.Meal.id == meal_id, models.Meal.user_id == user_id)
+    )
+    if owned is None:
+        raise _OperationError("Meal not found for this user.")
+
+
+def _apply(db: Session, user_id: int, op: schemas.SyncOperation) -> int:
+    """Apply one operation; returns the affected row id."""
+    model = _MODELS[op.entity]
+
+    if op.op == "create":
+        values = _CREATE_SCHEMAS[op.entity].model_validate(op.data).model_dump(exclude_none=True)
+        if "timestamp" in values:
+            values["timestamp"] = _utc_naive(values["timestamp"])
+        if op.entity == sync.MEAL_LOG:
+            _check_meal_owner(db, user_id, values["meal_id"])
+        row = model(user_id=user_id, **values)
+        db.add(row)
+        db.flush()
+        return row.id
+
+    if op.id is None:
+        raise _OperationError(f"'{op.op}' needs the server id of the row")
+    owned = (model.id == op.id, model.user_id == user_id)
+
+    if op.op == "update":
+        changes = _PATCH_SCHEMAS[op.entity].model_validate(op.data).model_dump(exclude_unset=True)
+        if op.entity == sync.MEAL and changes.get("name", "") is None:
+            raise _OperationError("Meal name cannot be null")
+        if op.entity == sync.BG_READING and "value" in changes and changes["value"] is None:
+            raise _OperationError("Reading value cannot be null")
+        stmt = update(model).where(*owned).values(**changes) if changes else select(model.id).where(*owned)
+        result = db.execute(stmt)
+        if (result.rowcount if changes else len(result.all())) == 0:
+            raise _OperationError(f"{op.entity} {op.id} not found")
+        return op.id
+
+    if op.entity == sync.MEAL:
+        in_use = db.scalar(
+            select(models.MealLog.id)
+            .where(models.MealLog.user_id == user_id, models.MealLog.meal_id == op.id)
+            .limit(1)
+        )
+        if in_use is not None:
+            raise _OperationError("Meal has meal logs; delete those first")
+    if op.entity == sync.BG_READING:
+        # Alerts keep their history without the reading (as in retention).
+        db.execute(
+            update(models.BGAlert)
+            .where(models.BGAlert.reading_id == op.id, models.BGAlert.user_id == user_id)
+            .values(reading_id=None)
+        )
+    if db.execute(delete(model).where(*owned)).rowcount == 0:
+        raise _OperationError(f"{op.entity} {op.id} not found")
+    return op.id
+
+
+@router.get("", response_model=schemas.SyncResponse)
+def pull_changes(
+    since: int = 0,
+    limit: int = 1000,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Rows created, updated or deleted since `since` (a cursor from a
+    previous response). since=0 returns a full snapshot instead.
+    """
+    if since < 0:
+        raise HTTPException(status_code=422, detail="since must be >= 0")
+    if since == 0:
+        return sync.snapshot(db, current_user.id)
+    return sync.changes_since(db, current_user.id, since, min(max(limit, 1), 5000))
+
+
+@router.post("", response_model=schemas.SyncUploadResponse)
+def push_changes(
+    req: schemas.SyncUploadRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Apply client-queued writes in order. Results come back in the same
+    order. Follow up with GET /sync to pick up the server's view of the
+    rows, including changes from other devices.
+    """
+    user_id = current_user.id
+    op_ids = [op.op_id for op in req.operations]
+    applied = {
+        row.op_id: row
+        for row in db.scalars(
+            select(models.SyncOp).where(models.SyncOp.user_id == user_id, models.SyncOp.op_id.in_(op_ids))
+        )
+    }
+
+    results: list[schemas.SyncOperationResult] = []
+    meals_written: set[int] = set()
+    meals_deleted = False
+    for op in req.operations:
+        previous = applied.get(op.op_id)
+        if previous is not None:
+            results.append(schemas.SyncOperationResult(
+                op_id=op.op_id, status="duplicate", entity=previous.entity, id=previous.entity_id
+            ))
+            continue
+
+        try:
+            with db.begin_nested():
+                row_id = _apply(db, user_id, op)
+                sync.record_changes(db, user_id, op.entity, [row_id], deleted=op.op == "delete")
+                record = models.SyncOp(user_id=user_id, op_id=op.op_id, entity=op.entity, entity_id=row_id)
+                db.add(record)
+        except ValidationError as exc:
+            detail = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors())
+            results.append(schemas.SyncOperationResult(
+                op_id=op.op_id, status="error", entity=op.entity, id=op.id, detail=detail
+            ))
+            continue
+        except (_OperationError, IntegrityError) as exc:
+            detail = str(exc) if isinstance(exc, _OperationError) else "Constraint violation"
+            results.append(schemas.SyncOperationResult(
+                op_id=op.op_id, status="error", entity=op.entity, id=op.id, detail=detail
+            ))
+            continue
+
+        applied[op.op_id] = record
+        if op.entity == sync.MEAL:
+            if op.op == "delete":
+                meals_deleted = True
+                meals_written.discard(row_id)
+            else:
+                meals_written.add(row_id)
+        results.append(schemas.SyncOperationResult(
+            op_id=op.op_id, status="applied", entity=op.entity, id=row_id
+        ))
+
+    cutoff = datetime.utcnow() - timedelta(days=settings.sync_op_retention_days)
+    db.execute(delete(models.SyncOp).where(models.SyncOp.user_id == user_id, models.SyncOp.created_at < cutoff))
+
+    written = [
+        schemas.MealRead.model_validate(m)
+        for m in db.scalars(select(models.Meal).where(models.Meal.id.in_(meals_written)))
+    ] if meals_written else []
+    cursor = sync.latest_cursor(db, user_id)
+    db.commit()
+
+    if meals_deleted:
+        meal_versions.bump(user_id)
+        analysis_cache.invalidate(user_id)
+    elif written:
+        _record_meal_writes(user_id, written)
+
+    return schemas.SyncUploadResponse(results=results, cursor=cursor)
@@ -1,6 +1,6 @@
 from datetime import datetime, date
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import Any, List, Literal, Optional
 
 
 class UserLogin(BaseModel):
@@ -24,6 +24,7 @@ class UserCreate(UserBase):
 
 class UserRead(UserBase):
     id: int
+    role: str = "user"
 
     class Config:
         from_attributes = True
@@ -64,6 +65,26 @@ class MealUpdate(MealBase):
     pass
 
 
+class MealPatch(BaseModel):
+    """
+    Partial update: only the fields the client sends are written.
+    Send a field as null to clear it (except `name`, which is required).
+    """
+    name: str | None = None
+    description: str | None = None
+
+    calories_kcal: float | None = None
+    carbs_g: float | None = None
+    protein_g: float | None = None
+    fat_g: float | None = None
+    fiber_g: float | None = None
+    sugar_g: float | None = None
+    glycemic_index: float | None = None
+
+    tags: str | None = None
+    photo_url: str | None = None
+
+
 class MealRead(MealBase):
     id: int
     timestamp: datetime
@@ -79,11 +100,27 @@ class MealAnalysis(BaseModel):
     glycemic_index: float | None = None
     glycemic_load: float | None = None
     impact_category: str
+    shared: bool = False  # True for shared catalog meals
 
     class Config:
         from_attributes = True
 
 
+class SimilarMeal(BaseModel):
+    meal_id: int
+    name: str
+    glycemic_load: float
+    impact_category: str
+    distance: float  # in daily-value-scaled nutrient space; lower = more alike
+    shared: bool = False  # True for shared catalog meals
+
+
+class SimilarMealsResponse(BaseModel):
+    meal_id: int
+    glycemic_load: float
+    suggestions: list[SimilarMeal]
+
+
 class MealSuggestion(BaseModel):
     meal_id: int
     name: str
@@ -91,6 +128,7 @@ class MealSuggestion(BaseModel):
     impact_category: str
     carbs_g: float | None = None
     glycemic_index: float | None = None
+    shared: bool = False  # True for shared catalog meals
 
     class Config:
         from_attributes = True
@@ -122,6 +160,28 @@ class ExternalFoodSearchResponse(BaseModel):
     items: List[ExternalFoodItem]
 
 
+class MealFromFoodIngredient(BaseModel):
+    fdc_id: int
+    servings: float = Field(1.0, gt=0)
+    # Overrides servings: exact amount in grams. Otherwise one serving is
+    # the label serving size for branded foods, or 100 g.
+    grams: float | None = Field(None, gt=0)
+
+
+class MealFromFoodRequest(BaseModel):
+    """
+    Build meals from USDA foods.
+    combine=True  -> one meal with summed nutrients of all ingredients
+    combine=False -> one meal per ingredient
+    """
+    ingredients: List[MealFromFoodIngredient] = Field(..., min_length=1, max_length=100)
+    combine: bool = True
+    name: str | None = None  # defaults to the ingredient descriptions
+    description: str | None = None
+    glycemic_index: float | None = None
+    tags: str | None = None
+
+
 class BGReadingBase(BaseModel):
     value: float
     context: str | None = None
@@ -139,6 +199,39 @@ class BGReadingRead(BGReadingBase):
         from_attributes = True
 
 
+class BGAlertRead(BaseModel):
+    id: int
+    reading_id: int | None = None
+    kind: str
+    value: float
+    rate_mg_dl_per_min: float | None = None
+    predicted_value: float | None = None
+    message: str
+    timestamp: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ImportJobRead(BaseModel):
+    id: int
+    filename: str | None = None
+    source_format: str | None = None
+    status: str
+    error: str | None = None
+    bytes_total: int = 0
+    bytes_processed: int = 0
+    rows_read: int = 0
+    rows_inserted: int = 0
+    rows_duplicate: int = 0
+    rows_invalid: int = 0
+    created_at: datetime
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+
 class BGStatsToday(BaseModel):
     average: float | None = None
     minimum: float | None = None
@@ -163,6 +256,26 @@ class BGVariabilityStats(BaseModel):
     count: int = 0
 
 
+class BGSeriesPoint(BaseModel):
+    """A raw reading (count=1, no percentiles) or an hour/day bucket."""
+    resolution: str
+    bucket_start: datetime
+    count: int
+    mean: float
+    minimum: float
+    maximum: float
+    p10: float | None = None
+    p50: float | None = None
+    p90: float | None = None
+
+
+class BGSeriesResponse(BaseModel):
+    resolution: str
+    start: datetime
+    end: datetime
+    points: list[BGSeriesPoint]
+
+
 class MealLogBase(BaseModel):
     meal_id: int
     bg_before: float | None = None
@@ -195,3 +308,105 @@ class MealRecommendation(BaseModel):
     category: str
     tags: str | None = None
     reason: str
+
+
+# ---------- Delta sync ----------
+
+class SyncDeleted(BaseModel):
+    meals: list[int] = []
+    meal_logs: list[int] = []
+    bg_readings: list[int] = []
+
+
+class SyncResponse(BaseModel):
+    """
+    Rows created or updated since the request cursor (current state
+    only), plus ids deleted since then. Pass `cursor` back as `since`;
+    if `has_more`, call again straight away.
+    """
+    cursor: int
+    has_more: bool = False
+    full: bool = False  # True for an initial (since=0) snapshot
+    meals: list[MealRead] = []
+    meal_logs: list[MealLogRead] = []
+    bg_readings: list[BGReadingRead] = []
+    deleted: SyncDeleted = SyncDeleted()
+
+
+class SyncMealLogCreate(MealLogCreate):
+    # Offline clients send when the meal was actually eaten.
+    timestamp: datetime | None = None
+
+
+class SyncMealLogPatch(BaseModel):
+    bg_before: float | None = None
+    bg_after: float | None = None
+
+
+class SyncBGReadingCreate(BGReadingCreate):
+    timestamp: datetime | None = None
+
+
+class SyncBGReadingPatch(BaseModel):
+    value: float | None = None
+    context: str | None = None
+
+
+class SyncOperation(BaseModel):
+    """
+    One client-queued write. `op_id` is generated by the client and
+    makes retries safe: an op_id that was already applied is reported
+    as a duplicate instead of being applied again.
+    """
+    op_id: str = Field(..., min_length=1, max_length=64)
+    entity: Literal["meal", "meal_log", "bg_reading"]
+    op: Literal["create", "update", "delete"]
+    id: int | None = None  # server id, for update / delete
+    data: dict[str, Any] = {}
+
+
+class SyncUploadRequest(BaseModel):
+    operations: list[SyncOperation] = Field(..., max_length=500)
+
+
+class SyncOperationResult(BaseModel):
+    op_id: str
+    status: Literal["applied", "duplicate", "error"]
+    entity: str
+    id: int | None = None
+    detail: str | None = None
+
+
+class SyncUploadResponse(BaseModel):
+    results: list[SyncOperationResult]
+    cursor: int
+
+
+class CohortTIRBin(BaseModel):
+    lower_pct: int
+    upper_pct: int
+    users: int
+
+
+class CohortMealImpact(BaseModel):
+    name: str  # normalized (lower-cased) meal name
+    users: int
+    logs: int
+    mean_bg_rise: float  # mg/dL, bg_after - bg_before
+    mean_glycemic_load: float | None = None
+
+
+class CohortReport(BaseModel):
+    since: datetime
+    until: datetime
+    users: int
+    users_with_data: int
+    readings: int
+    mean_bg: float | None = None
+    std_dev: float | None = None
+    time_below_range_pct: float | None = None
+    time_in_range_pct: float | None = None
+    time_above_range_pct: float | None = None
+    tir_distribution: list[CohortTIRBin]
+    top_meals: list[CohortMealImpact]
+    seconds: float
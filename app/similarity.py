@@ -0,0 +1,134 @@
+# app/similarity.py
+"""
+Nutrient-vector k-NN over meals, used for "meals like this but with a
+lower glycemic load" suggestions.
+
+Each user's meals are kept as one float32 matrix (rows = meals,
+columns = calories, carbs, protein, fat, fiber, sugar scaled by daily
+reference values so no single nutrient dominates). A query is one
+vectorized distance computation over the matrix, so even a 100k-row
+catalog answers in a few milliseconds.
+
+Matrices are cached per user and rebuilt when the user's meal-set
+version (app/meal_versions.py) changes.
+"""
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import meal_versions, models
+from .config import settings
+
+FEATURES = ("calories_kcal", "carbs_g", "protein_g", "fat_g", "fiber_g", "sugar_g")
+
+# FDA daily reference values, used only to put the features on a common scale.
+_SCALE = np.array([2000.0, 275.0, 50.0, 78.0, 28.0, 50.0], dtype=np.float32)
+
+
+class MealMatrix:
+    __slots__ = ("version", "ids", "names", "vectors", "glycemic_load")
+
+    def __init__(self, version: int, ids, names, vectors, glycemic_load):
+        self.version = version
+        self.ids = ids                      # int64[n]
+        self.names = names                  # list[str]
+        self.vectors = vectors              # float32[n, 6], scaled
+        self.glycemic_load = glycemic_load  # float64[n], NaN when unknown
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def meal_vector(values) -> np.ndarray:
+    """Scaled feature vector for one meal's (calories, carbs, ...) values."""
+    return np.array([v or 0.0 for v in values], dtype=np.float32) / _SCALE
+
+
+def scale_features(raw: np.ndarray) -> np.ndarray:
+    """(n, 6) raw nutrient values (NaN = missing) -> scaled float32 vectors."""
+    return (np.nan_to_num(raw) / _SCALE).astype(np.float32)
+
+
+def build_matrix(db: Session, user_id: int | None, version: int) -> MealMatrix:
+    Meal = models.Meal
+    owner = Meal.user_id.is_(None) if user_id is None else Meal.user_id == user_id
+    rows = db.execute(
+        select(Meal.id, Meal.name, Meal.glycemic_index, *(getattr(Meal, f) for f in FEATURES)).where(owner)
+    ).all()
+
+    if not rows:
+        return MealMatrix(
+            version,
+            np.empty(0, dtype=np.int64),
+            [],
+            np.empty((0, len(FEATURES)), dtype=np.float32),
+            np.empty(0),
+        )
+
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    names = [r[1] for r in rows]
+    gi = np.array([r[2] for r in rows], dtype=np.float64)  # None -> nan
+    raw = np.array([r[3:] for r in rows], dtype=np.float64)
+    carbs = raw[:, FEATURES.index("carbs_g")]
+    vectors = scale_features(raw)
+
+    return MealMatrix(version, ids, names, vectors, carbs * gi / 100.0)
+
+
+class MatrixCache:
+    """LRU of per-owner meal matrices (owner None = shared catalog)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int | None, MealMatrix] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, db: Session, user_id: int | None) -> MealMatrix:
+        version = meal_versions.current(user_id)
+        with self._lock:
+            matrix = self._entries.get(user_id)
+            if matrix is not None and matrix.version == version:
+                self._entries.move_to_end(user_id)
+                return matrix
+
+        matrix = build_matrix(db, user_id, version)
+        with self._lock:
+            self._entries[user_id] = matrix
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return matrix
+
+
+def nearest_lower_gl(
+    matrix: MealMatrix,
+    query: np.ndarray,
+    max_gl: float,
+    k: int,
+    exclude_id: int | None = None,
+) -> list[tuple[int, float]]:
+    """
+    (row index, distance) of the k meals closest to `query` whose
+    glycemic load is known and below `max_gl`, nearest first.
+    """
+    if not len(matrix):
+        return []
+
+    dist = np.sqrt(((matrix.vectors - query) ** 2).sum(axis=1))
+    eligible = matrix.glycemic_load < max_gl  # NaN compares False
+    if exclude_id is not None:
+        eligible &= matrix.ids != exclude_id
+    dist = np.where(eligible, dist, np.inf)
+
+    k = min(k, int(eligible.sum()))
+    if k <= 0:
+        return []
+    top = np.argpartition(dist, k - 1)[:k]
+    top = top[np.argsort(dist[top], kind="stable")]
+    return [(int(i), float(dist[i])) for i in top]
+
+
+matrix_cache = MatrixCache(max_entries=settings.meal_matrix_cache_users)
@@ -0,0 +1,165 @@
+# app/sync.py
+"""
+Delta sync: a per-user change log so offline-capable clients can fetch
+only what changed since their last sync.
+
+Every write path calls `record_changes()` in the same transaction as
+the write. Each `sync_changes` row is (user, entity, id, deleted, seq),
+and `seq` is the sync cursor. It comes from the user's `sync_sequences`
+row, bumped with an upsert that row-locks it until the transaction ends,
+so one user's writers take sequence numbers one at a time and commit
+in seq order. The autoincrement id can't be the cursor: on Postgres
+ids are handed out before commit, so a pull could see id 11 while
+id 10 is still in flight, and then skip it for good. A pull reads the
+user's changes after the cursor in seq order.
+It keeps the last change per row and loads the current state of the
+upserted rows in one IN query per entity, so a row edited ten times
+since the last sync is sent once.
+
+An initial sync (since=0) is a snapshot instead: the user's meals and
+meal logs, plus the last `sync_initial_bg_days` of readings. The cursor
+it returns is read before the snapshot, so a write racing with it is
+re-sent on the next pull rather than lost.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import models, schemas, timeseries
+from .config import settings
+
+MEAL = "meal"
+MEAL_LOG = "meal_log"
+BG_READING = "bg_reading"
+
+_ENTITY_MODELS = {
+    MEAL: models.Meal,
+    MEAL_LOG: models.MealLog,
+    BG_READING: models.BloodGlucoseReading,
+}
+
+
+def record_changes(
+    db: Session,
+    user_id: int,
+    entity: str,
+    ids: Iterable[int],
+    deleted: bool = False,
+) -> None:
+    """
+    Append change-log rows for written rows. Caller commits; the user's
+    sequence row stays locked until then.
+    """
+    ids = [int(i) for i in ids]
+    if not ids:
+        return
+    last = _allocate(db, user_id, len(ids))
+    first = last - len(ids) + 1
+    db.execute(insert(models.SyncChange), [
+        {"user_id": user_id, "entity": entity, "entity_id": entity_id, "deleted": deleted, "seq": first + n}
+        for n, entity_id in enumerate(ids)
+    ])
+
+
+def _allocate(db: Session, user_id: int, count: int) -> int:
+    """Reserve `count` sequence numbers for the user. Returns the last one."""
+    Seq = models.SyncSequence
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(Seq).values(user_id=user_id, last_seq=count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Seq.user_id], set_={"last_seq": Seq.last_seq + count}
+    )
+    return db.scalar(stmt.returning(Seq.last_seq))
+
+
+def latest_cursor(db: Session, user_id: int) -> int:
+    """Last committed seq (or this transaction's own, after its writes)."""
+    return db.scalar(
+        select(models.SyncSequence.last_seq).where(models.SyncSequence.user_id == user_id)
+    ) or 0
+
+
+def _bg_readings_by_id(db: Session, user_id: int, ids: list[int]) -> list:
+    Reading = models.BloodGlucoseReading
+    rows = list(db.scalars(select(Reading).where(Reading.user_id == user_id, Reading.id.in_(ids))))
+    if settings.bg_chunk_store and len(rows) < len(ids):
+        # Readings compacted into day blocks since they changed.
+        found = {r.id for r in rows}
+        missing = np.array([i for i in ids if i not in found], dtype=np.int64)
+        arrays = timeseries.read_range(db, user_id)
+        keep = np.isin(arrays.ids, missing)
+        rows += [
+            schemas.BGReadingRead(**r)
+            for r in timeseries.ReadingArrays(
+                arrays.ids[keep], arrays.timestamps[keep], arrays.values[keep], arrays.contexts[keep]
+            ).to_dicts()
+        ]
+    return rows
+
+
+def snapshot(db: Session, user_id: int) -> schemas.SyncResponse:
+    cursor = latest_cursor(db, user_id)
+    since = datetime.utcnow() - timedelta(days=settings.sync_initial_bg_days)
+
+    Reading = models.BloodGlucoseReading
+    if settings.bg_chunk_store:
+        readings = timeseries.read_range(db, user_id, since).to_dicts()
+    else:
+        readings = db.scalars(
+            select(Reading)
+            .where(Reading.user_id == user_id, Reading.timestamp >= since)
+            .order_by(Reading.timestamp)
+        ).all()
+
+    return schemas.SyncResponse(
+        cursor=cursor,
+        full=True,
+        meals=db.scalars(select(models.Meal).where(models.Meal.user_id == user_id)).all(),
+        meal_logs=db.scalars(select(models.MealLog).where(models.MealLog.user_id == user_id)).all(),
+        bg_readings=readings,
+    )
+
+
+def changes_since(db: Session, user_id: int, since: int, limit: int) -> schemas.SyncResponse:
+    Change = models.SyncChange
+    changes = db.execute(
+        select(Change.seq, Change.entity, Change.entity_id, Change.deleted)
+        .where(Change.user_id == user_id, Change.seq > since)
+        .order_by(Change.seq)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    # Last change per row wins (dict keeps the latest assignment).
+    latest: dict[tuple[str, int], bool] = {
+        (c.entity, c.entity_id): c.deleted for c in changes
+    }
+    upserts: dict[str, list[int]] = {MEAL: [], MEAL_LOG: [], BG_READING: []}
+    deletes: dict[str, list[int]] = {MEAL: [], MEAL_LOG: [], BG_READING: []}
+    for (entity, entity_id), deleted in latest.items():
+        (deletes if deleted else upserts)[entity].append(entity_id)
+
+    def load(entity: str) -> list:
+        ids = upserts[entity]
+        if not ids:
+            return []
+        if entity == BG_READING:
+            return _bg_readings_by_id(db, user_id, ids)
+        model = _ENTITY_MODELS[entity]
+        return list(db.scalars(select(model).where(model.user_id == user_id, model.id.in_(ids))))
+
+    return schemas.SyncResponse(
+        cursor=changes[-1].seq if changes else since,
+        has_more=has_more,
+        meals=load(MEAL),
+        meal_logs=load(MEAL_LOG),
+        bg_readings=load(BG_READING),
+        deleted=schemas.SyncDeleted(
+            meals=deletes[MEAL], meal_logs=deletes[MEAL_LOG], bg_readings=deletes[BG_READING]
+        ),
+    )
@@ -0,0 +1,316 @@
+# app/timeseries.py
+"""
+Optional columnar chunk store for BG readings.
+
+With `bg_chunk_store` enabled, readings older than
+`bg_chunk_store_min_age_days` are compacted out of `bg_readings` into
+one `bg_reading_blocks` row per user per day. A block stores the day's
+readings as arrays:
+
+- ids and timestamps as int64 deltas (microseconds for timestamps)
+- values as float32 mg/dL
+- contexts as uint8 codes into a small per-block vocabulary
+
+The arrays are concatenated and zlib-compressed. Regular 5-minute CGM
+data has near-constant timestamp deltas, so a day of 288 readings
+compresses to a couple of KB instead of 288 ORM rows.
+
+New readings are still written to `bg_readings` (cheap insert, ids
+from the table); reads go through `read_range`, which merges blocks
+and live rows into NumPy arrays without building ORM objects.
+
+Run `python -m app.timeseries compact` (e.g. from cron) to compact.
+"""
+import json
+import struct
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+_MAGIC = b"BGC1"
+_HEADER = struct.Struct("<4sII")  # magic, reading count, vocab json length
+
+
+@dataclass
+class ReadingArrays:
+    ids: np.ndarray         # int64
+    timestamps: np.ndarray  # datetime64[us]
+    values: np.ndarray      # float64, mg/dL
+    contexts: np.ndarray    # object (str | None)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def empty(cls) -> "ReadingArrays":
+        return cls(
+            ids=np.empty(0, dtype=np.int64),
+            timestamps=np.empty(0, dtype="datetime64[us]"),
+            values=np.empty(0, dtype=np.float64),
+            contexts=np.empty(0, dtype=object),
+        )
+
+    def to_dicts(self) -> list[dict]:
+        """Rows shaped like `schemas.BGReadingRead`."""
+        return [
+            {"id": i, "timestamp": ts, "value": v, "context": c}
+            for i, ts, v, c in zip(
+                self.ids.tolist(),
+                self.timestamps.tolist(),
+                self.values.tolist(),
+                self.contexts.tolist(),
+            )
+        ]
+
+
+def _concat(parts: list[ReadingArrays]) -> ReadingArrays:
+    if not parts:
+        return ReadingArrays.empty()
+    merged = ReadingArrays(
+        ids=np.concatenate([p.ids for p in parts]),
+        timestamps=np.concatenate([p.timestamps for p in parts]),
+        values=np.concatenate([p.values for p in parts]),
+        contexts=np.concatenate([p.contexts for p in parts]),
+    )
+    order = np.argsort(merged.timestamps, kind="stable")
+    return ReadingArrays(
+        ids=merged.ids[order],
+        timestamps=merged.timestamps[order],
+        values=merged.values[order],
+        contexts=merged.contexts[order],
+    )
+
+
+def encode_block(block: ReadingArrays) -> bytes:
+    """Serialize one (already time-sorted) day of readings."""
+    n = len(block)
+    ids = block.ids.astype(np.int64)
+    ts = block.timestamps.astype("datetime64[us]").astype(np.int64)
+
+    vocab: list[str] = []
+    codes = np.zeros(n, dtype=np.uint8)
+    for i, ctx in enumerate(block.contexts.tolist()):
+        if ctx is None:
+            continue
+        if ctx not in vocab:
+            if len(vocab) == 255:
+                raise ValueError("Too many distinct contexts in one block")
+            vocab.append(ctx)
+        codes[i] = vocab.index(ctx) + 1
+
+    vocab_json = json.dumps(vocab).encode("utf-8")
+    raw = b"".join([
+        np.diff(ids, prepend=0).astype("<i8").tobytes(),
+        np.diff(ts, prepend=0).astype("<i8").tobytes(),
+        block.values.astype("<f4").tobytes(),
+        codes.tobytes(),
+        vocab_json,
+    ])
+    return _HEADER.pack(_MAGIC, n, len(vocab_json)) + zlib.compress(raw, 6)
+
+
+def decode_block(payload: bytes) -> ReadingArrays:
+    magic, n, vocab_len = _HEADER.unpack_from(payload)
+    if magic != _MAGIC:
+        raise ValueError("Not a BG reading block")
+    raw = zlib.decompress(payload[_HEADER.size:])
+
+    offset = 0
+    ids = np.cumsum(np.frombuffer(raw, dtype="<i8", count=n, offset=offset))
+    offset += 8 * n
+    ts = np.cumsum(np.frombuffer(raw, dtype="<i8", count=n, offset=offset))
+    offset += 8 * n
+    values = np.frombuffer(raw, dtype="<f4", count=n, offset=offset).astype(np.float64)
+    offset += 4 * n
+    codes = np.frombuffer(raw, dtype=np.uint8, count=n, offset=offset)
+    offset += n
+    vocab = json.loads(raw[offset:offset + vocab_len].decode("utf-8"))
+
+    lookup = np.array([None] + vocab, dtype=object)
+    return ReadingArrays(
+        ids=ids.astype(np.int64),
+        timestamps=ts.astype("datetime64[us]"),
+        values=values,
+        contexts=lookup[codes],
+    )
+
+
+def _rows_to_arrays(rows) -> ReadingArrays:
+    if not rows:
+        return ReadingArrays.empty()
+    ids, timestamps, values, contexts = zip(*rows)
+    return ReadingArrays(
+        ids=np.array(ids, dtype=np.int64),
+        timestamps=np.array(timestamps, dtype="datetime64[us]"),
+        values=np.array(values, dtype=np.float64),
+        contexts=np.array(contexts, dtype=object),
+    )
+
+
+def read_range(
+    db: Session,
+    user_id: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> ReadingArrays:
+    """
+    All of a user's readings with start <= timestamp < end, sorted by
+    timestamp, from both compacted blocks and the live row table.
+    """
+    Reading = models.BloodGlucoseReading
+    Block = models.BGReadingBlock
+
+    row_query = select(Reading.id, Reading.timestamp, Reading.value, Reading.context).where(
+        Reading.user_id == user_id
+    )
+    block_query = select(Block.payload).where(Block.user_id == user_id)
+    if start is not None:
+        row_query = row_query.where(Reading.timestamp >= start)
+        block_query = block_query.where(Block.day >= start.date())
+    if end is not None:
+        row_query = row_query.where(Reading.timestamp < end)
+        block_query = block_query.where(Block.day <= end.date())
+
+    parts = [decode_block(payload) for payload in db.scalars(block_query)]
+    parts.append(_rows_to_arrays(db.execute(row_query).all()))
+    merged = _concat(parts)
+
+    if (start is not None or end is not None) and len(merged):
+        mask = np.ones(len(merged), dtype=bool)
+        if start is not None:
+            mask &= merged.timestamps >= np.datetime64(start, "us")
+        if end is not None:
+            mask &= merged.timestamps < np.datetime64(end, "us")
+        merged = ReadingArrays(
+            ids=merged.ids[mask],
+            timestamps=merged.timestamps[mask],
+            values=merged.values[mask],
+            contexts=merged.contexts[mask],
+        )
+    return merged
+
+
+def latest_value(db: Session, user_id: int) -> float | None:
+    """Latest reading value, looking in compacted blocks if no live rows remain."""
+    Reading = models.BloodGlucoseReading
+    value = db.scalar(
+        select(Reading.value)
+        .where(Reading.user_id == user_id)
+        .order_by(Reading.timestamp.desc())
+        .limit(1)
+    )
+    if value is not None:
+        return float(value)
+
+    payload = db.scalar(
+        select(models.BGReadingBlock.payload)
+        .where(models.BGReadingBlock.user_id == user_id)
+        .order_by(models.BGReadingBlock.day.desc())
+        .limit(1)
+    )
+    if payload is None:
+        return None
+    block = decode_block(payload)
+    return float(block.values[-1]) if len(block) else None
+
+
+def compact_user(db: Session, user_id: int, before: date) -> int:
+    """
+    Move the user's live readings from days before `before` into day
+    blocks (merging with existing blocks). Returns readings moved.
+    Caller commits.
+    """
+    Reading = models.BloodGlucoseReading
+    Block = models.BGReadingBlock
+    cutoff = datetime.combine(before, time.min)
+
+    query = select(Reading.id, Reading.timestamp, Reading.value, Reading.context).where(
+        Reading.user_id == user_id,
+        Reading.timestamp < cutoff,
+    )
+    # SQLite reuses the highest rowid once it is deleted; keep that row
+    # live so a compacted id can never be handed out again.
+    max_id = db.scalar(select(func.max(Reading.id)))
+    if max_id is not None:
+        query = query.where(Reading.id != max_id)
+
+    rows = _rows_to_arrays(db.execute(query.order_by(Reading.timestamp)).all())
+    if not len(rows):
+        return 0
+
+    days = rows.timestamps.astype("datetime64[D]")
+    for day in np.unique(days):
+        mask = days == day
+        day_rows = ReadingArrays(
+            ids=rows.ids[mask],
+            timestamps=rows.timestamps[mask],
+            values=rows.values[mask],
+            contexts=rows.contexts[mask],
+        )
+        day_date = day.astype(date)
+
+        block = db.execute(
+            select(Block).where(Block.user_id == user_id, Block.day == day_date)
+        ).scalar_one_or_none()
+        if block is None:
+            block = Block(user_id=user_id, day=day_date)
+            db.add(block)
+        else:
+            day_rows = _concat([decode_block(block.payload), day_rows])
+
+        block.count = len(day_rows)
+        block.payload = encode_block(day_rows)
+
+    moved_ids = rows.ids.tolist()
+    # bg_alerts.reading_id references the live row; alerts keep their
+    # history without it (as in retention).
+    db.execute(
+        update(models.BGAlert)
+        .where(models.BGAlert.reading_id.in_(moved_ids))
+        .values(reading_id=None)
+    )
+    db.query(Reading).filter(Reading.id.in_(moved_ids)).delete(
+        synchronize_session=False
+    )
+    return len(rows)
+
+
+def compact_all(db: Session, before: date | None = None) -> int:
+    if before is None:
+        before = date.today() - timedelta(days=settings.bg_chunk_store_min_age_days)
+    cutoff = datetime.combine(before, time.min)
+
+    user_ids = db.scalars(
+        select(models.BloodGlucoseReading.user_id)
+        .where(
+            models.BloodGlucoseReading.timestamp < cutoff,
+            models.BloodGlucoseReading.user_id.is_not(None),
+        )
+        .distinct()
+    ).all()
+
+    moved = 0
+    for user_id in user_ids:
+        moved += compact_user(db, user_id, before)
+        db.commit()
+    return moved
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .db import Base, SessionLocal, engine
+
+    if sys.argv[1:] != ["compact"]:
+        sys.exit("usage: python -m app.timeseries compact")
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as session:
+        print(f"Compacted {compact_all(session)} readings into day blocks.")
@@ -0,0 +1,183 @@
+# app/usda.py
+"""
+USDA FoodData Central helpers: nutrient mapping and a local cache of
+foods we've already seen, so turning foods into meals doesn't need a
+detail call per ingredient.
+
+Foods land in the `usda_foods` table from two places:
+- every /food-search/search-foods result page
+- one batched POST /v1/foods call for any ids not cached yet
+
+httpx is imported on the first upstream call rather than at startup;
+most workers never make one.
+"""
+from datetime import datetime
+from typing import Any, Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import metrics, models
+from .config import settings
+
+FDC_BASE_URL = settings.fdc_base_url
+
+# FDC nutrient id -> Meal column. For a column with several candidate
+# ids (e.g. energy), the first one present in the food wins.
+NUTRIENT_COLUMN_MAP: dict[str, tuple[int, ...]] = {
+    "calories_kcal": (1008, 2047, 2048),  # Energy; Atwater general / specific
+    "carbs_g": (1005, 1050),              # by difference; by summation
+    "protein_g": (1003,),
+    "fat_g": (1004, 1085),                # total lipid; total fat (NLEA)
+    "fiber_g": (1079,),
+    "sugar_g": (2000, 1063),              # total incl. NLEA; total
+}
+NUTRIENT_COLUMNS = tuple(NUTRIENT_COLUMN_MAP)
+
+# Legacy SR nutrient numbers used by the "abridged" detail format.
+_NUTRIENT_NUMBER_TO_ID = {
+    "208": 1008, "957": 2047, "958": 2048,
+    "205": 1005, "205.2": 1050,
+    "203": 1003,
+    "204": 1004, "298": 1085,
+    "291": 1079,
+    "269": 2000, "269.3": 1063,
+}
+
+
+class UpstreamError(Exception):
+    """A USDA FoodData Central call failed (HTTP error or bad status)."""
+
+
+# Precomputed reverse lookup: nutrient id -> (column, priority)
+_ID_TO_COLUMN: dict[int, tuple[str, int]] = {
+    nutrient_id: (column, priority)
+    for column, ids in NUTRIENT_COLUMN_MAP.items()
+    for priority, nutrient_id in enumerate(ids)
+}
+
+
+def _nutrient_id(n: dict[str, Any]) -> int | None:
+    # Search results: {"nutrientId": 1008, ...}
+    # Full detail:   {"nutrient": {"id": 1008, ...}, "amount": ...}
+    # Abridged:      {"number": "208", ...}
+    if n.get("nutrientId") is not None:
+        return int(n["nutrientId"])
+    nested = n.get("nutrient") or {}
+    if nested.get("id") is not None:
+        return int(nested["id"])
+    number = n.get("number") or n.get("nutrientNumber") or nested.get("number")
+    return _NUTRIENT_NUMBER_TO_ID.get(str(number)) if number is not None else None
+
+
+def extract_nutrients(food: dict[str, Any]) -> dict[str, float | None]:
+    """Map a FDC food's nutrient list (per 100 g) onto Meal columns."""
+    best: dict[str, tuple[int, float]] = {}
+    for n in food.get("foodNutrients", []):
+        nutrient_id = _nutrient_id(n)
+        if nutrient_id not in _ID_TO_COLUMN:
+            continue
+        unit = (n.get("unitName") or (n.get("nutrient") or {}).get("unitName") or "").lower()
+        if unit == "kj":
+            continue
+        amount = n.get("value", n.get("amount"))
+        if amount is None:
+            continue
+        column, priority = _ID_TO_COLUMN[nutrient_id]
+        if column not in best or priority < best[column][0]:
+            best[column] = (priority, float(amount))
+    return {column: best[column][1] if column in best else None for column in NUTRIENT_COLUMNS}
+
+
+def _serving_size_g(food: dict[str, Any]) -> float | None:
+    size = food.get("servingSize")
+    unit = (food.get("servingSizeUnit") or "").lower()
+    if size and unit in ("g", "grm", "ml", "mlt"):
+        return float(size)
+    return None
+
+
+def cache_foods(db: Session, foods: Iterable[dict[str, Any]]) -> list[models.UsdaFood]:
+    """
+    Upsert raw FDC food dicts into `usda_foods`. Caller commits.
+
+    One INSERT ... ON CONFLICT DO UPDATE, so concurrent searches
+    returning the same food don't race on the unique fdc_id.
+    """
+    by_id = {int(f["fdcId"]): f for f in foods if f.get("fdcId") is not None}
+    if not by_id:
+        return []
+
+    now = datetime.utcnow()
+    rows = []
+    # Sorted so concurrent upserts lock rows in the same order (Postgres).
+    for fdc_id in sorted(by_id):
+        food = by_id[fdc_id]
+        row = dict.fromkeys(NUTRIENT_COLUMNS)
+        row.update(extract_nutrients(food))
+        row.update(
+            fdc_id=fdc_id,
+            description=food.get("description", ""),
+            brand_owner=food.get("brandOwner"),
+            data_type=food.get("dataType"),
+            serving_size_g=_serving_size_g(food),
+            fetched_at=now,
+        )
+        rows.append(row)
+
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(models.UsdaFood).values(rows)
+    updates = {column: stmt.excluded[column] for column in rows[0] if column != "fdc_id"}
+    # A nutrient missing from this payload keeps the value we already had.
+    for column in NUTRIENT_COLUMNS:
+        updates[column] = func.coalesce(stmt.excluded[column], getattr(models.UsdaFood, column))
+    stmt = stmt.on_conflict_do_update(index_elements=[models.UsdaFood.fdc_id], set_=updates)
+    return list(
+        db.scalars(stmt.returning(models.UsdaFood), execution_options={"populate_existing": True})
+    )
+
+
+def fetch_foods(fdc_ids: list[int]) -> list[dict[str, Any]]:
+    """One batched FDC detail call (the API accepts up to 20 ids per call)."""
+    if not settings.fdc_api_key:
+        raise RuntimeError("USDA API key not configured")
+
+    import httpx
+
+    foods: list[dict[str, Any]] = []
+    try:
+        with httpx.Client(timeout=10.0) as client:
+            for i in range(0, len(fdc_ids), 20):
+                with metrics.usda_call("foods") as call:
+                    resp = client.post(
+                        f"{FDC_BASE_URL}/foods",
+                        params={"api_key": settings.fdc_api_key},
+                        json={"fdcIds": fdc_ids[i:i + 20], "format": "full"},
+                    )
+                    call.status = resp.status_code
+                resp.raise_for_status()
+                foods.extend(resp.json())
+    except httpx.HTTPError as exc:
+        raise UpstreamError(str(exc)) from exc
+    return foods
+
+
+def get_foods(db: Session, fdc_ids: Iterable[int]) -> dict[int, models.UsdaFood]:
+    """
+    Resolve foods from the local cache, fetching only the missing ids
+    from USDA in one batch. Caller commits.
+    """
+    wanted = set(fdc_ids)
+    found = {
+        row.fdc_id: row
+        for row in db.scalars(select(models.UsdaFood).where(models.UsdaFood.fdc_id.in_(wanted)))
+    }
+    missing = sorted(wanted - found.keys())
+    metrics.cache_result("foods", True, len(found))
+    metrics.cache_result("foods", False, len(missing))
+    if missing:
+        for row in cache_foods(db, fetch_foods(missing)):
+            found[row.fdc_id] = row
+    return found
+
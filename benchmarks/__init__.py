@@ -0,0 +1,17 @@
+# benchmarks/__init__.py
+"""
+Benchmark and load-test suite.
+
+- populate: synthetic users with CGM history, meals, logs and a catalog
+- micro: analysis / stats / recommendation functions called directly
+- load: concurrent end-to-end requests over ASGI against every router
+- payloads: bytes on the wire / CPU for list endpoints, fields and encodings
+- startup: import / lifespan / first-request time in fresh interpreters
+- usda_stub: local FoodData Central stand-in for the food routes
+- run: populate + micro + load + payloads + startup, results written as JSON
+- compare: diff two result files and flag regressions
+- partitions: plain vs partitioned bg_readings 7-day stats (Postgres)
+
+    python -m benchmarks.run --users 5 --days 365
+    python -m benchmarks.compare benchmarks/results/a.json benchmarks/results/b.json
+"""
@@ -0,0 +1,63 @@
+# benchmarks/compare.py
+"""
+Compare two benchmark result files (from benchmarks.run).
+
+    python -m benchmarks.compare old.json new.json [--threshold 10]
+
+Prints the p50 / p95 change per benchmark and exits with status 1 if
+any p50 got slower by more than the threshold (percent), or any load
+scenario started returning errors, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+
+def _pct(old: float, new: float) -> float:
+    return (new - old) / old * 100 if old else 0.0
+
+
+def compare(old: dict, new: dict, threshold: float) -> list[str]:
+    regressions = []
+    for section in ("micro", "load", "payloads", "startup"):
+        before, after = old.get(section, {}), new.get(section, {})
+        for name in sorted(before.keys() & after.keys()):
+            a, b = before[name], after[name]
+            p50 = _pct(a["p50_ms"], b["p50_ms"])
+            p95 = _pct(a["p95_ms"], b["p95_ms"])
+            flag = ""
+            if p50 > threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{section}.{name}: p50 {p50:+.1f}%")
+            if b.get("errors", 0) > a.get("errors", 0):
+                flag += "  ERRORS"
+                regressions.append(f"{section}.{name}: errors {a.get('errors', 0)} -> {b['errors']}")
+            print(
+                f"{section:5} {name:32} p50 {a['p50_ms']:9.3f} -> {b['p50_ms']:9.3f} ms ({p50:+6.1f}%)"
+                f"  p95 ({p95:+6.1f}%){flag}"
+            )
+        for name in sorted(after.keys() - before.keys()):
+            print(f"{section:5} {name:32} new")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed p50 slowdown, percent")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"{old.get('git_sha')} -> {new.get('git_sha')}")
+    regressions = compare(old, new, args.threshold)
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/load.py
+"""
+End-to-end load tests: concurrent requests over httpx's ASGI transport
+against every router, as the populated benchmark users.
+
+Each scenario runs `concurrency` workers until `requests` calls have
+been made, then reports throughput, latency percentiles and non-2xx
+counts. Rate limiting should be off (RATE_LIMIT_ENABLED=false) and the
+food routes pointed at benchmarks.usda_stub; run.py sets both up.
+"""
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import httpx
+
+from app.main import app
+
+from .micro import summarize
+from .populate import PASSWORD, email_for
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    body: object = None
+    requests: int = 200
+    first_user_only: bool = False  # for paths naming one user's rows
+
+
+def scenarios(meal_id: int | None, fdc_id: int) -> list[Scenario]:
+    now = datetime.utcnow().isoformat()
+    items = [
+        Scenario("health", "GET", "/health", requests=500),
+        Scenario("meals_list", "GET", "/meals/"),
+        Scenario("meals_catalog", "GET", "/meals/catalog?limit=50"),
+        Scenario("meals_analysis_all", "GET", "/meals/analysis/all"),
+        Scenario("meals_create", "POST", "/meals/", {"name": "load meal", "carbs_g": 40, "glycemic_index": 55}),
+        Scenario("meal_logs_list", "GET", "/meals/logs", requests=50),
+        Scenario("bg_readings_create", "POST", "/diabetes/bg-readings", {"value": 123, "timestamp": now}),
+        Scenario("bg_stats_today", "GET", "/diabetes/bg-stats/today"),
+        Scenario("bg_stats_7d", "GET", "/diabetes/bg-stats/7d"),
+        Scenario("bg_variability", "GET", "/diabetes/bg-stats/variability", requests=50),
+        Scenario("alerts", "GET", "/diabetes/alerts"),
+        Scenario("recommend_meals", "GET", "/diabetes/recommend-meals?include_catalog=true"),
+        Scenario("food_search", "GET", "/food-search/search-foods?q=oat"),
+        Scenario(
+            "meals_from_food",
+            "POST",
+            "/meals/from-food",
+            {"ingredients": [{"fdc_id": fdc_id, "grams": 150}], "name": "stub meal"},
+            requests=50,
+        ),
+        Scenario("export_meals", "GET", "/export/meals", requests=20),
+        Scenario("export_bg_readings", "GET", "/export/bg-readings?gzip=true", requests=5),
+    ]
+    if meal_id is not None:
+        items.append(Scenario("meal_analysis", "GET", f"/meals/{meal_id}/analysis", first_user_only=True))
+        items.append(Scenario(
+            "meal_similar", "GET", f"/meals/{meal_id}/similar?include_catalog=true", first_user_only=True
+        ))
+    return items
+
+
+async def _login(client: httpx.AsyncClient, users: int) -> list[dict]:
+    headers = []
+    for i in range(users):
+        resp = await client.post("/auth/login", data={"username": email_for(i), "password": PASSWORD})
+        resp.raise_for_status()
+        headers.append({"Authorization": f"Bearer {resp.json()['access_token']}"})
+    return headers
+
+
+async def _run_scenario(client, scenario: Scenario, auth: list[dict], concurrency: int) -> dict:
+    counter = itertools.count()
+    users = itertools.cycle(auth[:1] if scenario.first_user_only else auth)
+    samples: list[float] = []
+    statuses: dict[int, int] = {}
+
+    async def worker():
+        while next(counter) < scenario.requests:
+            start = time.perf_counter()
+            resp = await client.request(
+                scenario.method, scenario.path, json=scenario.body, headers=next(users)
+            )
+            samples.append(time.perf_counter() - start)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    result = summarize(samples)
+    result["rps"] = len(samples) / elapsed if elapsed else 0.0
+    result["errors"] = sum(n for status, n in statuses.items() if status >= 400)
+    result["statuses"] = {str(k): v for k, v in sorted(statuses.items())}
+    return result
+
+
+async def run_async(users: int, concurrency: int, scale: float = 1.0) -> dict[str, dict]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        auth = await _login(client, users)
+        meals = (await client.get("/meals/", headers=auth[0])).json()
+        meal_id = next((m["id"] for m in meals if m["glycemic_index"] is not None), None)
+        # Seed the stub foods into the local cache the way a search would.
+        search = (await client.get("/food-search/search-foods?q=oat", headers=auth[0])).json()
+        fdc_id = search["foods"][0]["fdc_id"]
+
+        results = {}
+        for scenario in scenarios(meal_id, fdc_id):
+            scenario.requests = max(1, int(scenario.requests * scale))
+            results[scenario.name] = await _run_scenario(client, scenario, auth, concurrency)
+        return results
+
+
+def run(users: int, concurrency: int = 8, scale: float = 1.0) -> dict[str, dict]:
+    return asyncio.run(run_async(users, concurrency, scale))
@@ -0,0 +1,122 @@
+# benchmarks/micro.py
+"""
+Micro-benchmarks of the analysis, stats and recommendation code paths,
+called directly (no HTTP) against a populated database.
+
+Route handlers are plain functions, so they are invoked with a session
+and the user object the dependencies would have produced; helpers are
+timed on synthetic inputs. Needs DATABASE_URL set before import.
+"""
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select
+
+from app import bg_import, models, routes_diabetes, routes_meals, routes_recommendations, timeseries
+from app.analysis_cache import analysis_cache
+from app.db import SessionLocal
+from app.recommendation_snapshots import recommendation_snapshots
+
+
+def summarize(samples: list[float]) -> dict:
+    """Latency summary in milliseconds."""
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "n": n,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[n // 2] * 1000,
+        "p95_ms": ordered[min(n - 1, int(n * 0.95))] * 1000,
+        "p99_ms": ordered[min(n - 1, int(n * 0.99))] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def bench(fn, setup=None, repeat: int = 50, budget_seconds: float = 5.0) -> dict:
+    """Time `fn` after one warm-up call; stops early once over budget."""
+    if setup:
+        setup()
+    fn()
+    samples: list[float] = []
+    deadline = time.perf_counter() + budget_seconds
+    while len(samples) < repeat and time.perf_counter() < deadline:
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def run(repeat: int = 50) -> dict[str, dict]:
+    results: dict[str, dict] = {}
+    db = SessionLocal()
+    try:
+        user = db.scalars(select(models.User).order_by(models.User.id)).first()
+        if user is None:
+            raise RuntimeError("No users found; populate the database first")
+        db.expunge(user)
+        meal_id = db.scalar(
+            select(models.Meal.id).where(
+                models.Meal.user_id == user.id, models.Meal.glycemic_index.is_not(None)
+            )
+        )
+        meals = db.execute(
+            select(models.Meal.id, models.Meal.name, models.Meal.carbs_g, models.Meal.glycemic_index)
+            .where(models.Meal.user_id == user.id)
+        ).all()
+
+        def timed(name, fn, setup=None):
+            results[name] = bench(fn, setup, repeat)
+
+        # Pure helpers
+        timed("meal_analysis_x_meals", lambda: [routes_meals._meal_analysis(m) for m in meals])
+        values = np.random.default_rng(0).uniform(40, 400, 1000).tolist()
+        timed("bg_category_x1000", lambda: [routes_recommendations._bg_category_and_explanation(v) for v in values])
+
+        day_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        day = timeseries.read_range(db, user.id, day_start, day_start + timedelta(days=1))
+        if len(day):
+            payload = timeseries.encode_block(day)
+            timed("timeseries_encode_day", lambda: timeseries.encode_block(day))
+            timed("timeseries_decode_day", lambda: timeseries.decode_block(payload))
+
+        layout = bg_import._Layout("dexcom", 0, [1], "mg/dL")
+        stamps = (np.datetime64("2024-01-01T00:00:00") + np.arange(5000) * np.timedelta64(5, "m")).astype(str).tolist()
+        timed("import_parse_timestamps_5000", lambda: bg_import._parse_timestamps(stamps, layout, timedelta(0)))
+
+        # Route handlers against the database
+        timed("bg_stats_today", lambda: routes_diabetes.get_bg_stats_today(db=db, current_user=user))
+        timed("bg_stats_7d", lambda: routes_diabetes.get_bg_stats_7_days(db=db, current_user=user))
+        timed("bg_variability", lambda: routes_diabetes.get_bg_variability(db=db, current_user=user))
+        timed(
+            "recommend_meals_cold",
+            lambda: routes_recommendations.recommend_meals(include_catalog=True, db=db, current_user=user),
+            setup=lambda: recommendation_snapshots.invalidate(user.id),
+        )
+        timed(
+            "recommend_meals",
+            lambda: routes_recommendations.recommend_meals(include_catalog=True, db=db, current_user=user),
+        )
+        timed(
+            "analysis_all_cold",
+            lambda: routes_meals.analyze_all_meals(include_catalog=False, db=db, current_user=user),
+            setup=lambda: analysis_cache.invalidate(user.id),
+        )
+        timed(
+            "analysis_all_warm",
+            lambda: routes_meals.analyze_all_meals(include_catalog=False, db=db, current_user=user),
+        )
+        if meal_id is not None:
+            timed(
+                "similar_meals",
+                lambda: routes_meals.similar_meals(
+                    meal_id=meal_id, k=5, include_catalog=True, db=db, current_user=user
+                ),
+            )
+    finally:
+        db.close()
+    return results
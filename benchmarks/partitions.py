@@ -0,0 +1,156 @@
+# benchmarks/partitions.py
+"""
+7-day stats latency on a plain vs a monthly-partitioned bg_readings
+(Postgres only).
+
+Builds both tables in a scratch schema, filling them server-side with
+generate_series: `--users` users with 5-minute readings for as many
+months as it takes to reach `--rows`. A 500M-row run (the default)
+needs roughly 80 GB of disk per table and a few hours to load; use
+`--rows` for a quick check. Then it times the query
+GET /diabetes/bg-stats/7d issues against each table, for random users,
+and records the partitions the plan touches.
+
+    python -m benchmarks.partitions --database-url postgresql://... --rows 500000000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+
+from .run import RESULTS_DIR, _git_sha
+
+SCHEMA = "bench_partitions"
+READINGS_PER_DAY = 288
+
+STATS_7D = """
+    SELECT date(timestamp) AS day, avg(value), count(id)
+    FROM {table}
+    WHERE user_id = %(user_id)s AND timestamp >= %(start)s AND timestamp < %(end)s
+    GROUP BY date(timestamp) ORDER BY date(timestamp)
+"""
+
+
+def _months(first: date, last: date):
+    month = first.replace(day=1)
+    while month <= last:
+        yield month
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def build(conn, users: int, rows: int) -> tuple[date, date]:
+    days = max(7, rows // (users * READINGS_PER_DAY))
+    end = date.today() + timedelta(days=1)
+    start = end - timedelta(days=days)
+
+    conn.exec_driver_sql(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    conn.exec_driver_sql(f"CREATE SCHEMA {SCHEMA}")
+    columns = (
+        "id bigint NOT NULL, user_id integer NOT NULL, value double precision NOT NULL, "
+        "timestamp timestamp NOT NULL, context varchar"
+    )
+    conn.exec_driver_sql(f"CREATE TABLE {SCHEMA}.plain ({columns}, PRIMARY KEY (id))")
+    conn.exec_driver_sql(
+        f"CREATE TABLE {SCHEMA}.part ({columns}, PRIMARY KEY (id, timestamp)) PARTITION BY RANGE (timestamp)"
+    )
+    for month in _months(start, end):
+        following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        conn.exec_driver_sql(
+            f"CREATE TABLE {SCHEMA}.part_{month:%Y_%m} PARTITION OF {SCHEMA}.part "
+            f"FOR VALUES FROM ('{month}') TO ('{following}')"
+        )
+
+    # One month per statement keeps each transaction bounded.
+    for month in _months(start, end):
+        following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        lo, hi = max(month, start), min(following, end)
+        for table in ("plain", "part"):
+            conn.exec_driver_sql(
+                f"""
+                INSERT INTO {SCHEMA}.{table} (id, user_id, value, timestamp)
+                SELECT row_number() OVER () + coalesce((SELECT max(id) FROM {SCHEMA}.{table}), 0),
+                       u, 80 + random() * 150, t
+                FROM generate_series(1, {users}) AS u,
+                     generate_series(%(lo)s::timestamp, %(hi)s::timestamp - interval '5 minutes',
+                                     interval '5 minutes') AS t
+                """,
+                {"lo": lo, "hi": hi},
+            )
+    for table in ("plain", "part"):
+        conn.exec_driver_sql(f"CREATE INDEX ON {SCHEMA}.{table} (user_id, timestamp)")
+        conn.exec_driver_sql(f"ANALYZE {SCHEMA}.{table}")
+    return start, end
+
+
+def time_query(conn, table: str, users: int, repeat: int) -> dict:
+    today = date.today()
+    start = datetime.combine(today - timedelta(days=6), datetime.min.time())
+    params = {"start": start, "end": start + timedelta(days=7)}
+    sql = STATS_7D.format(table=f"{SCHEMA}.{table}")
+
+    plan = conn.exec_driver_sql("EXPLAIN " + sql, {**params, "user_id": 1}).scalars().all()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        conn.exec_driver_sql(sql, {**params, "user_id": random.randint(1, users)}).all()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "partitions_scanned": sum(1 for line in plan if f"{table}_" in line and " on " in line),
+        "plan": plan,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plain vs partitioned bg_readings 7-day stats latency.")
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--rows", type=int, default=500_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema afterwards")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("This benchmark needs Postgres.")
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        t0 = time.perf_counter()
+        start, end = build(conn, args.users, args.rows)
+        load_seconds = time.perf_counter() - t0
+        total = conn.exec_driver_sql(f"SELECT count(*) FROM {SCHEMA}.plain").scalar()
+        print(f"loaded {total} rows per table ({start} .. {end}) in {load_seconds:.0f}s")
+
+        results = {}
+        for table in ("plain", "part"):
+            time_query(conn, table, args.users, 10)  # warm the cache
+            results[table] = time_query(conn, table, args.users, args.repeat)
+            r = results[table]
+            print(f"{table:6} p50 {r['p50_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  "
+                  f"partitions scanned {r['partitions_scanned']}")
+
+        if not args.keep:
+            conn.exec_driver_sql(f"DROP SCHEMA {SCHEMA} CASCADE")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out = RESULTS_DIR / f"{stamp}-{_git_sha() or 'nogit'}-partitions.json"
+    out.write_text(json.dumps({
+        "git_sha": _git_sha(),
+        "rows": total,
+        "users": args.users,
+        "load_seconds": load_seconds,
+        "stats_7d": results,
+    }, indent=2, default=str))
+    print(f"results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
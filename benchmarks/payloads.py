@@ -0,0 +1,60 @@
+# benchmarks/payloads.py
+"""
+Bytes on the wire and server CPU for the large list endpoints, full
+rows vs `?fields=` sparse fieldsets, uncompressed vs gzip (and brotli
+when installed).
+
+Requests go through TestClient in-process. Response bodies are read
+raw (not decoded), so `cpu_ms` is essentially the server's share:
+query, serialization and compression. Needs DATABASE_URL set before
+import and a populated database.
+"""
+import time
+
+from fastapi.testclient import TestClient
+
+from app.compression import brotli
+from app.main import app
+
+from .micro import summarize
+from .populate import PASSWORD, email_for
+
+ENDPOINTS = {
+    "meals": ("/meals/", "id,name,carbs_g,glycemic_index"),
+    "meal_logs": ("/meals/logs", "meal_id,timestamp"),
+    "bg_readings": ("/diabetes/bg-readings", "timestamp,value"),
+}
+
+
+def _measure(client: TestClient, path: str, params: dict, headers: dict, repeat: int) -> dict:
+    samples: list[float] = []
+    cpu = 0.0
+    size = 0
+    for _ in range(repeat):
+        wall, proc = time.perf_counter(), time.process_time()
+        with client.stream("GET", path, params=params, headers=headers) as resp:
+            resp.raise_for_status()
+            size = sum(len(chunk) for chunk in resp.iter_raw())
+        cpu += time.process_time() - proc
+        samples.append(time.perf_counter() - wall)
+    result = summarize(samples)
+    result["bytes"] = size
+    result["cpu_ms"] = cpu / repeat * 1000
+    return result
+
+
+def run(repeat: int = 10) -> dict[str, dict]:
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    results: dict[str, dict] = {}
+    with TestClient(app) as client:
+        resp = client.post("/auth/login", data={"username": email_for(0), "password": PASSWORD})
+        resp.raise_for_status()
+        auth = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+        for name, (path, fields) in ENDPOINTS.items():
+            for variant, params in (("full", {}), ("fields", {"fields": fields})):
+                for encoding in encodings:
+                    results[f"{name}_{variant}_{encoding}"] = _measure(
+                        client, path, params, {**auth, "Accept-Encoding": encoding}, repeat
+                    )
+    return results
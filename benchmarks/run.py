@@ -0,0 +1,137 @@
+# benchmarks/run.py
+"""
+Run the benchmark suite and write the results as JSON.
+
+    python -m benchmarks.run --database-url sqlite:///./bench.db --users 5 --days 365
+    python -m benchmarks.run --database-url postgresql://... --skip-populate --only load
+
+The database is populated first unless --skip-populate is given (use a
+fresh database: users are created with fixed emails). Results go to
+benchmarks/results/<utc timestamp>-<git sha>.json together with the
+population parameters and environment; compare two runs with
+`python -m benchmarks.compare`.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def _git_sha() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run micro-benchmarks and ASGI load tests.")
+    parser.add_argument("--database-url", default="sqlite:///./bench.db")
+    parser.add_argument("--skip-populate", action="store_true")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--meals", type=int, default=300)
+    parser.add_argument("--logs", type=int, default=3000)
+    parser.add_argument("--catalog", type=int, default=2000)
+    parser.add_argument("--only", choices=["micro", "load", "payloads", "startup"])
+    parser.add_argument("--repeat", type=int, default=50, help="micro-benchmark iterations")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on load request counts")
+    parser.add_argument("--out", type=Path)
+    args = parser.parse_args()
+
+    from .usda_stub import UsdaStub
+
+    stub = UsdaStub().start()
+    # Settings are read at import time, so configure before importing app.
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["FDC_BASE_URL"] = stub.base_url
+    os.environ.setdefault("FDC_API_KEY", "benchmark")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    from sqlalchemy import create_engine
+
+    from app.config import settings
+    from .populate import populate
+
+    report = {
+        "git_sha": _git_sha(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "database": create_engine(args.database_url).dialect.name,
+        "bg_chunk_store": settings.bg_chunk_store,
+        "cache_backend": settings.cache_backend,
+        "population": {
+            "users": args.users, "days": args.days, "meals": args.meals,
+            "logs": args.logs, "catalog": args.catalog,
+        },
+    }
+
+    try:
+        if not args.skip_populate:
+            start = time.perf_counter()
+            report["population"]["rows"] = populate(
+                create_engine(args.database_url),
+                args.users, args.days, args.meals, args.logs, args.catalog,
+            )
+            report["population"]["seconds"] = time.perf_counter() - start
+            print(f"populated in {report['population']['seconds']:.1f}s")
+
+        if args.only in (None, "micro"):
+            from . import micro
+
+            report["micro"] = micro.run(args.repeat)
+            for name, r in report["micro"].items():
+                print(f"micro {name:32} p50 {r['p50_ms']:9.3f} ms  p95 {r['p95_ms']:9.3f} ms")
+
+        if args.only in (None, "load"):
+            from . import load
+
+            report["load"] = load.run(args.users, args.concurrency, args.scale)
+            for name, r in report["load"].items():
+                print(
+                    f"load  {name:32} {r['rps']:8.1f} req/s  p50 {r['p50_ms']:8.2f} ms  "
+                    f"p99 {r['p99_ms']:8.2f} ms  errors {r['errors']}"
+                )
+
+        if args.only in (None, "payloads"):
+            from . import payloads
+
+            report["payloads"] = payloads.run()
+            for name, r in report["payloads"].items():
+                print(
+                    f"bytes {name:32} {r['bytes']:10d} B  cpu {r['cpu_ms']:8.2f} ms  p50 {r['p50_ms']:8.2f} ms"
+                )
+
+        if args.only in (None, "startup"):
+            from . import startup
+
+            report["startup"], report["startup_eager_modules"] = startup.run(args.database_url)
+            for name, r in report["startup"].items():
+                print(f"boot  {name:32} p50 {r['p50_ms']:9.1f} ms  p95 {r['p95_ms']:9.1f} ms")
+            if report["startup_eager_modules"]:
+                print(f"boot  loaded at import: {', '.join(report['startup_eager_modules'])}")
+    finally:
+        stub.stop()
+
+    out = args.out
+    if out is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        out = RESULTS_DIR / f"{stamp}-{report['git_sha'] or 'nogit'}.json"
+    out.write_text(json.dumps(report, indent=2))
+    print(f"results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
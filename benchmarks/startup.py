@@ -0,0 +1,119 @@
+# benchmarks/startup.py
+"""
+Cold start of one worker: importing app.main, the lifespan startup
+(schema check, background jobs, optional warm-up) and the first
+request. Every sample is a fresh interpreter, so nothing is cached
+in-process (the OS page cache is warm after the first run).
+
+    python -m benchmarks.startup --database-url sqlite:///./bench.db --budget-ms 1500
+    SCHEMA_ON_STARTUP=verify STARTUP_WARMUP=true python -m benchmarks.startup
+
+Also lists LAZY_MODULES that importing the app loaded although only
+some requests need them. Exits 1 when the p50 of `total` is over the
+budget or a lazy module was loaded eagerly, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from .micro import summarize
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Heavy imports deferred to first use (USDA calls, password hashing).
+LAZY_MODULES = ("httpx", "passlib")
+
+# Runs in the child. The first request is a bare ASGI call, so no HTTP
+# client gets imported into the measurement.
+_CHILD = """
+import asyncio, json, sys, time
+
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+eager = [m for m in {lazy!r} if m in sys.modules]
+
+
+async def boot():
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        sent = []
+
+        async def receive():
+            return {{"type": "http.request", "body": b"", "more_body": False}}
+
+        async def send(message):
+            sent.append(message)
+
+        await app(
+            {{
+                "type": "http", "asgi": {{"version": "3.0"}}, "http_version": "1.1",
+                "method": "GET", "scheme": "http", "path": "/health", "raw_path": b"/health",
+                "root_path": "", "query_string": b"", "headers": [],
+                "client": ("127.0.0.1", 1), "server": ("bench", 80),
+            }},
+            receive,
+            send,
+        )
+        assert sent[0]["status"] == 200, sent[0]
+        return started, time.perf_counter()
+
+
+started, answered = asyncio.run(boot())
+print(json.dumps({{
+    "import": imported - start,
+    "startup": started - imported,
+    "first_request": answered - started,
+    "total": answered - start,
+    "eager": eager,
+}}))
+"""
+
+
+def run(database_url: str, repeat: int = 10) -> tuple[dict[str, dict], list[str]]:
+    """Returns latency summaries per phase and the lazy modules loaded at import."""
+    env = {**os.environ, "DATABASE_URL": database_url}
+    script = _CHILD.format(lazy=LAZY_MODULES)
+    samples: dict[str, list[float]] = {}
+    eager: set[str] = set()
+    for _ in range(repeat):
+        wall = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        process = time.perf_counter() - wall
+        result = json.loads(out.strip().splitlines()[-1])
+        eager.update(result.pop("eager"))
+        result["process"] = process
+        for phase, seconds in result.items():
+            samples.setdefault(phase, []).append(seconds)
+    return {phase: summarize(values) for phase, values in samples.items()}, sorted(eager)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure app import and startup time.")
+    parser.add_argument("--database-url", default="sqlite:///./bench.db")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=2000.0, help="max p50 of import + startup + first request")
+    args = parser.parse_args()
+
+    results, eager = run(args.database_url, args.repeat)
+    for phase, r in results.items():
+        print(f"startup {phase:14} p50 {r['p50_ms']:9.1f} ms  p95 {r['p95_ms']:9.1f} ms")
+
+    failed = False
+    if results["total"]["p50_ms"] > args.budget_ms:
+        print(f"over budget: {results['total']['p50_ms']:.1f} ms > {args.budget_ms:.1f} ms")
+        failed = True
+    if eager:
+        print(f"loaded at import, should be lazy: {', '.join(eager)}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
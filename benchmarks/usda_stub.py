@@ -0,0 +1,86 @@
+# benchmarks/usda_stub.py
+"""
+Local stand-in for USDA FoodData Central, so the food routes can be
+load tested without network calls or API quota. Point the app at it
+with FDC_BASE_URL=http://127.0.0.1:<port>/fdc/v1.
+
+Serves GET /fdc/v1/foods/search and POST /fdc/v1/foods with
+deterministic foods derived from the query / ids.
+"""
+import json
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_food(fdc_id: int) -> dict:
+    carbs = 5 + fdc_id % 60
+    return {
+        "fdcId": fdc_id,
+        "description": f"Stub food {fdc_id}",
+        "brandOwner": None,
+        "dataType": "SR Legacy",
+        "servingSize": 100,
+        "servingSizeUnit": "g",
+        "foodNutrients": [
+            {"nutrientId": 1008, "nutrientName": "Energy", "unitName": "KCAL", "value": carbs * 4 + 50},
+            {"nutrientId": 1005, "nutrientName": "Carbohydrate, by difference", "unitName": "G", "value": carbs},
+            {"nutrientId": 1003, "nutrientName": "Protein", "unitName": "G", "value": fdc_id % 25},
+            {"nutrientId": 1004, "nutrientName": "Total lipid (fat)", "unitName": "G", "value": fdc_id % 15},
+            {"nutrientId": 1079, "nutrientName": "Fiber, total dietary", "unitName": "G", "value": fdc_id % 8},
+            {"nutrientId": 2000, "nutrientName": "Sugars, total", "unitName": "G", "value": carbs / 3},
+        ],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _reply(self, payload) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/fdc/v1/foods/search":
+            self.send_error(404)
+            return
+        params = parse_qs(url.query)
+        query = params.get("query", [""])[0]
+        page = int(params.get("pageNumber", ["1"])[0])
+        size = int(params.get("pageSize", ["10"])[0])
+        base = zlib.crc32(query.encode()) % 100_000 * 100 + (page - 1) * size
+        self._reply({"totalHits": 250, "foods": [fake_food(base + i) for i in range(size)]})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/fdc/v1/foods":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self._reply([fake_food(int(i)) for i in body.get("fdcIds", [])])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UsdaStub:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/fdc/v1"
+
+    def start(self) -> "UsdaStub":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
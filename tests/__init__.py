@@ -0,0 +1,9 @@
+# tests/__init__.py
+"""
+Test suite.
+
+    python -m pytest -q
+
+Runs against a throwaway SQLite database (see conftest.py), never the
+checked-in diabetic.db. Query budgets come from app/pytest_querycount.py.
+"""
@@ -0,0 +1,49 @@
+# tests/conftest.py
+"""
+Shared fixtures. Settings and the engine are created when `app` is
+first imported, so the environment is set up before any app import.
+"""
+import os
+import tempfile
+import uuid
+
+_TMP = tempfile.mkdtemp(prefix="diabetic-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/test.db"
+os.environ.pop("DATABASE_READ_URL", None)
+os.environ["CACHE_BACKEND"] = "local"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+import pytest
+from fastapi.testclient import TestClient
+
+pytest_plugins = ["app.pytest_querycount"]
+
+PASSWORD = "test-password"
+
+
+@pytest.fixture(scope="session")
+def tmp_dir() -> str:
+    return _TMP
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    # Entering the client runs the lifespan, which creates the schema.
+    with TestClient(app) as client:
+        yield client
+
+
+def make_user(client: TestClient) -> tuple[int, dict[str, str]]:
+    """A fresh user; returns (id, auth headers)."""
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    resp = client.post("/users", json={"email": email, "password": PASSWORD, "full_name": "Test"})
+    resp.raise_for_status()
+    token = client.post("/auth/login", data={"username": email, "password": PASSWORD}).json()["access_token"]
+    return resp.json()["id"], {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def user(client) -> tuple[int, dict[str, str]]:
+    return make_user(client)
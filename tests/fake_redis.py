@@ -0,0 +1,203 @@
+# tests/fake_redis.py
+"""
+Tiny in-memory Redis-protocol server for local development and tests
+of the "redis" cache backend, without installing Redis.
+
+Supports PING, GET, SET (EX/PX), DEL, INCR, EXPIRE, FLUSHDB, SELECT,
+AUTH (accepts anything), PUBLISH and SUBSCRIBE.
+
+    python -m tests.fake_redis --port 6379
+
+or in-process:
+
+    server = FakeRedisServer(("127.0.0.1", 0)); server.start()
+    url = f"redis://127.0.0.1:{server.port}/0"
+"""
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "FakeRedisServer"
+
+    def _read_command(self) -> list[bytes] | None:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()  # inline command, e.g. from telnet
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _write(self, data: bytes) -> None:
+        with self.write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    @staticmethod
+    def _bulk(value: bytes | None) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self) -> None:
+        self.write_lock = threading.Lock()
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                break
+            if args is None:
+                break
+            if not args:
+                continue
+            try:
+                self._write(self._dispatch(args[0].upper(), args[1:]))
+            except (ConnectionError, OSError):
+                break
+        self.server.unsubscribe(self)
+
+    def _dispatch(self, cmd: bytes, args: list[bytes]) -> bytes:
+        store = self.server
+        if cmd == b"PING":
+            return b"+PONG\r\n"
+        if cmd in (b"SELECT", b"AUTH"):
+            return b"+OK\r\n"
+        if cmd == b"GET":
+            return self._bulk(store.get(args[0]))
+        if cmd == b"SET":
+            ttl = None
+            opts = [a.upper() for a in args[2:]]
+            if b"PX" in opts:
+                ttl = int(args[2 + opts.index(b"PX") + 1]) / 1000.0
+            elif b"EX" in opts:
+                ttl = float(args[2 + opts.index(b"EX") + 1])
+            store.set(args[0], args[1], ttl)
+            return b"+OK\r\n"
+        if cmd == b"DEL":
+            return b":%d\r\n" % sum(store.delete(k) for k in args)
+        if cmd == b"INCR":
+            try:
+                return b":%d\r\n" % store.incr(args[0])
+            except ValueError:
+                return b"-ERR value is not an integer or out of range\r\n"
+        if cmd == b"EXPIRE":
+            return b":%d\r\n" % store.expire(args[0], float(args[1]))
+        if cmd == b"FLUSHDB":
+            store.flush()
+            return b"+OK\r\n"
+        if cmd == b"PUBLISH":
+            return b":%d\r\n" % store.publish(args[0], args[1])
+        if cmd == b"SUBSCRIBE":
+            replies = []
+            for i, channel in enumerate(args, start=1):
+                store.subscribe(channel, self)
+                replies.append(b"*3\r\n" + self._bulk(b"subscribe") + self._bulk(channel) + b":%d\r\n" % i)
+            return b"".join(replies)
+        return b"-ERR unknown command '%s'\r\n" % cmd
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=("127.0.0.1", 6379)):
+        super().__init__(address, _Handler)
+        self._data: dict[bytes, tuple[bytes, float | None]] = {}
+        self._subscribers: dict[bytes, set[_Handler]] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "FakeRedisServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    # -- storage -----------------------------------------------------------
+
+    def get(self, key: bytes) -> bytes | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[1] is not None and item[1] < time.monotonic():
+                del self._data[key]
+                return None
+            return item[0]
+
+    def set(self, key: bytes, value: bytes, ttl: float | None) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def delete(self, key: bytes) -> int:
+        with self._lock:
+            return 1 if self._data.pop(key, None) is not None else 0
+
+    def incr(self, key: bytes) -> int:
+        with self._lock:
+            value, expires = self._data.get(key, (b"0", None))
+            new = int(value) + 1
+            self._data[key] = (str(new).encode(), expires)
+            return new
+
+    def expire(self, key: bytes, seconds: float) -> int:
+        with self._lock:
+            if key not in self._data:
+                return 0
+            self._data[key] = (self._data[key][0], time.monotonic() + seconds)
+            return 1
+
+    def flush(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    # -- pub/sub -----------------------------------------------------------
+
+    def subscribe(self, channel: bytes, handler: _Handler) -> None:
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(handler)
+
+    def unsubscribe(self, handler: _Handler) -> None:
+        with self._lock:
+            for subs in self._subscribers.values():
+                subs.discard(handler)
+
+    def publish(self, channel: bytes, message: bytes) -> int:
+        with self._lock:
+            subs = list(self._subscribers.get(channel, ()))
+        frame = (
+            b"*3\r\n" + _Handler._bulk(b"message") + _Handler._bulk(channel) + _Handler._bulk(message)
+        )
+        delivered = 0
+        for handler in subs:
+            try:
+                handler._write(frame)
+                delivered += 1
+            except OSError:
+                self.unsubscribe(handler)
+        return delivered
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake Redis server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    opts = parser.parse_args()
+
+    server = FakeRedisServer((opts.host, opts.port))
+    print(f"Fake Redis listening on {opts.host}:{server.port}")
+    server.serve_forever()
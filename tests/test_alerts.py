@@ -0,0 +1,61 @@
+# tests/test_alerts.py
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import sync
+from app.alerts import WINDOW, TrendDetector, _UserTrend, detector
+
+
+def _kinds(client, headers) -> list[str]:
+    return [a["kind"] for a in client.get("/diabetes/alerts", headers=headers).json()]
+
+
+def test_failed_insert_leaves_no_phantom_reading(client, user, monkeypatch):
+    user_id, headers = user
+    client.post("/diabetes/bg-readings", json={"value": 110}, headers=headers).raise_for_status()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("write failed")
+
+    with monkeypatch.context() as m:
+        m.setattr(sync, "record_changes", fail)
+        with pytest.raises(RuntimeError):
+            client.post("/diabetes/bg-readings", json={"value": 55}, headers=headers)
+
+    # The rolled-back low reading must not have moved the zone already.
+    client.post("/diabetes/bg-readings", json={"value": 55}, headers=headers).raise_for_status()
+    assert "low" in _kinds(client, headers)
+
+
+def test_observe_is_serialized_per_user():
+    trends = TrendDetector(max_users=10)
+    trends._states[1] = _UserTrend()  # seeded, so observe() never touches the database
+    start = datetime(2024, 1, 1)
+    clock = itertools.count()
+
+    def post():
+        for _ in range(200):
+            trends.observe(None, 1, 120.0, start + timedelta(seconds=next(clock)))
+
+    threads = [threading.Thread(target=post) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    state = trends._states[1]
+    assert state.size == WINDOW
+    ring = [state.times[(state.head + k) % WINDOW] for k in range(WINDOW)]
+    assert ring == sorted(ring) and len(set(ring)) == WINDOW
+
+
+def test_forget_reseeds_from_database(client, user):
+    user_id, headers = user
+    client.post("/diabetes/bg-readings", json={"value": 250}, headers=headers).raise_for_status()
+    detector.forget(user_id)
+    # Reseeded as already high: staying high is not a new transition.
+    client.post("/diabetes/bg-readings", json={"value": 260}, headers=headers).raise_for_status()
+    assert _kinds(client, headers).count("high") == 1
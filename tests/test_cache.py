@@ -0,0 +1,165 @@
+# tests/test_cache.py
+import sqlite3
+import time
+
+import pytest
+
+from app import analysis_cache, meal_versions
+from app.cache import Cache, CacheBackend, CacheError, LocalBackend, RedisBackend, SQLiteBackend
+
+from .fake_redis import FakeRedisServer
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    server = FakeRedisServer(("127.0.0.1", 0)).start()
+    yield f"redis://127.0.0.1:{server.port}/0"
+    server.stop()
+
+
+@pytest.fixture(params=["local", "sqlite", "redis"])
+def backend(request, tmp_path, redis_url) -> CacheBackend:
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    if request.param == "redis":
+        return RedisBackend(redis_url)
+    return LocalBackend()
+
+
+def _eventually(check, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_get_set_delete(backend):
+    key = f"k:{time.monotonic_ns()}"
+    assert backend.get(key) is None
+    backend.set(key, b"v1")
+    assert backend.get(key) == b"v1"
+    backend.set(key, b"v2", ttl=0.05)
+    assert backend.get(key) == b"v2"
+    time.sleep(0.1)
+    assert backend.get(key) is None
+    backend.set(key, b"v3")
+    backend.delete(key)
+    assert backend.get(key) is None
+
+
+def test_incr(backend):
+    key = f"counter:{time.monotonic_ns()}"
+    assert [backend.incr(key) for _ in range(3)] == [1, 2, 3]
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "redis"])
+def test_invalidation_reaches_other_workers(kind, tmp_path, redis_url):
+    def make():
+        if kind == "sqlite":
+            return SQLiteBackend(str(tmp_path / "shared.sqlite3"))
+        return RedisBackend(redis_url)
+
+    a, b = Cache(make(), l1_ttl=60.0), Cache(make(), l1_ttl=60.0)
+    b.start_listener()
+    time.sleep(0.3)  # let the listener subscribe
+
+    a.set("user:1", {"role": "clinician"})
+    assert b.get("user:1") == {"role": "clinician"}  # now in b's L1
+    a.backend.set("user:1", b'{"role":"user"}')
+    assert b.get("user:1") == {"role": "clinician"}  # stale until invalidated
+
+    a.invalidate("user:1")
+    assert _eventually(lambda: b.get("user:1") is None)
+
+    a.set("meal-version:1", 0)
+    assert b.get("meal-version:1") == 0
+    assert a.incr("meal-version:1") == 1
+    assert _eventually(lambda: b.get("meal-version:1") == 1)
+
+
+def test_outage_degrades_instead_of_raising():
+    cache = Cache(RedisBackend("redis://127.0.0.1:1/0", timeout=0.5), l1_ttl=5.0)
+    assert cache.get("k") is None
+    cache.set("k", 1)
+    cache.invalidate("k")
+    assert cache.incr("meal-version:1") is None
+
+
+def _shared_cache(monkeypatch, backend: CacheBackend) -> Cache:
+    cache = Cache(backend, l1_ttl=5.0)
+    monkeypatch.setattr(meal_versions, "cache", cache)
+    monkeypatch.setattr(analysis_cache, "cache", cache)
+    return cache
+
+
+def test_similar_meals_follow_shared_versions(client, user, monkeypatch, redis_url):
+    _shared_cache(monkeypatch, RedisBackend(redis_url))
+    _, headers = user
+    pasta = client.post(
+        "/meals/", json={"name": "Pasta", "carbs_g": 80, "glycemic_index": 60, "protein_g": 12}, headers=headers
+    ).json()
+    first = client.get(f"/meals/{pasta['id']}/similar", headers=headers).json()
+    assert first["suggestions"] == []
+
+    lentils = client.post(
+        "/meals/", json={"name": "Lentils", "carbs_g": 40, "glycemic_index": 30, "protein_g": 18}, headers=headers
+    ).json()
+    second = client.get(f"/meals/{pasta['id']}/similar", headers=headers).json()
+    assert [s["meal_id"] for s in second["suggestions"]] == [lentils["id"]]
+
+
+def test_meal_writes_survive_cache_outage(client, user, monkeypatch):
+    _shared_cache(monkeypatch, RedisBackend("redis://127.0.0.1:1/0", timeout=0.5))
+    _, headers = user
+    resp = client.post("/meals/", json={"name": "Toast", "carbs_g": 30, "glycemic_index": 70}, headers=headers)
+    assert resp.status_code == 200
+    assert client.get("/meals/analysis/all", headers=headers).status_code == 200
+
+
+def _failing_conn(monkeypatch, backend: SQLiteBackend, failures: int) -> list[int]:
+    """Make the backend's next `failures` connections raise like a locked database."""
+    real = backend._conn
+    left = [failures]
+
+    def conn():
+        if left[0] > 0:
+            left[0] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return real()
+
+    monkeypatch.setattr(backend, "_conn", conn)
+    return left
+
+
+def test_sqlite_errors_degrade_instead_of_raising(tmp_path, monkeypatch):
+    backend = SQLiteBackend(str(tmp_path / "locked.sqlite3"))
+    cache = Cache(backend, l1_ttl=5.0)
+    _failing_conn(monkeypatch, backend, failures=10)
+    with pytest.raises(CacheError):
+        backend.get("k")
+    assert cache.get("user:1") is None
+    cache.set("user:1", {"role": "user"})
+    cache.invalidate("user:1")
+    assert cache.incr("meal-version:1") is None
+
+
+def test_sqlite_listener_survives_errors(tmp_path, monkeypatch):
+    path = str(tmp_path / "shared.sqlite3")
+    a, b = Cache(SQLiteBackend(path), l1_ttl=60.0), Cache(SQLiteBackend(path), l1_ttl=60.0)
+    left = _failing_conn(monkeypatch, b.backend, failures=2)
+    b.start_listener()
+    assert _eventually(lambda: left[0] == 0)  # both polls failed; the thread retried
+    time.sleep(1.5)  # back-off, then the listener reads its starting event id
+
+    a.set("user:1", {"role": "clinician"})
+    assert b.get("user:1") == {"role": "clinician"}
+    a.invalidate("user:1")
+    assert _eventually(lambda: b.get("user:1") is None)
+    assert b._listener.is_alive()
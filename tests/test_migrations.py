@@ -0,0 +1,51 @@
+# tests/test_migrations.py
+import shutil
+from pathlib import Path
+
+from sqlalchemy import create_engine, inspect, select
+
+from app import migrations, models
+from app.db import SessionLocal
+
+LEGACY_DB = Path(__file__).resolve().parent.parent / "diabetic.db"
+
+
+def test_upgrade_checked_in_legacy_db(tmp_path):
+    path = tmp_path / "legacy.db"
+    shutil.copy(LEGACY_DB, path)
+    engine = create_engine(f"sqlite:///{path}")
+
+    assert migrations.upgrade(engine) == [m.version for m in migrations.MIGRATIONS]
+    columns = {c["name"]: c for c in inspect(engine).get_columns("meals")}
+    assert "carbs" not in columns and "category" not in columns
+    assert columns["carbs_g"]["nullable"]
+    assert migrations.check(engine) == []
+
+    with SessionLocal(bind=engine) as db:
+        old = db.scalars(select(models.Meal).order_by(models.Meal.id)).all()
+        assert [(m.name, m.carbs_g) for m in old] == [("Grilled Chicken Salad", 5.0)] * 2
+        assert all(m.timestamp is not None for m in old)
+
+        meal = models.Meal(user_id=1, name="Toast", glycemic_index=70)
+        db.add(meal)
+        db.commit()
+        assert meal.id == 3
+
+        # Meal logs still point at the rebuilt table.
+        log = db.scalars(select(models.MealLog)).one()
+        assert db.get(models.Meal, log.meal_id) is not None
+
+
+def test_rebuild_after_column_only_upgrade(tmp_path):
+    # Databases upgraded by the old version 1 have both carbs and carbs_g.
+    path = tmp_path / "legacy.db"
+    shutil.copy(LEGACY_DB, path)
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.add_missing_columns(engine, "meals")
+
+    migrations._legacy_meals(engine)
+
+    columns = {c["name"] for c in inspect(engine).get_columns("meals")}
+    assert "carbs" not in columns and "carbs_g" in columns
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT carbs_g FROM meals").scalars().all() == [5.0, 5.0]
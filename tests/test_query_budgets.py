@@ -0,0 +1,81 @@
+# tests/test_query_budgets.py
+"""
+Per-endpoint SQL statement budgets (app/pytest_querycount.py).
+
+Each request runs with the user's cached auth row and the shared
+catalog dropped, so budgets include the user lookup and are the same
+whatever order the tests run in. The data set has enough rows per
+table that a per-row query (N+1) would blow any of them.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import models
+from app.cache import cache
+from app.catalog import catalog
+from app.db import SessionLocal
+
+from .conftest import make_user
+
+
+@pytest.fixture(scope="module")
+def seeded(client):
+    user_id, headers = make_user(client)
+    now = datetime.utcnow()
+    meals = client.post(
+        "/meals/batch",
+        json=[
+            {"name": f"Meal {i}", "carbs_g": 20 + i, "glycemic_index": 30 + 2 * i, "protein_g": 5 + i}
+            for i in range(20)
+        ],
+        headers=headers,
+    ).json()
+    with SessionLocal() as db:
+        db.add_all(
+            models.BloodGlucoseReading(user_id=user_id, value=60 + 7 * i, timestamp=now - timedelta(minutes=15 * i))
+            for i in range(40)
+        )
+        db.add_all(
+            models.MealLog(
+                user_id=user_id, meal_id=meal["id"], bg_before=110, bg_after=150, timestamp=now - timedelta(hours=i)
+            )
+            for i, meal in enumerate(meals)
+        )
+        db.commit()
+    for value in (55, 250):  # alerts
+        client.post("/diabetes/bg-readings", json={"value": value}, headers=headers)
+    return user_id, headers, meals[0]["id"]
+
+
+BUDGETS = [
+    ("/meals/", 2),
+    ("/meals/{meal_id}", 2),
+    ("/meals/{meal_id}/analysis", 2),
+    ("/meals/{meal_id}/similar", 3),
+    ("/meals/analysis/all", 2),
+    ("/meals/catalog", 2),
+    ("/meals/logs", 2),
+    ("/diabetes/meal-logs", 2),
+    ("/diabetes/bg-readings", 2),
+    ("/diabetes/bg-readings/series?start={start}", 4),
+    ("/diabetes/alerts", 2),
+    ("/diabetes/bg-stats/today", 2),
+    ("/diabetes/bg-stats/7d", 2),
+    ("/diabetes/bg-stats/variability", 2),
+    ("/diabetes/recommend-meals", 4),
+    ("/sync", 5),
+]
+
+
+@pytest.mark.parametrize("path,budget", BUDGETS, ids=[path for path, _ in BUDGETS])
+def test_get_route_query_budget(client, seeded, max_queries, path, budget):
+    user_id, headers, meal_id = seeded
+    start = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    url = path.format(meal_id=meal_id, start=start)
+    cache.invalidate(f"user:{user_id}")
+    catalog.invalidate()
+
+    with max_queries(budget):
+        resp = client.get(url, headers=headers)
+    assert resp.status_code == 200, resp.text
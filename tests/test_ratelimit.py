@@ -0,0 +1,58 @@
+# tests/test_ratelimit.py
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.ratelimit import RateLimitMiddleware
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_enabled", True)
+    monkeypatch.setattr(settings, "rate_limits", {"": (0.001, 3), "/diabetes/bg-readings": (0.001, 5)})
+    monkeypatch.setattr(
+        settings, "concurrency_limits", {"/diabetes/bg-stats": 8, "/diabetes/bg-readings/import": 2, "/export": 4}
+    )
+
+
+async def _ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _statuses(middleware, path: str, n: int, client: str = "10.0.0.1") -> list[int]:
+    async def run():
+        statuses = []
+        for _ in range(n):
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {"type": "http", "method": "GET", "path": path, "headers": [], "client": (client, 1)}
+            await middleware(scope, None, send)
+            statuses.append(sent[0]["status"])
+        return statuses
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("path", ["/diabetes/bg-stats/today", "/export/meals", "/meals/analysis/all"])
+def test_concurrency_only_groups_still_rate_limited(limits, path):
+    middleware = RateLimitMiddleware(_ok)
+    assert _statuses(middleware, path, 6) == [200] * 3 + [429] * 3
+
+
+def test_nested_prefix_falls_back_to_nearest_rate_group(limits):
+    middleware = RateLimitMiddleware(_ok)
+    assert _statuses(middleware, "/diabetes/bg-readings/import", 7) == [200] * 5 + [429] * 2
+    # Same bucket as its parent prefix, not a separate allowance.
+    assert _statuses(middleware, "/diabetes/bg-readings", 1) == [429]
+
+
+def test_concurrency_cap_applies_after_rate_limit(limits):
+    middleware = RateLimitMiddleware(_ok)
+    group = next(g for g in middleware.concurrency_groups if g.prefix == "/export")
+    group.active = group.max_concurrent
+    assert _statuses(middleware, "/export/meals", 1) == [503]
@@ -0,0 +1,28 @@
+# tests/test_read_replica.py
+import pytest
+from fastapi.testclient import TestClient
+
+from app import db
+from app.config import settings
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    monkeypatch.setattr(db, "read_engine", db.engine)
+
+
+def test_replica_needs_shared_cache(replica, monkeypatch):
+    monkeypatch.setattr(settings, "cache_backend", "local")
+    with pytest.raises(RuntimeError, match="shared cache"):
+        db.check_read_replica()
+
+    for backend in ("sqlite", "redis"):
+        monkeypatch.setattr(settings, "cache_backend", backend)
+        db.check_read_replica()
+
+
+def test_startup_refuses_local_cache_with_replica(client, replica, monkeypatch):
+    monkeypatch.setattr(settings, "cache_backend", "local")
+    with pytest.raises(RuntimeError, match="shared cache"):
+        with TestClient(client.app):
+            pass
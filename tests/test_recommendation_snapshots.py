@@ -0,0 +1,216 @@
+# tests/test_recommendation_snapshots.py
+import pytest
+from sqlalchemy import delete
+
+from app import models, routes_recommendations, schemas
+from app.catalog import catalog, get_catalog
+from app.db import SessionLocal
+
+from .conftest import make_user
+
+BG_VALUES = (40, 69.9, 70, 100, 129.9, 130, 179, 180, 239.9, 240, 400)
+
+MEALS = [
+    {"name": "Salad", "carbs_g": 10, "glycemic_index": 40},        # GL 4, low
+    {"name": "Eggs", "carbs_g": 2, "glycemic_index": 10},          # GL 0.2, low
+    {"name": "Oats", "carbs_g": 30, "glycemic_index": 50},         # GL 15, medium
+    {"name": "Rice", "carbs_g": 40, "glycemic_index": 45},         # GL 18, medium
+    {"name": "Bagel", "carbs_g": 60, "glycemic_index": 70},        # GL 42, high
+    {"name": "Pasta", "carbs_g": 70, "glycemic_index": 50},        # GL 35, high
+    {"name": "Cake", "carbs_g": 80, "glycemic_index": 75},         # GL 60, high
+    {"name": "Mystery", "carbs_g": 25},                            # unknown
+]
+
+
+def _old_band(bg_now: float) -> tuple[str, str, set[str]]:
+    # The if/elif chain the BG_BANDS table replaced.
+    if bg_now < 70:
+        return (
+            "low",
+            "Your blood glucose is low. Prefer medium to higher-impact meals to help raise it, and follow your care plan.",
+            {"medium", "high"},
+        )
+    elif bg_now < 130:
+        return (
+            "in_range",
+            "Your blood glucose is in range. You can choose low or medium-impact meals.",
+            {"low", "medium"},
+        )
+    elif bg_now < 180:
+        return (
+            "mild_high",
+            "Your blood glucose is slightly high. Prefer lower-impact meals, with some medium-impact options.",
+            {"low", "medium"},
+        )
+    elif bg_now < 240:
+        return (
+            "high",
+            "Your blood glucose is high. Stick to low-impact meals that won’t spike you further.",
+            {"low"},
+        )
+    return (
+        "very_high",
+        "Your blood glucose is very high. Focus on low-impact meals only and follow your care plan or provider instructions.",
+        {"low"},
+    )
+
+
+def _old_recommend(user_id: int, bg_now: float, include_catalog: bool) -> dict:
+    """The per-request algorithm from before snapshots, as the reference."""
+    bg_category, explanation, allowed_impacts = _old_band(bg_now)
+    with SessionLocal() as db:
+        meals = db.query(models.Meal).filter(models.Meal.user_id == user_id).all()
+        catalog_suggestions = []
+        if include_catalog:
+            cat = get_catalog(db)
+            catalog_suggestions = [
+                routes_recommendations._catalog_suggestion(cat, int(i))
+                for i in cat.select(impacts=allowed_impacts, limit=5)
+            ]
+
+        if not meals and not catalog_suggestions:
+            explanation = "You don't have any meals saved yet. Create meals first, then the app can recommend from them."
+            suggestions = []
+        else:
+            suggestions = []
+            for meal in meals:
+                gl = None
+                if meal.carbs_g is not None and meal.glycemic_index is not None:
+                    gl = meal.carbs_g * meal.glycemic_index / 100.0
+                suggestions.append(schemas.MealSuggestion(
+                    meal_id=meal.id,
+                    name=meal.name,
+                    glycemic_load=gl,
+                    impact_category=routes_recommendations._classify_glycemic_load(gl),
+                    carbs_g=meal.carbs_g,
+                    glycemic_index=meal.glycemic_index,
+                ))
+            known = [s for s in suggestions if s.impact_category != "unknown"]
+            filtered = [s for s in known if s.impact_category in allowed_impacts] + catalog_suggestions
+            if not filtered:
+                filtered = known or suggestions
+            suggestions = sorted(
+                filtered, key=lambda s: s.glycemic_load if s.glycemic_load is not None else 9999.0
+            )[:5]
+
+    return schemas.MealRecommendationResponse(
+        bg_now=bg_now, bg_category=bg_category, explanation=explanation, suggestions=suggestions
+    ).model_dump(mode="json")
+
+
+@pytest.fixture
+def catalog_meals():
+    with SessionLocal() as db:
+        db.add_all([
+            models.Meal(name="Catalog lentils", carbs_g=20, glycemic_index=30),   # GL 6, low
+            models.Meal(name="Catalog toast", carbs_g=30, glycemic_index=70),     # GL 21, high
+            models.Meal(name="Catalog quinoa", carbs_g=25, glycemic_index=53),    # GL 13.25, medium
+        ])
+        db.commit()
+    catalog.invalidate()
+    yield
+    with SessionLocal() as db:
+        db.execute(delete(models.Meal).where(models.Meal.user_id.is_(None)))
+        db.commit()
+    catalog.invalidate()
+
+
+def _recommend(client, headers, include_catalog: bool = False) -> dict:
+    resp = client.get("/diabetes/recommend-meals", params={"include_catalog": include_catalog}, headers=headers)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def _names(response: dict) -> list[str]:
+    return [s["name"] for s in response["suggestions"]]
+
+
+@pytest.mark.parametrize("meals", [MEALS, [MEALS[-1]], [MEALS[4], MEALS[-1]], []], ids=["mixed", "unknown", "high", "none"])
+def test_bands_match_old_algorithm(client, catalog_meals, meals):
+    user_id, headers = make_user(client)
+    if meals:
+        client.post("/meals/batch", json=meals, headers=headers).raise_for_status()
+
+    for bg in BG_VALUES:
+        client.post("/diabetes/bg-readings", json={"value": bg}, headers=headers).raise_for_status()
+        for include_catalog in (False, True):
+            assert _recommend(client, headers, include_catalog) == _old_recommend(user_id, bg, include_catalog)
+
+
+@pytest.fixture
+def warm(client, user):
+    """A user with one meal, a reading in range and a built snapshot."""
+    _, headers = user
+    meal = client.post("/meals/", json=MEALS[0], headers=headers).json()
+    client.post("/diabetes/bg-readings", json={"value": 100}, headers=headers).raise_for_status()
+    assert _names(_recommend(client, headers)) == ["Salad"]
+    return headers, meal
+
+
+def test_rebuilt_after_create(client, warm):
+    headers, _ = warm
+    client.post("/meals/", json=MEALS[1], headers=headers).raise_for_status()
+    assert _names(_recommend(client, headers)) == ["Eggs", "Salad"]
+
+
+def test_rebuilt_after_put(client, warm):
+    headers, meal = warm
+    client.put(f"/meals/{meal['id']}", json={**MEALS[0], "name": "Green salad"}, headers=headers).raise_for_status()
+    assert _names(_recommend(client, headers)) == ["Green salad"]
+
+
+def test_rebuilt_after_patch(client, warm):
+    headers, meal = warm
+    # GL 42: out of the in-range bands, so only the fallback keeps it.
+    client.patch(f"/meals/{meal['id']}", json={"carbs_g": 60, "glycemic_index": 70}, headers=headers).raise_for_status()
+    suggestions = _recommend(client, headers)["suggestions"]
+    assert [(s["name"], s["impact_category"]) for s in suggestions] == [("Salad", "high")]
+
+
+def test_rebuilt_after_batch_create(client, warm):
+    headers, _ = warm
+    client.post("/meals/batch", json=MEALS[1:4], headers=headers).raise_for_status()
+    assert _names(_recommend(client, headers)) == ["Eggs", "Salad", "Oats", "Rice"]
+
+
+def test_rebuilt_after_sync_upload(client, warm):
+    headers, meal = warm
+    ops = [
+        {"op_id": "create-oats", "entity": "meal", "op": "create", "data": MEALS[2]},
+        {"op_id": "delete-salad", "entity": "meal", "op": "delete", "id": meal["id"]},
+    ]
+    results = client.post("/sync", json={"operations": ops}, headers=headers).json()["results"]
+    assert [r["status"] for r in results] == ["applied", "applied"]
+    assert _names(_recommend(client, headers)) == ["Oats"]
+
+
+def test_rebuilt_after_catalog_change(client, warm, catalog_meals):
+    headers, _ = warm
+    assert _names(_recommend(client, headers, include_catalog=True)) == ["Salad", "Catalog lentils", "Catalog quinoa"]
+
+    with SessionLocal() as db:
+        db.add(models.Meal(name="Catalog broth", carbs_g=5, glycemic_index=20))
+        db.commit()
+    catalog.invalidate()
+    assert _names(_recommend(client, headers, include_catalog=True)) == [
+        "Catalog broth", "Salad", "Catalog lentils", "Catalog quinoa"
+    ]
+    # The catalog doesn't touch the bands without it.
+    assert _names(_recommend(client, headers)) == ["Salad"]
+
+
+def test_catalog_not_loaded_without_include_catalog(client, warm, monkeypatch):
+    headers, _ = warm
+
+    def fail(db):
+        raise AssertionError("catalog loaded")
+
+    monkeypatch.setattr(routes_recommendations, "get_catalog", fail)
+    client.post("/meals/", json=MEALS[1], headers=headers).raise_for_status()
+    assert _names(_recommend(client, headers)) == ["Eggs", "Salad"]
+
+
+def test_catalog_band_built_after_plain_snapshot(client, warm, catalog_meals):
+    headers, _ = warm
+    # The warm snapshot has no catalog bands; asking for them rebuilds.
+    assert _names(_recommend(client, headers, include_catalog=True)) == ["Salad", "Catalog lentils", "Catalog quinoa"]
@@ -0,0 +1,134 @@
+# tests/test_retention.py
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import func, select
+
+from app import models, retention
+from app.config import settings
+from app.db import SessionLocal
+
+
+def _assert_moments(moments: retention.Moments, values: np.ndarray) -> None:
+    assert moments.count == len(values)
+    assert moments.mean == pytest.approx(values.mean())
+    assert moments.std_dev == pytest.approx(values.std(ddof=1))
+
+
+@pytest.mark.parametrize("split", [0, 1, 7, 50, 99, 100])
+def test_moments_merge_is_exact(split):
+    values = np.random.default_rng(split).normal(140, 40, 100)
+    merged = retention.Moments.of(values[:split]).merge(retention.Moments.of(values[split:]))
+    _assert_moments(merged, values)
+
+
+def test_moments_from_sums_matches_of():
+    values = np.array([90.0, 110.0, 180.0, 65.0])
+    sums = retention.Moments.from_sums(len(values), values.sum(), (values ** 2).sum())
+    _assert_moments(sums, values)
+    assert retention.Moments.from_sums(0, None, None).count == 0
+
+
+def test_summarize_buckets():
+    timestamps = np.array(
+        ["2024-01-01T08:05", "2024-01-01T08:40", "2024-01-01T09:10", "2024-01-02T00:00"], dtype="datetime64[us]"
+    )
+    values = np.array([100.0, 140.0, 200.0, 80.0])
+
+    hours = retention.summarize(timestamps, values, "hour")
+    assert [r["bucket_start"] for r in hours] == [
+        datetime(2024, 1, 1, 8), datetime(2024, 1, 1, 9), datetime(2024, 1, 2, 0)
+    ]
+    first = hours[0]
+    assert (first["count"], first["mean"], first["m2"]) == (2, 120.0, 800.0)
+    assert (first["minimum"], first["maximum"], first["p50"]) == (100.0, 140.0, 120.0)
+
+    days = retention.summarize(timestamps, values, "day")
+    assert [(r["bucket_start"], r["count"]) for r in days] == [(datetime(2024, 1, 1), 3), (datetime(2024, 1, 2), 1)]
+    assert retention.summarize(timestamps[:0], values[:0], "day") == []
+
+
+def test_merge_rows():
+    timestamps = np.array(["2024-01-01T08:00"] * 5, dtype="datetime64[us]")
+    values = np.array([70.0, 100.0, 120.0, 150.0, 260.0])
+    a = retention.summarize(timestamps[:2], values[:2], "hour")[0]
+    b = retention.summarize(timestamps[2:], values[2:], "hour")[0]
+
+    merged = retention.merge_rows(a, b)
+    whole = retention.summarize(timestamps, values, "hour")[0]
+    for key in ("bucket_start", "count", "minimum", "maximum"):
+        assert merged[key] == whole[key]
+    for key in ("mean", "m2"):
+        assert merged[key] == pytest.approx(whole[key])
+    # Percentiles are count-weighted, not exact.
+    assert merged["p50"] == pytest.approx(a["p50"] * 0.4 + b["p50"] * 0.6)
+
+
+@pytest.fixture
+def retention_on(monkeypatch):
+    monkeypatch.setattr(settings, "bg_retention_raw_days", 30)
+
+
+def _add_readings(user_id: int, timestamps: list[datetime], values: list[float]) -> None:
+    with SessionLocal() as db:
+        db.add_all(
+            models.BloodGlucoseReading(user_id=user_id, timestamp=ts, value=v)
+            for ts, v in zip(timestamps, values)
+        )
+        db.commit()
+
+
+def test_rollup_user(user, retention_on):
+    user_id, _ = user
+    day = date.today() - timedelta(days=60)
+    start = datetime.combine(day, datetime.min.time())
+    _add_readings(user_id, [start + timedelta(minutes=20 * n) for n in range(6)], [90, 100, 110, 150, 160, 170])
+    _add_readings(user_id, [start + timedelta(days=1)], [200])
+    with SessionLocal() as db:
+        reading_id = db.scalar(select(models.BloodGlucoseReading.id).where(models.BloodGlucoseReading.user_id == user_id))
+        alert = models.BGAlert(user_id=user_id, reading_id=reading_id, kind="low", value=90, message="Low")
+        db.add(alert)
+        db.commit()
+
+        assert retention.rollup_user(db, user_id, retention.cutoff_day(), max_days=1) == 1
+        Summary = models.BGSummary
+        rows = db.execute(
+            select(Summary.resolution, Summary.bucket_start, Summary.count)
+            .where(Summary.user_id == user_id)
+            .order_by(Summary.resolution, Summary.bucket_start)
+        ).all()
+        assert rows == [("day", start, 6), ("hour", start, 3), ("hour", start + timedelta(hours=1), 3)]
+        assert db.get(models.BGAlert, alert.id).reading_id is None
+
+        # The batch limit left the second day; a late reading for the first merges in.
+        _add_readings(user_id, [start + timedelta(hours=1, minutes=30)], [130])
+        assert retention.rollup_user(db, user_id, retention.cutoff_day(), max_days=5) == 2
+        remaining = db.scalar(
+            select(func.count()).select_from(models.BloodGlucoseReading)
+            .where(models.BloodGlucoseReading.user_id == user_id)
+        )
+        assert remaining == 0
+        day_row = db.scalars(
+            select(Summary).where(Summary.user_id == user_id, Summary.resolution == "day", Summary.bucket_start == start)
+        ).one()
+        assert day_row.count == 7
+
+
+def test_variability_exact_after_rollup(client, user, retention_on):
+    user_id, headers = user
+    rng = np.random.default_rng(7)
+    old = datetime.combine(date.today() - timedelta(days=45), datetime.min.time())
+    old_values = rng.normal(150, 45, 200).round(1)
+    recent_values = rng.normal(120, 25, 50).round(1)
+    _add_readings(user_id, [old + timedelta(minutes=15 * n) for n in range(200)], old_values.tolist())
+    _add_readings(user_id, [datetime.utcnow() - timedelta(minutes=5 * n) for n in range(50)], recent_values.tolist())
+    values = np.concatenate([old_values, recent_values])
+
+    with SessionLocal() as db:
+        assert retention.rollup_user(db, user_id, retention.cutoff_day(), max_days=10) == 3
+
+    stats = client.get("/diabetes/bg-stats/variability", headers=headers).json()
+    assert stats["count"] == len(values)
+    assert stats["mean"] == pytest.approx(values.mean())
+    assert stats["std_dev"] == pytest.approx(values.std(ddof=1))
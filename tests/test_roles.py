@@ -0,0 +1,31 @@
+# tests/test_roles.py
+from app import models
+from app.cohorts import grant_role
+from app.db import SessionLocal
+
+from .conftest import make_user
+
+
+def test_user_list_is_admin_only(client, user):
+    _, headers = user
+    assert client.get("/users").status_code == 401
+    assert client.get("/users", headers=headers).status_code == 403
+    assert client.get("/users", params={"role": "admin"}, headers=headers).status_code == 403
+
+
+def test_grant_takes_effect_without_waiting_for_cache(client):
+    admin_id, headers = make_user(client)
+    # Caches the user as role "user".
+    assert client.get("/users", headers=headers).status_code == 403
+
+    with SessionLocal() as db:
+        email = db.get(models.User, admin_id).email
+        assert grant_role(db, email, "admin").id == admin_id
+
+    users = client.get("/users", params={"role": "admin"}, headers=headers)
+    assert users.status_code == 200
+    assert admin_id in [u["id"] for u in users.json()]
+    assert all(u["role"] == "admin" for u in users.json())
+
+    with SessionLocal() as db:
+        assert grant_role(db, "nobody@example.com", "admin") is None
@@ -0,0 +1,74 @@
+# tests/test_sync.py
+from sqlalchemy import create_engine, insert, select
+
+from app import migrations, models
+from app.db import Base, SessionLocal
+
+from .conftest import make_user
+
+
+def _meal(client, headers, name: str) -> dict:
+    return client.post("/meals/", json={"name": name, "carbs_g": 20, "glycemic_index": 50}, headers=headers).json()
+
+
+def test_cursor_is_per_user_sequence(client, user):
+    _, headers = user
+    start = client.get("/sync", headers=headers).json()["cursor"]
+    assert start == 0
+
+    first = _meal(client, headers, "Oats")
+    _, other_headers = make_user(client)
+    _meal(client, other_headers, "Rice")  # another user's writes don't move this cursor
+    second = _meal(client, headers, "Apple")
+
+    pulled = client.get("/sync", params={"since": start}, headers=headers).json()
+    assert [m["id"] for m in pulled["meals"]] == [first["id"], second["id"]]
+    assert pulled["cursor"] == 2
+
+    again = client.get("/sync", params={"since": pulled["cursor"]}, headers=headers).json()
+    assert again["meals"] == [] and again["cursor"] == 2
+
+
+def test_upload_returns_cursor_of_own_writes(client, user):
+    _, headers = user
+    ops = [
+        {"op_id": f"op-{n}", "entity": "meal", "op": "create", "data": {"name": f"M{n}", "carbs_g": 10}}
+        for n in range(3)
+    ]
+    resp = client.post("/sync", json={"operations": ops}, headers=headers).json()
+    assert resp["cursor"] == 3
+    assert len(client.get("/sync", params={"since": 0}, headers=headers).json()["meals"]) == 3
+
+
+def test_delete_reading_with_alert(client, user):
+    user_id, headers = user
+    reading = client.post("/diabetes/bg-readings", json={"value": 250, "context": "fasting"}, headers=headers).json()
+    with SessionLocal() as db:
+        alert = models.BGAlert(user_id=user_id, reading_id=reading["id"], kind="high", value=250, message="High")
+        db.add(alert)
+        db.commit()
+        alert_id = alert.id
+
+    ops = [{"op_id": "del-1", "entity": "bg_reading", "op": "delete", "id": reading["id"]}]
+    result = client.post("/sync", json={"operations": ops}, headers=headers).json()["results"][0]
+    assert result["status"] == "applied"
+    with SessionLocal() as db:
+        alert = db.get(models.BGAlert, alert_id)
+        assert alert is not None and alert.reading_id is None
+
+
+def test_migration_keeps_old_cursors(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"id": 1, "email": "a@x", "hashed_password": "x"}])
+        conn.execute(insert(models.SyncChange), [
+            {"user_id": 1, "entity": "meal", "entity_id": n, "deleted": False} for n in range(5)
+        ])
+
+    migrations._sync_sequences(engine)
+
+    with engine.connect() as conn:
+        changes = conn.execute(select(models.SyncChange.id, models.SyncChange.seq)).all()
+        assert all(id_ == seq for id_, seq in changes)
+        assert conn.scalar(select(models.SyncSequence.last_seq)) == 5
@@ -0,0 +1,35 @@
+# tests/test_timeseries.py
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from app import models, timeseries
+from app.db import SessionLocal
+
+
+def test_compact_day_with_alerted_reading(user):
+    user_id, _ = user
+    day = datetime.combine(date.today() - timedelta(days=10), datetime.min.time())
+    with SessionLocal() as db:
+        readings = [
+            models.BloodGlucoseReading(user_id=user_id, timestamp=day + timedelta(hours=h), value=v)
+            for h, v in ((7, 65.0), (12, 140.0), (19, 250.0))
+        ]
+        # Newest row overall, so none of the old ones is kept back as max(id).
+        recent = models.BloodGlucoseReading(user_id=user_id, timestamp=datetime.utcnow(), value=110.0)
+        db.add_all(readings + [recent])
+        db.flush()
+        alert = models.BGAlert(user_id=user_id, reading_id=readings[0].id, kind="low", value=65.0, message="Low")
+        db.add(alert)
+        db.commit()
+        old_ids = [r.id for r in readings]
+
+        assert timeseries.compact_user(db, user_id, date.today() - timedelta(days=2)) == 3
+        db.commit()
+
+        assert db.get(models.BGAlert, alert.id).reading_id is None
+        live = db.scalars(select(models.BloodGlucoseReading.id).where(models.BloodGlucoseReading.user_id == user_id))
+        assert list(live) == [recent.id]
+        arrays = timeseries.read_range(db, user_id)
+        assert arrays.ids.tolist() == old_ids + [recent.id]
+        assert arrays.values.tolist() == [65.0, 140.0, 250.0, 110.0]